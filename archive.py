@@ -0,0 +1,322 @@
+# archive.py
+# 原始牌谱的打包存储：追加写入的段文件 (seg-00000.dat ...) + id→(段, 偏移, 长度) 索引 (index.log)，
+# 读取时对段文件做内存映射，避免每条记录一个小文件。
+#
+# 用法：
+#   python archive.py migrate            # 把 data/origin/*.json 导入 data/archive/
+#   python archive.py info               # 查看归档记录数与段文件大小
+#
+# 归档目录存在时，main.py / batch_process.py / generate_stats.py 自动改用归档读写。
+# 多个进程（batch_process.py --claim）可以同时追加：每次写入都在 index.log 的 flock 排它锁内完成。
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import sys
+import threading
+
+ORIGIN_DIR = os.path.join("data", "origin")
+ARCHIVE_DIR = os.path.join("data", "archive")
+INDEX_NAME = "index.log"
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+def write_atomic(path, data, encoding="utf-8"):
+    """先写同目录下的临时文件再改名：进程中途被杀只会留下临时文件，不会留下半截的目标文件。"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding=encoding) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_json(path, default):
+    """读取 JSON 文件；文件不存在或内容损坏时返回 default。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json(path, data, indent=2):
+    """用 write_atomic 写出 JSON，必要时创建目录；indent=None 时写成紧凑格式。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    separators = (",", ":") if indent is None else None
+    write_atomic(path, json.dumps(data, ensure_ascii=False, indent=indent, separators=separators))
+
+
+class DirectoryStore:
+    """一条记录一个文件的旧布局 (data/origin/<id>.json)。"""
+
+    def __init__(self, root=ORIGIN_DIR):
+        self.root = root
+
+    def _path(self, record_id):
+        return os.path.join(self.root, f"{record_id}.json")
+
+    def __contains__(self, record_id):
+        return os.path.exists(self._path(record_id))
+
+    def __len__(self):
+        return len(self.ids())
+
+    def ids(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith(".json"))
+
+    def get(self, record_id):
+        with open(self._path(record_id), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, record_id, data):
+        os.makedirs(self.root, exist_ok=True)
+        write_atomic(self._path(record_id), data)
+
+    def discard(self, record_id):
+        """删除损坏的记录文件，下次运行时重新下载。"""
+        try:
+            os.remove(self._path(record_id))
+        except FileNotFoundError:
+            pass
+
+    def key(self, record_id):
+        st = os.stat(self._path(record_id))
+        return [st.st_size, st.st_mtime_ns]
+
+    def close(self):
+        pass
+
+
+class RecordArchive:
+    """追加写入的段文件归档。同一 id 重复写入时以最后一次为准；多写者之间用 index.log 上的 flock 串行化。
+
+    索引中段号为 -1 的行是删除标记（discard），读到时从索引中移除该记录。
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index = {}
+        self._index_pos = 0
+        self._maps = {}
+        self._seg_file = None
+        self._index_file = None
+        self._lock = threading.Lock()
+        self._load_index()
+        segments = self._segments()
+        self._seg_no = segments[-1] if segments else 0
+
+    @staticmethod
+    def exists(root=ARCHIVE_DIR):
+        return os.path.exists(os.path.join(root, INDEX_NAME))
+
+    def _seg_path(self, seg_no):
+        return os.path.join(self.root, f"seg-{seg_no:05d}.dat")
+
+    def _segments(self):
+        return sorted(int(f[4:9]) for f in os.listdir(self.root) if f.startswith("seg-") and f.endswith(".dat"))
+
+    def _load_index(self):
+        # 从上次读到的位置继续读索引，refresh() 复用同一逻辑读取其它进程追加的记录
+        path = os.path.join(self.root, INDEX_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self._index_pos)
+            for raw in f:
+                # 写入中途被打断（或正在写）的最后一行先不处理，下次从这里重读
+                if not raw.endswith(b"\n"):
+                    break
+                self._index_pos += len(raw)
+                parts = raw.decode("utf-8").rstrip("\n").split("\t")
+                if len(parts) != 4:
+                    continue
+                record_id, seg_no, offset, length = parts
+                if int(seg_no) < 0:
+                    self.index.pop(record_id, None)
+                else:
+                    self.index[record_id] = (int(seg_no), int(offset), int(length))
+
+    def refresh(self):
+        """读入其它进程在打开之后追加的记录。"""
+        with self._lock:
+            self._load_index()
+
+    def __contains__(self, record_id):
+        return record_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def ids(self):
+        return sorted(self.index)
+
+    def key(self, record_id):
+        return list(self.index[record_id])
+
+    def _map(self, seg_no, end):
+        m = self._maps.get(seg_no)
+        if m is None or len(m) < end:
+            # 段文件在映射之后又追加过数据，重新映射
+            if m is not None:
+                m.close()
+            with open(self._seg_path(seg_no), "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[seg_no] = m
+        return m
+
+    def get_bytes(self, record_id):
+        if record_id not in self.index:
+            # 流水线中父进程边下载边追加，子进程的索引可能落后
+            self.refresh()
+        seg_no, offset, length = self.index[record_id]
+        if not length:
+            return b""
+        with self._lock:
+            return self._map(seg_no, offset + length)[offset:offset + length]
+
+    def get(self, record_id):
+        return self.get_bytes(record_id).decode("utf-8")
+
+    def items(self):
+        # 按段内物理顺序遍历，顺序读取对页缓存更友好
+        for record_id, _ in sorted(self.index.items(), key=lambda kv: kv[1]):
+            yield record_id, self.get(record_id)
+
+    def _open_for_append(self):
+        if self._index_file is None:
+            self._index_file = open(os.path.join(self.root, INDEX_NAME), "a", encoding="utf-8")
+
+    def put(self, record_id, data):
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        with self._lock:
+            self._open_for_append()
+            fcntl.flock(self._index_file, fcntl.LOCK_EX)
+            try:
+                # 持锁后再确定段号与偏移：其它进程可能已追加数据或切换到新段，本进程打开时的 tell() 不再可信
+                while os.path.exists(self._seg_path(self._seg_no + 1)):
+                    self._seg_no += 1
+                if self._seg_file is None or self._seg_file.name != self._seg_path(self._seg_no):
+                    if self._seg_file is not None:
+                        self._seg_file.close()
+                    self._seg_file = open(self._seg_path(self._seg_no), "ab")
+                offset = self._seg_file.seek(0, os.SEEK_END)
+                if offset and offset + len(payload) > SEGMENT_SIZE:
+                    self._seg_file.close()
+                    self._seg_no += 1
+                    self._seg_file = open(self._seg_path(self._seg_no), "ab")
+                    offset = 0
+                self._seg_file.write(payload)
+                self._seg_file.flush()
+                # 先写数据再写索引：中断时只会留下无索引指向的数据，不会出现指向半截数据的索引
+                self._index_file.write(f"{record_id}\t{self._seg_no}\t{offset}\t{len(payload)}\n")
+                self._index_file.flush()
+            finally:
+                fcntl.flock(self._index_file, fcntl.LOCK_UN)
+            self.index[record_id] = (self._seg_no, offset, len(payload))
+
+    def discard(self, record_id):
+        """在索引中追加删除标记：损坏的记录从归档中移除，下次运行时重新下载。段文件中的旧数据不回收。"""
+        with self._lock:
+            self._open_for_append()
+            fcntl.flock(self._index_file, fcntl.LOCK_EX)
+            try:
+                self._index_file.write(f"{record_id}\t-1\t0\t0\n")
+                self._index_file.flush()
+            finally:
+                fcntl.flock(self._index_file, fcntl.LOCK_UN)
+            self.index.pop(record_id, None)
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
+        if self._seg_file is not None:
+            self._seg_file.close()
+            self._seg_file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+
+def open_origin_store(archive_dir=ARCHIVE_DIR, origin_dir=ORIGIN_DIR):
+    """归档已存在时返回 RecordArchive，否则返回 data/origin 目录存储。"""
+    if RecordArchive.exists(archive_dir):
+        return RecordArchive(archive_dir)
+    return DirectoryStore(origin_dir)
+
+
+_shared_store = None
+
+
+def shared_origin_store():
+    """进程内共享的原始数据存储：每个进程（含进程池子进程）只打开一次，避免重复加载索引。"""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = open_origin_store()
+    return _shared_store
+
+
+def _reset_shared_store():
+    # fork 出的子进程不沿用父进程的存储对象：其中的锁可能正被父进程的下载线程持有
+    global _shared_store
+    _shared_store = None
+
+
+os.register_at_fork(after_in_child=_reset_shared_store)
+
+
+def migrate(origin_dir=ORIGIN_DIR, archive_dir=ARCHIVE_DIR):
+    source = DirectoryStore(origin_dir)
+    archive = RecordArchive(archive_dir)
+    added = 0
+    skipped = 0
+    for record_id in source.ids():
+        if record_id in archive:
+            skipped += 1
+            continue
+        archive.put(record_id, source.get(record_id).strip())
+        added += 1
+    # 空归档也要落一个索引文件，后续工具据此切换到归档模式
+    open(os.path.join(archive_dir, INDEX_NAME), "a").close()
+    archive.close()
+    return added, skipped
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="原始牌谱打包归档")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mp = sub.add_parser("migrate", help="把 data/origin 下的 json 文件导入归档")
+    mp.add_argument("--origin", default=ORIGIN_DIR)
+    mp.add_argument("--archive", default=ARCHIVE_DIR)
+    ip = sub.add_parser("info", help="查看归档概况")
+    ip.add_argument("--archive", default=ARCHIVE_DIR)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "migrate":
+        added, skipped = migrate(args.origin, args.archive)
+        print(f"导入 {added} 条记录，已存在跳过 {skipped} 条 -> {args.archive}")
+        print(f"确认无误后可删除 {args.origin} 与 data/record 下的单文件副本。")
+    elif args.cmd == "info":
+        if not RecordArchive.exists(args.archive):
+            print(f"归档不存在: {args.archive}", file=sys.stderr)
+            sys.exit(1)
+        archive = RecordArchive(args.archive)
+        segments = archive._segments()
+        total = sum(os.path.getsize(archive._seg_path(s)) for s in segments)
+        print(f"记录数: {len(archive)}  段文件: {len(segments)}  总大小: {total / 1024 / 1024:.1f} MiB")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,54 +3,118 @@
 import sys
 import os
 import json
-import requests
-from parser import MahjongRecordParser
+import argparse
+import cProfile
+import pstats
+import tracemalloc
+from functools import partial
+from parser import MahjongRecordParser, _decode_script
+from workers import map_unordered
+from archive import shared_origin_store, RecordArchive, write_atomic
+from metrics import RecordMetrics, BatchMetrics, Progress, METRICS_PATH
+from pipeline import stream_records
+from downloader import set_base_url
+from stats_cache import StatsCache, parser_version
+from catalog import Catalog, load_parent_map
+from win_index import WinIndex
+from player_stats import PlayerStats, record_facts
+from journal import Journal, claim_chunks, JOURNAL_PATH, DONE, FAILED
 
-# ================== 从原 main.py 复用的代码 ==================
+PROFILE_DIR = os.path.join("data", "metrics", "profile")
+# 多进程时每个任务最多携带的记录数
+BATCH_SIZE = 32
 
-URL = "https://tziakcha.net/_qry/record/"
-HEADERS = {
-    "accept": "*/*",
-    "content-type": "text/plain;charset=UTF-8"
-}
+# 每个进程复用一个解析器实例
+_parser = MahjongRecordParser()
 
-def download_record(record_id):
-    payload = f"id={record_id}"
+def process_record(record_id, store=None, trace=False, metrics=None):
+    store = store or shared_origin_store()
+    metrics = metrics or RecordMetrics(record_id)
     try:
-        response = requests.post(URL, data=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Download failed for {record_id}: {e}", file=sys.stderr)
-        return None
-
-def save_origin(record_id, data):
-    origin_dir = os.path.join("data", "origin")
-    os.makedirs(origin_dir, exist_ok=True)
-    with open(os.path.join(origin_dir, f"{record_id}.json"), "w", encoding="utf-8") as f:
-        f.write(data)
-
-def process_record(record_id):
-    origin_file = os.path.join("data", "origin", f"{record_id}.json")
-    try:
-        with open(origin_file, "r", encoding="utf-8") as f:
-            origin_data = f.read().strip()
-    except FileNotFoundError:
-        print(f"Origin file not found: {origin_file}")
+        with metrics.stage("read"):
+            origin_data = store.get(record_id).strip()
+    except (FileNotFoundError, KeyError):
+        print(f"Origin record not found: {record_id}")
+        metrics.error = "origin record not found"
         return False
+    metrics.bytes_read = len(origin_data)
 
-    parser = MahjongRecordParser(origin_data)
-    script_data = parser.script_data
+    # 与 parser.reset 等价，拆开以便分别统计 JSON 解析与 base64/zlib 解码的耗时
+    with metrics.stage("json"):
+        record_json = json.loads(origin_data)
+    with metrics.stage("decode"):
+        raw_script = _decode_script(record_json['script'])
+    with metrics.stage("json"):
+        script_data = json.loads(raw_script)
+    with metrics.stage("load"):
+        parser = _parser.load_script(script_data)
 
-    record_dir = os.path.join("data", "record")
-    os.makedirs(record_dir, exist_ok=True)
-    with open(os.path.join(record_dir, f"{record_id}.json"), "w", encoding="utf-8") as f:
-        json.dump(script_data, f, ensure_ascii=False, indent=2)
+    # 打包归档模式下不再额外落盘解码后的副本
+    if not isinstance(store, RecordArchive):
+        record_dir = os.path.join("data", "record")
+        os.makedirs(record_dir, exist_ok=True)
+        with metrics.stage("write"):
+            text = json.dumps(script_data, ensure_ascii=False, indent=2)
+            write_atomic(os.path.join(record_dir, f"{record_id}.json"), text)
+            metrics.bytes_written = len(text.encode("utf-8"))
 
-    # 执行分析（根据你的 parser 实现）
-    parser.run_analysis()
+    # 执行分析；默认无头模式，trace=True 时打印完整过程日志
+    with metrics.stage("replay"):
+        parser.run_analysis(trace=trace)
     return True
 
+def _process_one(item, trace=False, profile_dir=None):
+    # 进程池任务：只回传 (id, 是否成功, 错误信息, 指标字典, 和牌分析, (开始时间, 玩家名), 结果事实)，避免把解析器对象传回父进程
+    record_id, sampled = item
+    if trace:
+        print(f"\n\nProcessing record: https://tziakcha.net/record/?id={record_id}")
+    metrics = RecordMetrics(record_id)
+    profiler = None
+    if sampled and profile_dir:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    ok, error, win_data, meta, facts = True, None, None, None, None
+    try:
+        if process_record(record_id, trace=trace, metrics=metrics):
+            # 顺带算出统计所需的和牌分析，父进程写入统计缓存，generate_stats 无需再解析一遍
+            with metrics.stage("stats"):
+                win_data = _parser.get_win_analysis()
+                if win_data:
+                    win_data.pop('fan_names', None)
+                facts = record_facts(_parser, win_data)
+            script_data = _parser.script_data
+            meta = (script_data.get('t'), [p.get('n', '') for p in script_data.get('p', [])])
+        else:
+            ok, error = False, metrics.error
+    except Exception as e:
+        ok, error = False, str(e)
+        metrics.error = error
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            metrics.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f"{record_id}.prof"))
+    return record_id, ok, error, metrics.to_dict(), win_data, meta, facts
+
+def _process_batch(items, trace=False, profile_dir=None):
+    return [_process_one(item, trace, profile_dir) for item in items]
+
+def _report_profile(profile_dir, record_ids, top=15):
+    # 合并抽样记录的 cProfile 结果，输出累计耗时最高的函数
+    paths = [os.path.join(profile_dir, f"{rid}.prof") for rid in record_ids]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+    stats = pstats.Stats(*paths, stream=sys.stderr)
+    combined = os.path.join(profile_dir, "combined.prof")
+    stats.dump_stats(combined)
+    print(f"\nProfile of {len(paths)} sampled record(s) (combined: {combined}):", file=sys.stderr)
+    stats.sort_stats("cumulative").print_stats(top)
+    return combined
+
 # ================== 批量处理逻辑 ==================
 
 def load_all_record_ids(json_file="all_record.json"):
@@ -84,41 +148,176 @@ def load_all_record_ids(json_file="all_record.json"):
     print("Unrecognized all_record.json structure.", file=sys.stderr)
     sys.exit(1)
 
-def main():
-    record_ids = load_all_record_ids("all_record.json")
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="批量下载并解析 all_record.json 中的所有记录")
+    ap.add_argument("--concurrency", type=int, default=8, help="并发下载数（默认 8）")
+    ap.add_argument("--rate", type=float, default=None, help="每秒最多请求数（按主机限速，默认不限）")
+    ap.add_argument("--retries", type=int, default=3, help="暂时性故障的重试次数（默认 3）")
+    ap.add_argument("--base-url", default=None, help="接口地址（默认 $TZI_BASE_URL 或 https://tziakcha.net）")
+    ap.add_argument("--workers", type=int, default=1, help="并行解析的进程数（默认 1，即串行）")
+    ap.add_argument("--queue-size", type=int, default=256, help="下载与解析之间的队列长度（默认 256）")
+    ap.add_argument("--stats", action="store_true", help="结束后直接生成 win_stats_bom.csv（复用本次解析结果）")
+    ap.add_argument("--trace", action="store_true", help="打印每条记录的完整复盘过程（默认不输出）")
+    ap.add_argument("--metrics", default=METRICS_PATH, help=f"指标 JSON 输出路径（默认 {METRICS_PATH}）")
+    ap.add_argument("--profile-every", type=int, default=0, metavar="N",
+                    help="每 N 条记录抽样 1 条做 cProfile + tracemalloc（默认关闭）")
+    ap.add_argument("--journal", default=JOURNAL_PATH, help=f"处理日志路径（默认 {JOURNAL_PATH}）")
+    ap.add_argument("--all", action="store_true", help="忽略处理日志，重新处理全部记录")
+    ap.add_argument("--claim", action="store_true",
+                    help="按块认领记录，供共享目录上的多个进程 / 多台机器同时运行而不重复处理")
+    ap.add_argument("--claim-size", type=int, default=256,
+                    help="每次认领的记录数，也是提交统计缓存 / 索引 / 成绩表并记为完成的间隔（默认 256）")
+    ap.add_argument("--claim-ttl", type=float, default=600, help="认领超过多少秒未更新视为失效（默认 600）")
+    return ap.parse_args(argv)
 
-    print(f"Found {len(record_ids)} records. Starting batch processing...")
+def main(argv=None):
+    args = parse_args(argv)
+    set_base_url(args.base_url)
+    catalog = Catalog() if Catalog.exists() else None
+    if catalog is not None and catalog.has_sessions():
+        record_ids = catalog.record_ids()
+    else:
+        record_ids = list(dict.fromkeys(load_all_record_ids("all_record.json")))
+    metrics = BatchMetrics()
+
+    # 已完成的记录直接跳过，失败和尚未处理的记录本轮重试；--all 忽略日志全部重新处理。
+    # 解析器版本变化时缓存、索引与成绩表会被清空，旧版本的完成记录不再算数，全部重新处理
+    journal = Journal(args.journal, resume=not args.all, version=parser_version())
+    todo = journal.pending(record_ids)
+    print(f"Found {len(record_ids)} records, {len(todo)} to process "
+          f"({len(record_ids) - len(todo)} already done per {args.journal}). Starting batch processing...")
+    if args.claim:
+        print(f"  Claiming chunks of {args.claim_size} as {journal.worker}")
+        if args.metrics == METRICS_PATH:
+            # 多个进程各写各的指标文件
+            args.metrics = os.path.join(os.path.dirname(METRICS_PATH), f"batch_metrics.{journal.worker}.json")
+
+    store = shared_origin_store()
+    missing = sum(1 for rid in todo if rid not in store)
+    if missing:
+        print(f"Downloading {missing} missing records (concurrency={args.concurrency}), parsing as they arrive...")
 
     suc_cnt = 0
     fail_cnt = 0
+    done = 0
+    # trace 模式下由每条记录自己输出标题与过程日志，否则只输出一行进度
+    progress = None if args.trace else Progress(len(todo))
+    cache = StatsCache()
+    index = WinIndex()
+    player_stats = PlayerStats()
+    # 与 generate_stats 相同：优先读目录，目录不存在或尚未展开场次时读 record_parent_map.json
+    parent_map = load_parent_map()
 
-    for i, record_id in enumerate(record_ids, start=1):
-        print(f"\n\n[{i}/{len(record_ids)}] Processing record: https://tziakcha.net/record/?id={record_id}")
+    every = args.profile_every
+    profile_dir = PROFILE_DIR if every > 0 else None
+    sampled = []
+    count = 0
+    claim = None
+    # 已解析成功、尚未提交的记录：(record_id, key, win_data, facts, meta)
+    pending = []
 
-        origin_file = os.path.join("data", "origin", f"{record_id}.json")
-        if not os.path.exists(origin_file):
-            print(f"  Downloading {record_id}...")
-            data = download_record(record_id)
-            if data is None:
-                print(f"  ❌ Failed to download {record_id}, skipping...")
-                continue
-            save_origin(record_id, data)
-        # else:
-        #     print(f"  Already downloaded, skip download.")
-
-        # 处理记录（解析 + 分析）
-        
-        try:
-            process_record(record_id)
-            # print(f"  ✅ Processed successfully.\n")
-            suc_cnt += 1
-        except Exception as e:
-            print(f"  ❌ Error during processing {record_id}: {e}\n")
-            fail_cnt += 1
-
-    # print("✅ Batch processing completed.")
+    def on_download(result):
+        nonlocal done
+        metrics.add_download(result)
+        if not result.ok:
+            done += 1
+            journal.record(FAILED, result.record_id, result.error)
+            print(f"  ❌ Failed to download {result.record_id} after {result.attempts} attempt(s): {result.error}")
+
+    def batches(ready):
+        # 多进程时按批派发，摊薄进程间往返的开销；抽样按到达顺序每 N 条取 1 条
+        nonlocal count
+        for ids in ready:
+            yield [(rid, every > 0 and (count + i) % every == 0) for i, rid in enumerate(ids)]
+            count += len(ids)
+
+    def commit():
+        # 先提交统计缓存、和牌索引、成绩表与目录，再把这些记录记为完成：中途崩溃时未提交的记录不会被标记，下次重新处理
+        if not pending:
+            return
+        cache.save()
+        index.add_many([(rid, key, win_data) for rid, key, win_data, _, _ in pending])
+        player_stats.add_many([(rid, key, facts, parent_map.get(rid, {}).get('session_id', ''))
+                               for rid, key, _, facts, _ in pending])
+        if catalog is not None:
+            # 记录的开始时间与玩家写回目录，供 select_session.py 按日期 / 玩家筛选
+            catalog.upsert_record_meta([(rid,) + meta for rid, _, _, _, meta in pending])
+        for rid, *_ in pending:
+            journal.record(DONE, rid)
+        pending.clear()
+
+    def run(ids):
+        nonlocal done, suc_cnt, fail_cnt
+        # 下载与解析重叠执行：下载完成的记录经有界队列交给解析进程，结果按完成顺序返回
+        ready = stream_records(ids, store, concurrency=args.concurrency, rate=args.rate, retries=args.retries,
+                               queue_size=args.queue_size, on_download=on_download,
+                               batch=BATCH_SIZE if args.workers > 1 else 1)
+        results = map_unordered(partial(_process_batch, trace=args.trace, profile_dir=profile_dir), batches(ready),
+                                workers=args.workers)
+        for batch, batch_results in results:
+            for (record_id, was_sampled), (_, ok, error, record_metrics, win_data, meta, facts) in zip(batch, batch_results):
+                done += 1
+                if was_sampled:
+                    sampled.append(record_id)
+                metrics.add(record_metrics)
+                if ok:
+                    suc_cnt += 1
+                    key = store.key(record_id)
+                    cache.store(record_id, key, win_data)
+                    pending.append((record_id, key, win_data, facts, meta))
+                    if len(pending) >= args.claim_size:
+                        commit()
+                else:
+                    print(f"  ❌ Error during processing {record_id}: {error}")
+                    fail_cnt += 1
+                    journal.record(FAILED, record_id, error)
+                    if record_metrics['error_stage'] in ("json", "decode"):
+                        # 原始记录损坏（例如旧版本写到一半被中断），删除（归档中追加删除标记）后下次运行重新下载
+                        store.discard(record_id)
+                if claim is not None:
+                    claim.heartbeat()
+                if progress:
+                    progress.update(done, suc_cnt, fail_cnt)
+        # 每块结束时提交剩余记录；索引与成绩表各用一个短事务写入，避免长时间占用写锁
+        commit()
+
+    if args.claim:
+        for claim, ids in claim_chunks(record_ids, journal, chunk_size=args.claim_size, ttl=args.claim_ttl):
+            try:
+                run(ids)
+            finally:
+                claim.release()
+    else:
+        run(todo)
+    journal.close()
+    if progress:
+        progress.update(done, suc_cnt, fail_cnt, force=True)
+        progress.finish()
+    index.close()
+    player_stats.close()
+    if catalog is not None:
+        catalog.close()
+
+    extra = {}
+    if profile_dir:
+        combined = _report_profile(profile_dir, sampled)
+        extra['profile'] = {'every': every, 'combined': combined}
+    summary = metrics.save(args.metrics, extra)
+
+    print(f"  Downloaded: {missing - metrics.download_failed} (after retries: {metrics.download_retried}), "
+          f"failed: {metrics.download_failed}")
     print(f"  Successfully processed: {suc_cnt}")
     print(f"  Failed to process: {fail_cnt}")
+    print("  Stage time (total s / p95 ms): " + ", ".join(
+        f"{name} {st['total_s']:.2f}/{st['p95_ms']:.1f}" for name, st in summary['stages'].items()))
+    print(f"  Metrics written to {args.metrics}")
+
+    if args.stats:
+        # 本次解析过的记录都已在统计缓存中，这里只会解析存储里其余未缓存的记录
+        from generate_stats import generate_stats
+        generate_stats(workers=args.workers, cache=cache)
+        print("  Stats written to win_stats_bom.csv")
+    cache.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,261 @@
+# benchmark.py
+# 解析器性能基准。
+#
+# 用法：python benchmark.py [--limit N] [--repeat R] [--processes P] [--synthetic N] [--save PATH] [--compare PATH]
+#   从 data/origin（或 data/archive）读取记录；--synthetic N 改用 synth.py 按固定种子生成的 N 条记录。
+#   分阶段（_parse_script / _parse_acts / _setup_wall_and_deal / run_analysis / get_win_analysis）
+#   输出每秒处理记录数与单条记录的峰值内存，并分别以无头模式与 trace 模式复盘整局。
+#   --save 把结果写成 JSON；--compare 与之前保存的结果对比，速度或内存退化超过 --threshold 时以非零状态码退出。
+#
+# 同一份代码连续两次运行，单个进程内的最快一轮也可能相差 20% 以上（内存布局、哈希种子、机器上的其它负载），
+# 因此计时分别在 --processes 个新启动的解释器中各跑 --repeat 轮，取全部轮次中最快的一轮；
+# 对比时疑似退化的项目再用同样多的新进程复测，合并后仍退化才算数。
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from parser import MahjongRecordParser, ActionStream, _parse_script, _parse_acts
+from tracer import ReplayTracer
+from archive import shared_origin_store
+
+
+def load_records(limit=None):
+    store = shared_origin_store()
+    records = []
+    for record_id in store.ids()[:limit]:
+        content = store.get(record_id)
+        if content.strip():
+            records.append(content)
+    return records
+
+
+def _stages():
+    """[(阶段名, 准备函数, 被测函数)]；准备函数把记录内容转成被测函数的输入，不计入耗时。"""
+    parser = MahjongRecordParser()
+    stream = ActionStream()
+
+    def replayed(content):
+        parser.reset(content).run_analysis()
+        return parser
+
+    return [
+        ('_parse_script', lambda c: json.loads(c)['script'], _parse_script),
+        ('_parse_acts', lambda c: _parse_script(json.loads(c)['script']).get('a', []),
+         lambda acts: _parse_acts(acts, stream)),
+        ('_setup_wall_and_deal', parser.reset, MahjongRecordParser._setup_wall_and_deal),
+        ('run_analysis', parser.reset, MahjongRecordParser.run_analysis),
+        ('get_win_analysis', replayed, MahjongRecordParser.get_win_analysis),
+    ]
+
+
+def _timed(run):
+    # 与 timeit 一样，计时期间关闭 GC，减少批次间的抖动
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return run()
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _rates(n, times):
+    return sorted(n / t if t else 0.0 for t in times)
+
+
+def bench_stages(records, repeat=5, only=None):
+    """返回 {阶段: {'rps': 每秒记录数, 'rounds': 各轮每秒记录数, 'peak_kib': 单条记录的最大峰值内存}}。
+
+    rps 取 repeat 轮中最快的一轮；only 为阶段名集合时只测这些阶段。
+    """
+    results = {}
+    clock = time.perf_counter
+    for name, prepare, step in _stages():
+        if only is not None and name not in only:
+            continue
+        def run_once():
+            elapsed = 0.0
+            for content in records:
+                arg = prepare(content)
+                start = clock()
+                step(arg)
+                elapsed += clock() - start
+            return elapsed
+
+        rounds = _rates(len(records), [_timed(run_once) for _ in range(repeat)])
+
+        # 峰值内存单独跑一轮：tracemalloc 本身会显著拖慢执行，不能与计时混在一起
+        peak = 0
+        tracemalloc.start()
+        try:
+            for content in records:
+                arg = prepare(content)
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                step(arg)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        finally:
+            tracemalloc.stop()
+        results[name] = {'rps': rounds[-1], 'rounds': rounds, 'peak_kib': peak / 1024}
+    return results
+
+
+def bench_replay(records, repeat=5, only=None):
+    """返回 {模式: 各轮每秒记录数（升序）}；only 为模式名集合时只测这些模式。"""
+    parser = MahjongRecordParser()
+    results = {}
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        modes = {
+            'headless': lambda: parser.run_analysis(),
+            'trace': lambda: parser.run_analysis(tracer=ReplayTracer(parser, out=devnull)),
+        }
+        for mode, run in modes.items():
+            if only is not None and mode not in only:
+                continue
+            def run_once():
+                start = time.perf_counter()
+                for content in records:
+                    parser.reset(content)
+                    run()
+                return time.perf_counter() - start
+
+            results[mode] = _rates(len(records), [_timed(run_once) for _ in range(repeat)])
+    return results
+
+
+def _measure_once(records, repeat, only):
+    return bench_stages(records, repeat, only), bench_replay(records, repeat, only)
+
+
+def measure(records, repeat=5, processes=3, only=None):
+    """在 processes 个新启动的解释器中依次各跑一遍 bench_stages / bench_replay，合并各轮。
+
+    返回 {'stages': {阶段: {'rps', 'rounds', 'peak_kib'}}, 'replay': {模式: 每秒记录数}, 'replay_rounds': {模式: 各轮}}，
+    每秒记录数取全部轮次中最快的一轮。processes 为 0 时在当前进程内测量。
+    """
+    if processes <= 0:
+        runs = [_measure_once(records, repeat, only)]
+    else:
+        # 每个进程只跑一次（max_tasks_per_child=1），依次执行，彼此不争抢 CPU
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx, max_tasks_per_child=1) as pool:
+            runs = [pool.submit(_measure_once, records, repeat, only).result() for _ in range(processes)]
+    stages, replay_rounds = {}, {}
+    for run_stages, run_replay in runs:
+        for name, r in run_stages.items():
+            cur = stages.setdefault(name, {'rps': 0.0, 'rounds': [], 'peak_kib': 0.0})
+            cur['rounds'] = sorted(cur['rounds'] + r['rounds'])
+            cur['rps'] = cur['rounds'][-1]
+            cur['peak_kib'] = max(cur['peak_kib'], r['peak_kib'])
+        for mode, rounds in run_replay.items():
+            replay_rounds[mode] = sorted(replay_rounds.get(mode, []) + rounds)
+    return {'stages': stages, 'replay': {mode: rounds[-1] for mode, rounds in replay_rounds.items()},
+            'replay_rounds': replay_rounds}
+
+
+def _merge(result, extra):
+    # 把复测的各轮并入 result，重新取最快一轮
+    for name, r in extra['stages'].items():
+        cur = result['stages'][name]
+        cur['rounds'] = sorted(cur.get('rounds', []) + r['rounds'])
+        cur['rps'] = cur['rounds'][-1]
+    for mode, rounds in extra['replay_rounds'].items():
+        merged = sorted(result['replay_rounds'].get(mode, []) + rounds)
+        result['replay_rounds'][mode] = merged
+        result['replay'][mode] = merged[-1]
+
+
+def compare(current, baseline, threshold=0.1):
+    """打印与基线的对比，返回退化项列表。速度下降或内存上升超过 threshold（比例）视为退化。"""
+    regressions = []
+    print(f"\n与基线对比（阈值 {threshold:.0%}）：")
+    for name, cur in current['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            continue
+        speed = cur['rps'] / base['rps'] - 1 if base['rps'] else 0.0
+        mem = cur['peak_kib'] / base['peak_kib'] - 1 if base['peak_kib'] else 0.0
+        flags = []
+        if speed < -threshold:
+            flags.append('速度退化')
+        if mem > threshold:
+            flags.append('内存退化')
+        if flags:
+            regressions.append(name)
+        print(f"  {name:<22} {speed:+7.1%} records/s  {mem:+7.1%} peak  {' '.join(flags)}")
+    for mode, rate in current['replay'].items():
+        base_rate = baseline.get('replay', {}).get(mode)
+        if not base_rate:
+            continue
+        speed = rate / base_rate - 1
+        flag = '速度退化' if speed < -threshold else ''
+        if flag:
+            regressions.append(mode)
+        print(f"  {mode:<22} {speed:+7.1%} records/s  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='解析器性能基准')
+    ap.add_argument('--limit', type=int, default=None, help='最多使用 N 条记录')
+    ap.add_argument('--repeat', type=int, default=5, help='每个进程内每种模式重复的轮数（默认 5）')
+    ap.add_argument('--processes', type=int, default=3,
+                    help='分别在几个新启动的解释器中计时，取全部轮次中最快的一轮（默认 3；0 表示在当前进程内）')
+    ap.add_argument('--synthetic', type=int, default=None, metavar='N', help='改用 N 条合成记录（固定种子）')
+    ap.add_argument('--save', default=None, help='把结果保存为 JSON')
+    ap.add_argument('--compare', default=None, help='与之前 --save 的结果对比')
+    ap.add_argument('--threshold', type=float, default=0.15, help='判定退化的比例（默认 0.15）')
+    args = ap.parse_args(argv)
+
+    if args.synthetic:
+        from synth import generate_records
+        records = [content for _, content in generate_records(args.synthetic)]
+    else:
+        records = load_records(args.limit)
+    if not records:
+        print('没有可用的记录，请先下载到 data/origin 或导入 data/archive，或使用 --synthetic N')
+        return
+    print(f"记录数: {len(records)}")
+
+    result = {
+        'records': len(records),
+        'synthetic': bool(args.synthetic),
+        'python': platform.python_version(),
+        **measure(records, args.repeat, args.processes),
+    }
+    for name, r in result['stages'].items():
+        print(f"  {name:<22} {r['rps']:12.1f} records/s  {r['peak_kib']:10.1f} KiB peak")
+    for mode, rate in result['replay'].items():
+        print(f"  {mode:<22} {rate:12.1f} records/s")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('records') != result['records'] or baseline.get('synthetic') != result['synthetic']:
+            print("[WARN] 基线使用的记录集与本次不同，对比结果仅供参考")
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            # 一次偶然的慢进程不应让命令失败：疑似退化的项目用新进程复测，合并各轮后重新判断
+            print(f"复测: {', '.join(regressions)}")
+            _merge(result, measure(records, args.repeat, args.processes, only=set(regressions)))
+            regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"性能退化: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+# catalog.py
+# 本地 SQLite 目录（data/catalog.db），取代 record_lists.json → selected.json → all_record.json →
+# record_parent_map.json 这条 JSON 文件链：
+#   games           历史列表中的场次（history.py 增量写入）
+#   selected        当前选中的场次（select_session.py）
+#   sessions        已展开的场次；records 为其下的对局记录及局序（session.py）
+#   record_players  对局记录的开始时间与玩家（batch_process.py 解析时顺带写入）
+# 各阶段都按主键 upsert，不再整体重写；筛选走索引查询（标题子串走 FTS5 trigram 索引）。
+#
+# 用法：
+#   python catalog.py import     # 把已有的 JSON 文件导入目录
+#   python catalog.py export     # 从目录导出兼容旧流程的 JSON 文件
+#   python catalog.py info
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from archive import load_json, write_json
+
+CATALOG_PATH = os.path.join('data', 'catalog.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    start_time INTEGER,
+    raw TEXT,
+    seen_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_start_time ON games(start_time);
+CREATE TABLE IF NOT EXISTS selected (
+    game_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    fetched_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    order_in_session INTEGER,
+    start_time INTEGER
+);
+CREATE INDEX IF NOT EXISTS records_session ON records(session_id, order_in_session);
+CREATE INDEX IF NOT EXISTS records_start_time ON records(start_time);
+CREATE TABLE IF NOT EXISTS record_players (
+    record_id TEXT NOT NULL,
+    seat INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (record_id, seat)
+);
+CREATE INDEX IF NOT EXISTS record_players_name ON record_players(name);
+"""
+
+# 标题子串索引；trigram 分词只能匹配 3 个字符及以上的子串，更短的查询退回 LIKE
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(id UNINDEXED, title, tokenize='trigram')"
+
+
+def _game_start_time(game):
+    # 历史列表条目若带开始时间（毫秒）则直接使用，否则等记录解析后由 record_players 回填
+    t = game.get('t') if isinstance(game, dict) else None
+    return t if isinstance(t, int) else None
+
+
+class Catalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        try:
+            self.conn.execute(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+        self.conn.commit()
+
+    @staticmethod
+    def exists(path=CATALOG_PATH):
+        return os.path.exists(path)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 历史列表 ----------
+
+    def upsert_games(self, games):
+        now = int(time.time())
+        rows = [(g['id'], g.get('title') or '', _game_start_time(g), json.dumps(g, ensure_ascii=False), now)
+                for g in games if isinstance(g, dict) and g.get('id')]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO games (id, title, start_time, raw, seen_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title = excluded.title, "
+                "start_time = COALESCE(excluded.start_time, games.start_time), raw = excluded.raw",
+                rows)
+            if self.has_fts:
+                self.conn.executemany("DELETE FROM games_fts WHERE id = ?", [(r[0],) for r in rows])
+                self.conn.executemany("INSERT INTO games_fts (id, title) VALUES (?, ?)", [(r[0], r[1]) for r in rows])
+        return len(rows)
+
+    def game_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def newest_game_id(self):
+        # 每次抓取按页序（新 → 旧）插入，seen_at 最大的一批中 rowid 最小的即为最新场次
+        row = self.conn.execute("SELECT id FROM games ORDER BY seen_at DESC, rowid LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def games(self):
+        """全部历史场次的原始条目，顺序同 newest_game_id。"""
+        return [json.loads(raw) if raw else {'id': gid, 'title': title} for gid, title, raw in self.conn.execute(
+            "SELECT id, title, raw FROM games ORDER BY seen_at DESC, rowid")]
+
+    def known_game_ids(self, game_ids):
+        game_ids = list(game_ids)
+        if not game_ids:
+            return set()
+        marks = ','.join('?' * len(game_ids))
+        return {row[0] for row in self.conn.execute(f"SELECT id FROM games WHERE id IN ({marks})", game_ids)}
+
+    def find_games(self, title=None, since=None, until=None, player=None, limit=None):
+        """按标题子串、开始时间范围（毫秒）、玩家名筛选场次，返回 [{'id', 'title'}]，新场次在前。"""
+        where, params = [], []
+        if title:
+            if self.has_fts and len(title) >= 3:
+                where.append("g.id IN (SELECT id FROM games_fts WHERE title LIKE ?)")
+            else:
+                where.append("g.title LIKE ?")
+            params.append(f"%{title}%")
+        if since is not None:
+            where.append("g.start_time >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("g.start_time < ?")
+            params.append(until)
+        if player:
+            where.append("g.id IN (SELECT r.session_id FROM record_players p "
+                         "JOIN records r ON r.id = p.record_id WHERE p.name = ?)")
+            params.append(player)
+        sql = "SELECT g.id, g.title FROM games g"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY g.start_time DESC, g.rowid"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [{'id': gid, 'title': title} for gid, title in self.conn.execute(sql, params)]
+
+    # ---------- 选中的场次 ----------
+
+    def set_selected(self, game_ids):
+        with self.conn:
+            self.conn.execute("DELETE FROM selected")
+            self.conn.executemany("INSERT OR IGNORE INTO selected (game_id) VALUES (?)", [(g,) for g in game_ids])
+
+    def selected_games(self):
+        return [{'id': gid, 'title': title} for gid, title in self.conn.execute(
+            "SELECT s.game_id, g.title FROM selected s LEFT JOIN games g ON g.id = s.game_id ORDER BY s.rowid")]
+
+    # ---------- 场次与对局记录 ----------
+
+    def upsert_session(self, session_id, title, records):
+        """records: [(局序, 记录id)]。"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO sessions (id, title, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title = excluded.title, fetched_at = excluded.fetched_at",
+                (session_id, title, int(time.time())))
+            self.conn.executemany(
+                "INSERT INTO records (id, session_id, order_in_session) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET session_id = excluded.session_id, "
+                "order_in_session = excluded.order_in_session",
+                [(rid, session_id, order) for order, rid in records])
+
+    def has_sessions(self):
+        return self.conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is not None
+
+    def record_ids(self):
+        return [row[0] for row in self.conn.execute(
+            "SELECT r.id FROM records r JOIN sessions s ON s.id = r.session_id "
+            "ORDER BY s.rowid, r.order_in_session")]
+
+    def parent_map(self):
+        """与 record_parent_map.json 相同结构的 {记录id: {session_id, title, order_in_session}}。"""
+        return {rid: {'session_id': sid, 'title': title, 'order_in_session': order}
+                for rid, sid, title, order in self.conn.execute(
+                    "SELECT r.id, r.session_id, s.title, r.order_in_session "
+                    "FROM records r JOIN sessions s ON s.id = r.session_id")}
+
+    def sessions(self):
+        grouped = {}
+        for sid, title, rid in self.conn.execute(
+                "SELECT s.id, s.title, r.id FROM sessions s LEFT JOIN records r ON r.session_id = s.id "
+                "ORDER BY s.rowid, r.order_in_session"):
+            entry = grouped.setdefault(sid, {'session_id': sid, 'title': title, 'records': []})
+            if rid:
+                entry['records'].append(rid)
+        return list(grouped.values())
+
+    def upsert_record_meta(self, rows):
+        """rows: [(记录id, 开始时间毫秒, [四家玩家名])]，同时回填所属场次缺失的开始时间。"""
+        with self.conn:
+            self.conn.executemany("UPDATE records SET start_time = ? WHERE id = ?",
+                                  [(start, rid) for rid, start, _ in rows])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO record_players (record_id, seat, name) VALUES (?, ?, ?)",
+                [(rid, seat, name) for rid, _, names in rows for seat, name in enumerate(names)])
+            self.conn.executemany(
+                "UPDATE games SET start_time = (SELECT MIN(start_time) FROM records WHERE session_id = games.id) "
+                "WHERE start_time IS NULL AND id = (SELECT session_id FROM records WHERE id = ?)",
+                [(rid,) for rid, _, _ in rows])
+
+    # ---------- 与 JSON 文件互转 ----------
+
+    def import_json(self):
+        counts = {}
+        games = load_json('record_lists.json', [])
+        counts['games'] = self.upsert_games(games)
+        selected = load_json('selected.json', [])
+        if selected:
+            self.upsert_games([s for s in selected if s.get('id') and not self.known_game_ids([s['id']])])
+            self.set_selected([s['id'] for s in selected if s.get('id')])
+        counts['selected'] = len(selected)
+        parent_map = load_json('record_parent_map.json', {})
+        sessions = load_json('all_record.json', [])
+        for s in sessions:
+            if isinstance(s, dict) and 'session_id' in s:
+                records = [(parent_map.get(rid, {}).get('order_in_session', i + 1), rid)
+                           for i, rid in enumerate(s.get('records', []))]
+                self.upsert_session(s['session_id'], s.get('title'), records)
+        counts['sessions'] = len(sessions)
+        return counts
+
+    def export_json(self):
+        write_json('record_lists.json', self.games())
+        write_json('selected.json', self.selected_games())
+        write_json('all_record.json', self.sessions())
+        write_json('record_parent_map.json', self.parent_map())
+
+
+def load_parent_map(path=CATALOG_PATH):
+    """记录 → 所属场次映射：优先读目录，目录不存在或尚未展开场次时读旧的 record_parent_map.json。"""
+    if Catalog.exists(path):
+        with Catalog(path) as catalog:
+            if catalog.has_sessions():
+                return catalog.parent_map()
+    return load_json('record_parent_map.json', {})
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='本地 SQLite 目录')
+    ap.add_argument('cmd', choices=['import', 'export', 'info'])
+    ap.add_argument('--db', default=CATALOG_PATH)
+    args = ap.parse_args(argv)
+
+    if args.cmd != 'import' and not Catalog.exists(args.db):
+        print(f"目录不存在: {args.db}（可先运行 python catalog.py import）", file=sys.stderr)
+        sys.exit(1)
+    with Catalog(args.db) as catalog:
+        if args.cmd == 'import':
+            counts = catalog.import_json()
+            print(f"已导入：场次 {counts['games']}，选中 {counts['selected']}，已展开 {counts['sessions']} -> {args.db}")
+        elif args.cmd == 'export':
+            catalog.export_json()
+            print("已导出 record_lists.json / selected.json / all_record.json / record_parent_map.json")
+        else:
+            for table in ('games', 'selected', 'sessions', 'records', 'record_players'):
+                n = catalog.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                print(f"{table:<15} {n}")
+
+
+if __name__ == '__main__':
+    main()
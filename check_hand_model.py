@@ -0,0 +1,294 @@
+# check_hand_model.py
+# 差分校验：对存档中的每条记录，用冻结在本文件中的原始复盘循环（_BaselineReplay，有序列表 + remove/sort）
+# 作为基准，分别与当前解析器的 ListHand 与 CountHand 复盘结果比较，
+# 检查 initial_hands / packs_output / get_win_analysis() 等公开输出是否完全一致。
+#
+# 用法：python check_hand_model.py [--workers N] [--limit N]
+
+import argparse
+import base64
+import json
+import sys
+import zlib
+
+from fan_table import FAN_NAMES
+from parser import MahjongRecordParser
+from hand_model import ListHand, CountHand
+from archive import shared_origin_store
+from workers import map_ordered
+
+
+class _BaselineReplay:
+    """原始 parser.py（改用计数手牌与动作数组之前）的复盘逻辑的冻结副本，去掉了打印。不要随解析器一起修改。"""
+
+    def __init__(self, record_content):
+        record_json = json.loads(record_content)
+        self.script_data = json.loads(zlib.decompress(base64.b64decode(record_json['script'])).decode('utf-8'))
+        self.actions = [{'p': (a[0] >> 4) & 3, 'a': a[0] & 15, 'd': a[1], 't': a[2]}
+                        for a in self.script_data.get('a', [])]
+        self.hands = [[] for _ in range(4)]
+        self.packs = [[] for _ in range(4)]
+        self.packs_output = [[] for _ in range(4)]
+        self.discards = [[] for _ in range(4)]
+        self.flower_counts = [0] * 4
+        self.flower_tile = [[] for _ in range(4)]
+        self.initial_hands = [[] for _ in range(4)]
+        self.win_info = None
+        self.last_discard_info = {}
+        self.current_player_idx = -1
+        self.wall = []
+        self.wall_front_ptr = 0
+        self.last_draw_tiles = [None] * 4
+
+    get_tile_str = MahjongRecordParser.get_tile_str
+    get_tile_GB_str = MahjongRecordParser.get_tile_GB_str
+    TILE_IDENTITY = MahjongRecordParser.TILE_IDENTITY
+    FLOWER_TILES = MahjongRecordParser.FLOWER_TILES
+    WIND = MahjongRecordParser.WIND
+
+    def _setup_wall_and_deal(self):
+        w = self.script_data['w']
+        wall_indices = [int(w[i:i + 2], 16) for i in range(0, len(w), 2)]
+        d = self.script_data['d']
+        dice = [d & 15, (d >> 4) & 15, (d >> 8) & 15, (d >> 12) & 15]
+        dealer_idx = self.script_data['i'] % 4
+        for p in range(4):
+            if self.WIND[p] == '东':
+                dealer_idx = p
+        wall_break_pos = (dealer_idx - (dice[0] + dice[1] - 1) + 4) % 4
+        start_pos = ((wall_break_pos * 36) + (dice[0] + dice[1] + dice[2] + dice[3]) * 2) % 144
+        self.wall = wall_indices[start_pos:] + wall_indices[:start_pos]
+        for i in range(3):
+            for p_offset in range(4):
+                player_idx = (dealer_idx + p_offset) % 4
+                self.hands[player_idx].extend(self.wall[self.wall_front_ptr: self.wall_front_ptr + 4])
+                self.wall_front_ptr += 4
+        for p_offset in range(4):
+            self.hands[(dealer_idx + p_offset) % 4].append(self.wall[self.wall_front_ptr])
+            self.wall_front_ptr += 1
+        self.hands[dealer_idx].append(self.wall[self.wall_front_ptr])
+        self.wall_front_ptr += 1
+        for i in range(4):
+            self.hands[i].sort()
+            self.initial_hands[i] = [self.get_tile_str(t) for t in self.hands[i]]
+        self.current_player_idx = dealer_idx
+
+    def run_analysis(self):
+        self._setup_wall_and_deal()
+        for act in self.actions:
+            p_idx, a_type, data = act['p'], act['a'], act['d']
+            lo_byte, hi_byte = data & 0xFF, (data >> 8) & 0xFF
+            if a_type == 1:
+                self.flower_counts[p_idx] += 1
+                ot = (hi_byte & 15) + 136
+                self.flower_tile[p_idx].append(self.get_tile_str(ot))
+                self.hands[p_idx].remove(ot)
+                self.hands[p_idx].append(lo_byte)
+                self.last_draw_tiles[p_idx] = lo_byte
+            elif a_type == 2:
+                self.current_player_idx = p_idx
+                tile = lo_byte
+                if tile in self.hands[p_idx]: self.hands[p_idx].remove(tile)
+                self.discards[p_idx].append(tile)
+                self.last_discard_info = {'tile': tile, 'player': p_idx}
+            elif a_type in [3, 4, 5]:
+                tile_val = (data & 0x3F) << 2
+                offer_from_idx = (p_idx + ((data >> 6) & 3)) % 4
+                self.current_player_idx = p_idx
+                if data == 0:
+                    continue
+                if a_type == 3:
+                    offer_tile = self.last_discard_info['tile']
+                    if tile_val - 4 + ((data >> 10) & 3) < 0:
+                        tile_val = offer_tile
+                    chi_tiles = [tile_val - 4 + ((data >> 10) & 3), tile_val + ((data >> 12) & 3),
+                                 tile_val + 4 + ((data >> 14) & 3)]
+                    chi_id = 1
+                    chi_shape = []
+                    for t in range(3):
+                        if chi_tiles[t] >> 2 == offer_tile >> 2:
+                            chi_id = t + 1
+                            chi_shape.append(f"({self.get_tile_str(chi_tiles[t])})")
+                        else:
+                            for _ in self.hands[p_idx]:
+                                if (_ >> 2) == (chi_tiles[t] >> 2):
+                                    self.hands[p_idx].remove(_)
+                                    break
+                            chi_shape.append(self.get_tile_str(chi_tiles[t]))
+                    self.packs[p_idx].append(("CHI", self.get_tile_GB_str(tile_val), chi_id))
+                    self.packs_output[p_idx].append(chi_shape)
+                    try:
+                        self.discards[offer_from_idx].pop()
+                    except IndexError:
+                        pass
+                elif a_type == 4:
+                    count = 0
+                    for t in list(self.hands[p_idx]):
+                        if (t >> 2) == (tile_val >> 2) and count < 2:
+                            self.hands[p_idx].remove(t)
+                            count += 1
+                    self.packs[p_idx].append(("PENG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
+                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(3)])
+                    try:
+                        self.discards[offer_from_idx].pop()
+                    except IndexError:
+                        pass
+                elif (data & 0x0300) == 0x0300:  # 加杠
+                    self.last_discard_info = {'tile': tile_val, 'player': p_idx}
+                    for t in list(self.hands[p_idx]):
+                        if (t >> 2) == (tile_val >> 2):
+                            self.hands[p_idx].remove(t)
+                            break
+                    for i, (pt, pstr, po) in enumerate(self.packs[p_idx]):
+                        if pt == "PENG" and pstr == self.get_tile_str(tile_val):
+                            self.packs[p_idx][i] = ("GANG", pstr, po)
+                            self.packs_output[p_idx][i] = [self.get_tile_str(tile_val) for _ in range(4)]
+                            break
+                elif (data >> 6) & 3 == 0:  # 暗杠
+                    count = 0
+                    for t in list(self.hands[p_idx]):
+                        if (t >> 2) == (tile_val >> 2) and count < 4:
+                            self.hands[p_idx].remove(t)
+                            count += 1
+                    self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), 0))
+                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
+                else:  # 明杠
+                    for _ in range(3):
+                        count = 0
+                        for t in self.hands[p_idx]:
+                            if (t >> 2) == (tile_val >> 2) and count < 3:
+                                self.hands[p_idx].remove(t)
+                                count += 1
+                    self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
+                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
+                    try:
+                        self.discards[offer_from_idx].pop()
+                    except IndexError:
+                        pass
+            elif a_type == 6:
+                if data == 0:
+                    continue
+                is_self_drawn = p_idx == self.current_player_idx
+                win_tile = self.last_draw_tiles[p_idx] if is_self_drawn else self.last_discard_info['tile']
+                self.win_info = {'winner': p_idx, 'win_tile': win_tile, 'is_self_drawn': is_self_drawn}
+                if not is_self_drawn: self.hands[p_idx].append(win_tile)
+                break
+            elif a_type == 7:
+                self.current_player_idx = p_idx
+                self.hands[p_idx].append(lo_byte)
+                self.last_draw_tiles[p_idx] = lo_byte
+            self.hands[p_idx].sort()
+        if self.win_info:
+            # 原 _print_fan_info 打印前会把和牌者的手牌排序
+            self.hands[self.win_info['winner']].sort()
+
+    def get_win_analysis(self):
+        if not self.win_info:
+            return None
+        w_idx = self.win_info['winner']
+        win_data = self.script_data['y'][w_idx]
+        total_fan = win_data.get('f') if isinstance(win_data, dict) else None
+        fan_details = win_data.get('t', {}) if isinstance(win_data, dict) else {}
+        calculated_fan_sum = 0
+        for fan_id_str, fan_val in fan_details.items():
+            if int(fan_id_str) == 83:
+                continue
+            calculated_fan_sum += (fan_val & 0xFF) * ((fan_val >> 8) + 1)
+        flower_count = self.flower_counts[w_idx]
+        if total_fan is None:
+            total_fan = calculated_fan_sum + flower_count
+            base_fan = calculated_fan_sum
+        else:
+            base_fan = max(total_fan - flower_count, 0)
+        suits = {'m': [], 'p': [], 's': [], 'z': []}
+        for tile in (self.get_tile_str(t) for t in self.hands[w_idx]):
+            num, suit_char = (tile[:-1], tile[-1]) if tile[:-1] else (tile[0], '')
+            if suit_char in suits:
+                suits[suit_char].append(num)
+            else:
+                suits['z'].append(num)
+        hand_str = ' '.join(f"{''.join(sorted(suits[c]))}{c if c != 'z' else ''}"
+                            for c in ['m', 'p', 's', 'z'] if suits[c])
+        packs_str = ' '.join(f"[{''.join(p)}]" for p in self.packs_output[w_idx])
+        fan_vector = [0] * len(FAN_NAMES)
+        for fan_id_str, fan_val in fan_details.items():
+            fan_id = int(fan_id_str)
+            if 0 <= fan_id < len(FAN_NAMES):
+                fan_vector[fan_id] = (fan_val >> 8) + 1
+        return {
+            "winner_name": self.script_data['p'][w_idx]['n'],
+            "base_fan": base_fan,
+            "flower_count": flower_count,
+            "total_fan": total_fan,
+            "formatted_hand": f"{hand_str} {packs_str}".strip(),
+            "fan_vector": fan_vector,
+            "fan_names": list(FAN_NAMES),
+            "winning_tile": self.get_tile_str(self.win_info['win_tile']),
+            "game_title": self.script_data['g']['t'],
+        }
+
+
+def _outputs(parser):
+    analysis = parser.get_win_analysis()
+    if analysis:
+        analysis = {**analysis, 'fan_names': list(analysis['fan_names'])}
+    return {
+        'initial_hands': parser.initial_hands,
+        'packs_output': parser.packs_output,
+        'packs': parser.packs,
+        # 只比较手牌内容：ListHand 不在每个动作后排序，get_win_analysis 也不依赖顺序
+        'hands': [sorted(h) for h in parser.hands],
+        'discards': parser.discards,
+        'flower_counts': parser.flower_counts,
+        'win_analysis': analysis,
+    }
+
+
+def _replay(record_content, hand_model):
+    parser = MahjongRecordParser(record_content, hand_model=hand_model)
+    parser.run_analysis()
+    return _outputs(parser)
+
+
+def compare_record(record_id):
+    # 返回 (record_id, 不一致的字段列表（"手牌模型.字段"）, 错误信息)
+    try:
+        record_content = shared_origin_store().get(record_id)
+        if not record_content.strip():
+            return record_id, [], None
+        baseline = _BaselineReplay(record_content)
+        baseline.run_analysis()
+        expected = _outputs(baseline)
+        diff = []
+        for hand_model in (ListHand, CountHand):
+            actual = _replay(record_content, hand_model)
+            if expected['win_analysis'] and actual['win_analysis']:
+                # 之后新增的字段（如 is_self_drawn）不在原始输出中，只比较原有字段
+                actual['win_analysis'] = {k: actual['win_analysis'].get(k) for k in expected['win_analysis']}
+            diff += [f"{hand_model.__name__}.{k}" for k in expected if expected[k] != actual[k]]
+        return record_id, diff, None
+    except Exception as e:
+        return record_id, [], str(e)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='原始复盘逻辑与 ListHand / CountHand 复盘的差分校验')
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--limit', type=int, default=None, help='只校验前 N 条记录')
+    args = ap.parse_args(argv)
+
+    record_ids = shared_origin_store().ids()[:args.limit]
+    mismatched = errors = 0
+    for record_id, diff, error in map_ordered(compare_record, record_ids, workers=args.workers):
+        if error:
+            errors += 1
+            print(f"[ERROR] {record_id}: {error}")
+        elif diff:
+            mismatched += 1
+            print(f"[DIFF] {record_id}: {', '.join(diff)}")
+    print(f"校验 {len(record_ids)} 条记录：不一致 {mismatched} 条，解析错误 {errors} 条")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# downloader.py
+# 牌谱下载的公共实现：main.py 与 batch_process.py 共用。
+# 单条下载走 download_record；批量下载走 download_many（线程池 + 共享连接池 + 重试 + 按主机限速）。
+# 接口地址默认为 https://tziakcha.net，可用环境变量 TZI_BASE_URL 或各脚本的 --base-url 指向本地替身（mock_server.py）。
+
+import sys
+import os
+import time
+import random
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from archive import write_atomic
+
+DEFAULT_BASE_URL = "https://tziakcha.net"
+RECORD_PATH = "/_qry/record/"
+HEADERS = {
+    "accept": "*/*",
+    "content-type": "text/plain;charset=UTF-8"
+}
+ORIGIN_DIR = os.path.join("data", "origin")
+
+# 视为暂时性故障、值得重试的状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_base_url = (os.getenv("TZI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+
+def set_base_url(base_url):
+    """切换接口地址（例如 http://127.0.0.1:8765）；为空时保持不变。"""
+    global _base_url
+    if base_url:
+        _base_url = base_url.rstrip("/")
+
+
+def api_url(path):
+    return _base_url + path
+
+
+DownloadResult = namedtuple("DownloadResult", ["record_id", "ok", "attempts", "elapsed", "error", "nbytes"],
+                            defaults=[0])
+
+
+class FetchError(Exception):
+    def __init__(self, message, attempts):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+class RateLimiter:
+    """按固定间隔放行请求，rate 为每秒请求数；rate 为空或 <= 0 时不限速。"""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Fetcher:
+    """共享 keep-alive 连接池的 POST 客户端，带指数退避重试与按主机限速。"""
+
+    def __init__(self, concurrency=8, rate=None, retries=3, backoff=0.5, timeout=10, headers=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate = rate
+        self.session = requests.Session()
+        self.session.headers.update(headers or HEADERS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(concurrency, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def _limiter(self, url):
+        host = urlparse(url).netloc
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.rate)
+            return self._limiters[host]
+
+    def _delay(self, attempt, response=None):
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+
+    def post(self, url, data="", headers=None):
+        return self.post_counted(url, data, headers)[0]
+
+    def post_counted(self, url, data="", headers=None):
+        """同 post，返回 (响应文本, 实际请求次数)，便于区分一次成功与重试后成功。"""
+        limiter = self._limiter(url)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            limiter.acquire()
+            response = None
+            try:
+                response = self.session.post(url, data=data, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.text, attempt + 1
+                last_error = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                # ChunkedEncodingError：响应体没收完连接就断了（IncompleteRead），同样是暂时性故障
+                last_error = str(e)
+            except requests.exceptions.RequestException as e:
+                # 4xx 等非暂时性错误不重试
+                raise FetchError(str(e), attempt + 1)
+            if attempt < self.retries:
+                time.sleep(self._delay(attempt, response))
+        raise FetchError(last_error, self.retries + 1)
+
+    def close(self):
+        self.session.close()
+
+
+def download_record(record_id, fetcher=None):
+    owns_fetcher = fetcher is None
+    if owns_fetcher:
+        fetcher = Fetcher(concurrency=1)
+    try:
+        return fetcher.post(api_url(RECORD_PATH), data=f"id={record_id}")
+    except FetchError as e:
+        print(f"Download failed for {record_id}: {e}", file=sys.stderr)
+        return None
+    finally:
+        if owns_fetcher:
+            fetcher.close()
+
+
+def save_origin(record_id, data, origin_dir=ORIGIN_DIR):
+    os.makedirs(origin_dir, exist_ok=True)
+    write_atomic(os.path.join(origin_dir, f"{record_id}.json"), data)
+
+
+def fetch_and_store(fetcher, record_id, store=None, origin_dir=ORIGIN_DIR):
+    """下载一条记录并写入 store（未指定时为 origin_dir 目录），返回 DownloadResult；不抛出异常。"""
+    start = time.perf_counter()
+    try:
+        data, attempts = fetcher.post_counted(api_url(RECORD_PATH), data=f"id={record_id}")
+    except FetchError as e:
+        return DownloadResult(record_id, False, e.attempts, time.perf_counter() - start, str(e))
+    try:
+        if store is not None:
+            store.put(record_id, data)
+        else:
+            save_origin(record_id, data, origin_dir)
+    except OSError as e:
+        return DownloadResult(record_id, False, attempts, time.perf_counter() - start, str(e))
+    return DownloadResult(record_id, True, attempts, time.perf_counter() - start, None, len(data))
+
+
+def _print_result(done, total, result):
+    if result.ok:
+        print(f"  [{done}/{total}] ✅ {result.record_id} ({result.elapsed:.2f}s)")
+    else:
+        print(f"  [{done}/{total}] ❌ {result.record_id} after {result.attempts} attempt(s): {result.error}")
+
+
+def download_many(record_ids, concurrency=8, rate=None, retries=3, origin_dir=ORIGIN_DIR,
+                  on_result=_print_result, store=None):
+    """并发下载并保存到 store（未指定时为 origin_dir 目录），按输入顺序返回每条记录的 DownloadResult。"""
+    record_ids = list(dict.fromkeys(record_ids))
+    fetcher = Fetcher(concurrency=concurrency, rate=rate, retries=retries)
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+            futures = [pool.submit(fetch_and_store, fetcher, record_id, store, origin_dir)
+                       for record_id in record_ids]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results[result.record_id] = result
+                if on_result:
+                    on_result(done, len(record_ids), result)
+    finally:
+        fetcher.close()
+    return [results[record_id] for record_id in record_ids]
@@ -0,0 +1,334 @@
+# export_dataset.py
+# 训练数据导出：并行复盘记录，把每个决策点（舍牌 / 吃碰杠 / 过 / 点和）编码为固定形状的 int8 特征平面与动作标签，
+# 按块写成可内存映射的 .npy 分片，训练时直接 np.load(..., mmap_mode='r') 流式读取，不必重新解析 JSON。
+#
+# 目录布局（默认 data/dataset）：
+#   index.json                 分片列表、每片行数、特征平面与动作的名称、解析器版本、记录 id 文件名
+#   records-00000.txt          记录 id，一行一条；meta 第 0 列为其行号
+#   shard-00000.planes.npy     (n, N_PLANES, 34) int8，决策者视角的局面（动作之前）
+#   shard-00000.labels.npy     (n, 2) int8：动作类别（ACTIONS 下标）、牌种（见下，无则 -1）
+#   shard-00000.meta.npy       (n, 3) int32：记录行号、动作下标、座位
+#
+# 重新导出时新分片接着已有编号写，写完后原子替换 index.json，再删除新索引不再引用的旧文件：
+# 导出中途失败时上一次的导出保持完整，新索引就位之前读取方看到的一直是旧的一套。
+#
+# 标签中的牌种：舍牌为打出的牌，碰 / 杠 / 和为所取的牌，吃为顺子最小的一张，过为 -1。
+# 自家回合的暗杠、加杠与自摸不在导出范围内（它们不是对舍牌的应答，也不改变舍牌决策的局面）。
+#
+# 用法：
+#   python export_dataset.py [--out data/dataset] [--workers N] [--shard-size 65536] [--limit N]
+#   读取：
+#     from export_dataset import iter_shards
+#     for planes, labels, meta in iter_shards('data/dataset'): ...
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from archive import write_atomic, write_json
+from parser import MahjongRecordParser
+from shanten import hand_counts, KIND_COUNT
+
+DATASET_DIR = os.path.join('data', 'dataset')
+
+# 特征平面，座位均相对决策者：self 自家、next 下家、across 对家、prev 上家
+PLANES = ('hand',
+          'melds_self', 'melds_next', 'melds_across', 'melds_prev',
+          'discards_self', 'discards_next', 'discards_across', 'discards_prev',
+          'offered')
+N_PLANES = len(PLANES)
+
+ACTIONS = ('discard', 'chi', 'peng', 'kong', 'pass', 'win')
+DISCARD, CHI, PENG, KONG, PASS, WIN = range(len(ACTIONS))
+
+# 副露中的牌名（get_tile_GB_str）→ 牌种
+_TILE_KIND = {name: kind for kind, name in enumerate(MahjongRecordParser.TILE_IDENTITY)}
+
+
+def _board(parser):
+    """所有人可见的牌面：(副露, 自家暗杠, 舍牌)，均为 (4, 34) int8。他家的暗杠对决策者不可见，单独存放。"""
+    melds = np.zeros((4, KIND_COUNT), dtype=np.int8)
+    concealed = np.zeros((4, KIND_COUNT), dtype=np.int8)
+    discards = np.zeros((4, KIND_COUNT), dtype=np.int8)
+    for seat in range(4):
+        for pack_type, name, offer in parser.packs[seat]:
+            kind = _TILE_KIND[name]
+            if pack_type == 'CHI':
+                melds[seat, kind - 1:kind + 2] += 1
+            elif pack_type == 'PENG':
+                melds[seat, kind] += 3
+            elif offer == 0:
+                concealed[seat, kind] += 4
+            else:
+                melds[seat, kind] += 4
+        for tile in parser.discards[seat]:
+            discards[seat, tile >> 2] += 1
+    return melds, concealed, discards
+
+
+def encode(seat, hand, board, offered=-1):
+    """决策者 seat 视角的 (N_PLANES, 34) 特征；hand 为其手牌的 34 维计数，offered 为待应答的舍牌牌种。"""
+    melds, concealed, discards = board
+    order = [(seat + r) % 4 for r in range(4)]
+    x = np.zeros((N_PLANES, KIND_COUNT), dtype=np.int8)
+    x[0] = hand
+    x[1:5] = melds[order]
+    x[1] += concealed[seat]
+    x[5:9] = discards[order]
+    if offered >= 0:
+        x[9, offered] = 1
+    return x
+
+
+class DecisionRecorder:
+    """作为 run_analysis 的 tracer 使用，收集每个决策点动作之前的特征与动作标签。
+
+    on_action 在动作应用之后调用：舍牌决策的局面由舍牌后的状态把那张牌放回手中得到；
+    对舍牌的应答（吃碰杠 / 过 / 点和）共用舍牌之后的局面，在舍牌时记下，直到有人摸牌或鸣牌为止。
+    放弃的吃碰杠与和（data 为 0，经 on_skipped 传入）与“过”一样记为 PASS。
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.planes = []
+        self.labels = []
+        self.meta = []
+        self._window = None
+
+    def on_start(self):
+        self.planes, self.labels, self.meta = [], [], []
+        self._window = None
+
+    def _add(self, features, action, tile, index, seat):
+        self.planes.append(features)
+        self.labels.append((action, tile))
+        self.meta.append((index, seat))
+
+    def on_action(self, index, p_idx, a_type, data, time):
+        parser = self.parser
+        if a_type == 2:
+            kind = (data & 0xFF) >> 2
+            board = _board(parser)
+            hands = [hand_counts(h) for h in parser.hands]
+            before = list(hands[p_idx])
+            before[kind] += 1
+            melds, concealed, discards = board
+            discards_before = discards.copy()
+            discards_before[p_idx, kind] -= 1
+            self._add(encode(p_idx, before, (melds, concealed, discards_before)), DISCARD, kind, index, p_idx)
+            self._window = (board, hands, p_idx, kind)
+            return
+
+        window = self._window
+        if window is None:
+            return
+        board, hands, discarder, kind = window
+        if a_type == 7:
+            self._window = None
+        elif p_idx == discarder:
+            return
+        elif a_type == 8:
+            self._add(encode(p_idx, hands[p_idx], board, kind), PASS, -1, index, p_idx)
+        elif a_type == 6:
+            self._add(encode(p_idx, hands[p_idx], board, kind), WIN, kind, index, p_idx)
+            self._window = None
+        elif a_type in (3, 4, 5):
+            pack_type, name, _ = parser.packs[p_idx][-1]
+            if a_type == 3:
+                action, tile = CHI, _TILE_KIND[name] - 1
+            else:
+                action, tile = (PENG if a_type == 4 else KONG), kind
+            self._add(encode(p_idx, hands[p_idx], board, kind), action, tile, index, p_idx)
+            self._window = None
+
+    def on_skipped(self, index, p_idx, a_type, data, time):
+        window = self._window
+        if window is not None and p_idx != window[2]:
+            board, hands, _, kind = window
+            self._add(encode(p_idx, hands[p_idx], board, kind), PASS, -1, index, p_idx)
+
+    def on_finish(self):
+        pass
+
+    def arrays(self):
+        n = len(self.labels)
+        planes = np.stack(self.planes) if n else np.zeros((0, N_PLANES, KIND_COUNT), dtype=np.int8)
+        return (planes, np.array(self.labels, dtype=np.int8).reshape(n, 2),
+                np.array(self.meta, dtype=np.int32).reshape(n, 2))
+
+
+def count_declined(actions):
+    """不跟踪应答窗口，直接数出和牌之前动作序列中所有的“过”与 data 为 0 的吃碰杠 / 和，应与导出的 PASS 标签数相等。
+
+    记录里只有实际表态的座位才有应答动作，不能按“舍牌数 × 3 − 鸣牌数”推算；
+    这里与 DecisionRecorder 的窗口判断互相独立，窗口漏记或多记放弃应答时两者会对不上。
+    """
+    declined = 0
+    for a_type, data in zip(actions.a, actions.d):
+        if a_type == 6 and data:
+            break
+        if a_type == 8 or (a_type in (3, 4, 5, 6) and not data):
+            declined += 1
+    return declined
+
+
+_parser = None
+
+
+def export_record(record_id):
+    """返回 (record_id, planes, labels, meta, error)；meta 只含 (动作下标, 座位)。供进程池调用。"""
+    global _parser
+    from archive import shared_origin_store
+    if _parser is None:
+        _parser = MahjongRecordParser()
+    try:
+        _parser.reset(shared_origin_store().get(record_id))
+        recorder = DecisionRecorder(_parser)
+        _parser.run_analysis(tracer=recorder)
+        planes, labels, meta = recorder.arrays()
+        passes = int((labels[:, 0] == PASS).sum())
+        declined = count_declined(_parser.actions)
+        if passes != declined:
+            raise ValueError(f"PASS 标签 {passes} 个，记录中的放弃应答 {declined} 个")
+        return record_id, planes, labels, meta, None
+    except Exception as e:
+        return record_id, None, None, None, str(e)
+
+
+def _save_npy(path, array):
+    # 先写临时文件再改名，读取方不会看到写到一半的分片
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _file_no(name):
+    # shard-00012.planes.npy / records-00012.txt → 12；不是导出文件时返回 None
+    prefix, _, rest = name.partition('-')
+    number = rest.partition('.')[0]
+    if prefix in ('shard', 'records') and number.isdigit():
+        return int(number)
+    return None
+
+
+class ShardWriter:
+    """按行累积决策点，每满 shard_size 行写出一个分片；close() 写出剩余行与记录 id 文件，再替换 index.json。
+
+    分片编号接着目录中已有的文件往下排，不覆盖上一次导出的分片；旧文件在新 index.json 就位之后才删除。
+    """
+
+    def __init__(self, root=DATASET_DIR, shard_size=65536):
+        self.root = root
+        self.shard_size = max(shard_size, 1)
+        self.record_ids = []
+        self.shards = []
+        self._buffer = []
+        self._buffered = 0
+        os.makedirs(root, exist_ok=True)
+        numbers = [n for n in map(_file_no, os.listdir(root)) if n is not None]
+        self._first_no = max(numbers) + 1 if numbers else 0
+
+    def add(self, record_id, planes, labels, meta):
+        record_no = len(self.record_ids)
+        self.record_ids.append(record_id)
+        if not len(labels):
+            return
+        meta = np.column_stack([np.full(len(meta), record_no, dtype=np.int32), meta])
+        self._buffer.append((planes, labels, meta))
+        self._buffered += len(labels)
+        while self._buffered >= self.shard_size:
+            self._flush(self.shard_size)
+
+    def _flush(self, rows):
+        planes, labels, meta = (np.concatenate(cols) for cols in zip(*self._buffer))
+        name = f"shard-{self._first_no + len(self.shards):05d}"
+        _save_npy(os.path.join(self.root, f"{name}.planes.npy"), planes[:rows])
+        _save_npy(os.path.join(self.root, f"{name}.labels.npy"), labels[:rows])
+        _save_npy(os.path.join(self.root, f"{name}.meta.npy"), meta[:rows])
+        self.shards.append({'name': name, 'rows': int(rows),
+                            'records': [int(meta[0, 0]), int(meta[rows - 1, 0])]})
+        self._buffer = [(planes[rows:], labels[rows:], meta[rows:])] if len(labels) > rows else []
+        self._buffered = len(labels) - rows
+
+    def close(self):
+        from stats_cache import parser_version
+        if self._buffered:
+            self._flush(self._buffered)
+        records_file = f"records-{self._first_no:05d}.txt"
+        write_atomic(os.path.join(self.root, records_file), ''.join(f"{rid}\n" for rid in self.record_ids))
+        index = {
+            'parser_version': parser_version(),
+            'planes': list(PLANES),
+            'actions': list(ACTIONS),
+            'shape': [N_PLANES, KIND_COUNT],
+            'rows': sum(s['rows'] for s in self.shards),
+            'records': len(self.record_ids),
+            'records_file': records_file,
+            'shards': self.shards,
+        }
+        write_json(os.path.join(self.root, 'index.json'), index)
+        # 新索引已就位，删除它不再引用的旧分片与记录 id 文件（含旧布局的 records.txt）
+        keep = {records_file} | {f"{s['name']}.{part}.npy" for s in self.shards for part in ('planes', 'labels', 'meta')}
+        for name in os.listdir(self.root):
+            if (_file_no(name) is not None or name == 'records.txt') and name not in keep:
+                os.remove(os.path.join(self.root, name))
+        return index
+
+
+def load_index(root=DATASET_DIR):
+    with open(os.path.join(root, 'index.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_record_ids(root=DATASET_DIR, index=None):
+    index = index or load_index(root)
+    with open(os.path.join(root, index.get('records_file', 'records.txt')), 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def iter_shards(root=DATASET_DIR, mmap_mode='r'):
+    """按分片产出 (planes, labels, meta)，默认以只读内存映射打开，只有实际访问的行才会读入内存。"""
+    for shard in load_index(root)['shards']:
+        base = os.path.join(root, shard['name'])
+        yield (np.load(f"{base}.planes.npy", mmap_mode=mmap_mode),
+               np.load(f"{base}.labels.npy", mmap_mode=mmap_mode),
+               np.load(f"{base}.meta.npy", mmap_mode=mmap_mode))
+
+
+def main(argv=None):
+    from archive import shared_origin_store
+    from workers import map_ordered
+
+    ap = argparse.ArgumentParser(description='导出决策点训练数据（分片 .npy）')
+    ap.add_argument('--out', default=DATASET_DIR, help=f'输出目录（默认 {DATASET_DIR}）')
+    ap.add_argument('--workers', type=int, default=1, help='并行进程数（默认 1）')
+    ap.add_argument('--shard-size', type=int, default=65536, help='每个分片的决策点数（默认 65536）')
+    ap.add_argument('--limit', type=int, default=None, help='最多处理 N 条记录')
+    args = ap.parse_args(argv)
+
+    record_ids = shared_origin_store().ids()[:args.limit]
+    writer = ShardWriter(args.out, args.shard_size)
+    start = time.perf_counter()
+    errors = 0
+    counts = np.zeros(len(ACTIONS), dtype=np.int64)
+    for record_id, planes, labels, meta, error in map_ordered(export_record, record_ids, workers=args.workers):
+        if error:
+            errors += 1
+            print(f"Error processing record {record_id}: {error}")
+            continue
+        writer.add(record_id, planes, labels, meta)
+        counts += np.bincount(labels[:, 0], minlength=len(ACTIONS)) if len(labels) else 0
+    index = writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"记录 {index['records']} 条（失败 {errors} 条），决策点 {index['rows']} 个，分片 {len(index['shards'])} 个，"
+          f"用时 {elapsed:.2f}s（{index['rows'] / elapsed if elapsed else 0:.0f} 个/秒）-> {args.out}")
+    print("动作分布: " + ", ".join(f"{name}:{int(n)}" for name, n in zip(ACTIONS, counts)))
+
+
+if __name__ == '__main__':
+    main()
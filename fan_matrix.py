@@ -0,0 +1,181 @@
+# fan_matrix.py
+# 和牌数据的列式导出（NumPy .npz）。每行一次和牌，列包括：
+#   record_id / player（编码 + 词表）/ session（编码 + 词表）/ base_fan / flower_count / total_fan
+# 番种以稀疏的“长表”存放：entry_row / entry_fan / entry_count 三列，按 entry_row 升序，
+# 需要时可展开为 (和牌数, 番种数) 的 int8 稠密矩阵。
+#
+# generate_stats.py --npz <路径> 会在写 CSV 的同时用 FanMatrixWriter 边统计边写出本格式；查询见 fan_query.py。
+
+import itertools
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+from fan_table import FAN_NAMES
+
+N_FANS = len(FAN_NAMES)
+
+
+class FanMatrix:
+    COLUMNS = ('record_ids', 'players', 'player_codes', 'sessions', 'session_codes', 'base_fan',
+               'flower_count', 'total_fan', 'entry_row', 'entry_fan', 'entry_count')
+
+    def __init__(self, record_ids, players, player_codes, sessions, session_codes, base_fan,
+                 flower_count, total_fan, entry_row, entry_fan, entry_count):
+        self.record_ids = record_ids
+        self.players = players
+        self.player_codes = player_codes
+        self.sessions = sessions
+        self.session_codes = session_codes
+        self.base_fan = base_fan
+        self.flower_count = flower_count
+        self.total_fan = total_fan
+        self.entry_row = entry_row
+        self.entry_fan = entry_fan
+        self.entry_count = entry_count
+        self._dense = None
+
+    def __len__(self):
+        return len(self.record_ids)
+
+    def save(self, path):
+        np.savez(path, fan_names=np.array(FAN_NAMES, dtype=str),
+                 **{name: getattr(self, name) for name in self.COLUMNS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(*(data[name] for name in cls.COLUMNS))
+
+    def dense(self):
+        """(和牌数, 番种数) 的 int8 番种次数矩阵。"""
+        if self._dense is None:
+            m = np.zeros((len(self), N_FANS), dtype=np.int8)
+            m[self.entry_row, self.entry_fan] = self.entry_count
+            self._dense = m
+        return self._dense
+
+
+def _write_member(zf, name, dtype, count, chunks):
+    """把按块产出的字节流写成 npz 中的一个一维 .npy 成员（与 np.savez 的格式相同）。"""
+    with zf.open(f"{name}.npy", 'w', force_zip64=True) as f:
+        np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                 'fortran_order': False, 'shape': (count,)})
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def _file_chunks(path, size=1 << 20):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class FanMatrixWriter:
+    """逐条追加和牌的 FanMatrix.save：各列按块追加到临时文件，close() 时流式拼成同格式的 .npz。
+
+    内存中只保留当前块与玩家 / 全庄词表，与和牌总数无关。用作上下文管理器时，出错退出会删除临时文件、不写出 .npz。
+    """
+
+    _DTYPES = {'player_codes': np.int32, 'session_codes': np.int32, 'base_fan': np.int16,
+               'flower_count': np.int8, 'total_fan': np.int16, 'entry_row': np.int32,
+               'entry_fan': np.int16, 'entry_count': np.int8}
+
+    def __init__(self, path, chunk_size=65536):
+        # 与 np.savez 一致：路径没有 .npz 后缀时自动补上
+        self.path = path if path.endswith('.npz') else path + '.npz'
+        self.chunk_size = max(chunk_size, 1)
+        self.rows = 0
+        self._players = {}
+        self._sessions = {}
+        self._id_width = 1
+        self._ids = []
+        self._columns = {name: [] for name in self._DTYPES}
+        self._counts = dict.fromkeys(self._DTYPES, 0)
+        self._tmp_dir = tempfile.mkdtemp(prefix='.fan_matrix.', dir=os.path.dirname(os.path.abspath(self.path)))
+        self._files = {name: open(os.path.join(self._tmp_dir, name), 'wb') for name in ('record_ids', *self._DTYPES)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def add(self, record_id, win_data, session_id=''):
+        row = self.rows
+        cols = self._columns
+        self._ids.append(record_id)
+        self._id_width = max(self._id_width, len(record_id))
+        cols['player_codes'].append(self._players.setdefault(win_data['winner_name'], len(self._players)))
+        cols['session_codes'].append(self._sessions.setdefault(session_id or '', len(self._sessions)))
+        cols['base_fan'].append(win_data['base_fan'])
+        cols['flower_count'].append(win_data['flower_count'])
+        cols['total_fan'].append(win_data['total_fan'])
+        for fan_id, count in enumerate(win_data['fan_vector']):
+            if count:
+                cols['entry_row'].append(row)
+                cols['entry_fan'].append(fan_id)
+                cols['entry_count'].append(count)
+        self.rows += 1
+        if len(self._ids) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._ids:
+            self._files['record_ids'].write(''.join(f"{rid}\n" for rid in self._ids).encode('utf-8'))
+            self._ids = []
+        for name, dtype in self._DTYPES.items():
+            values = self._columns[name]
+            if values:
+                self._files[name].write(np.asarray(values, dtype=dtype).tobytes())
+                self._counts[name] += len(values)
+                self._columns[name] = []
+
+    def _id_chunks(self):
+        # 定长 unicode 列的宽度要到最后才知道，这里按块重新读出记录 id 再编码
+        dtype = f"<U{self._id_width}"
+        with open(os.path.join(self._tmp_dir, 'record_ids'), 'r', encoding='utf-8') as f:
+            while True:
+                lines = list(itertools.islice(f, self.chunk_size))
+                if not lines:
+                    return
+                yield np.array([line[:-1] for line in lines], dtype=dtype).tobytes()
+
+    def close(self):
+        """写出 .npz（先写临时文件再改名），返回和牌数。"""
+        self._flush()
+        for f in self._files.values():
+            f.close()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+                for name, values in (('fan_names', FAN_NAMES), ('players', list(self._players)),
+                                     ('sessions', list(self._sessions))):
+                    array = np.array(values, dtype=str)
+                    _write_member(zf, name, array.dtype, len(array), [array.tobytes()])
+                _write_member(zf, 'record_ids', f"<U{self._id_width}", self.rows, self._id_chunks())
+                for name, dtype in self._DTYPES.items():
+                    _write_member(zf, name, dtype, self._counts[name],
+                                  _file_chunks(os.path.join(self._tmp_dir, name)))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        return self.rows
+
+    def discard(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
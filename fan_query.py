@@ -0,0 +1,106 @@
+# fan_query.py
+# 基于 fan_matrix.FanMatrix 的向量化聚合。
+#
+# 用法：
+#   python fan_query.py win_stats.npz players [--top N]    # 各玩家和牌次数及最常见番种
+#   python fan_query.py win_stats.npz sessions [--top N]   # 各全庄平均素番
+#   python fan_query.py win_stats.npz pairs [--top N]      # 最常同时出现的番种对
+
+import argparse
+
+import numpy as np
+
+from fan_table import FAN_NAMES, FLOWER_FAN_ID
+from fan_matrix import FanMatrix, N_FANS
+
+
+def fan_frequency_by_player(fm, weighted=False):
+    """(玩家数, 番种数) 矩阵：每个玩家的和牌中各番种出现的次数。
+
+    weighted=False 时按“含该番种的和牌数”计数，True 时按番种倍数（x2 等）累加。
+    """
+    n_players = len(fm.players)
+    keys = fm.player_codes[fm.entry_row].astype(np.int64) * N_FANS + fm.entry_fan
+    weights = fm.entry_count if weighted else None
+    counts = np.bincount(keys, weights=weights, minlength=n_players * N_FANS)
+    return counts.reshape(n_players, N_FANS).astype(np.int64)
+
+
+def wins_by_player(fm):
+    return np.bincount(fm.player_codes, minlength=len(fm.players))
+
+
+def avg_base_fan_by_session(fm):
+    """返回 (每个全庄的和牌数, 平均素番)，下标对应 fm.sessions。"""
+    n_sessions = len(fm.sessions)
+    wins = np.bincount(fm.session_codes, minlength=n_sessions)
+    total = np.bincount(fm.session_codes, weights=fm.base_fan, minlength=n_sessions)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = np.where(wins > 0, total / np.maximum(wins, 1), 0.0)
+    return wins, avg
+
+
+def fan_cooccurrence(fm):
+    """(番种数, 番种数) 对称矩阵：同时包含两个番种的和牌数，对角线为各番种出现的和牌数。"""
+    row = fm.entry_row
+    fan = fm.entry_fan.astype(np.int64)
+    pair_counts = np.zeros(N_FANS * N_FANS, dtype=np.int64)
+    # 同一和牌的番种条目在长表中相邻且番种 id 递增，按间距 d 逐轮配对，每轮都是整列向量运算
+    d = 1
+    while d < len(row):
+        same = row[d:] == row[:-d]
+        if not same.any():
+            break
+        pair_counts += np.bincount(fan[:-d][same] * N_FANS + fan[d:][same], minlength=N_FANS * N_FANS)
+        d += 1
+    co = pair_counts.reshape(N_FANS, N_FANS)
+    co = co + co.T
+    co[np.arange(N_FANS), np.arange(N_FANS)] = np.bincount(fan, minlength=N_FANS)
+    return co
+
+
+def top_pairs(co, top=20, skip=(FLOWER_FAN_ID,)):
+    upper = np.triu(co, k=1)
+    for fan_id in skip:
+        upper[fan_id, :] = 0
+        upper[:, fan_id] = 0
+    flat = np.argsort(upper, axis=None)[::-1][:top]
+    pairs = []
+    for idx in flat:
+        a, b = divmod(int(idx), N_FANS)
+        if upper[a, b] == 0:
+            break
+        pairs.append((a, b, int(upper[a, b])))
+    return pairs
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='和牌番种列式数据查询')
+    ap.add_argument('path', help='generate_stats.py --npz 导出的文件')
+    ap.add_argument('query', choices=['players', 'sessions', 'pairs'])
+    ap.add_argument('--top', type=int, default=20)
+    args = ap.parse_args(argv)
+
+    fm = FanMatrix.load(args.path)
+    print(f"和牌数: {len(fm)}  玩家数: {len(fm.players)}  全庄数: {len(fm.sessions)}")
+
+    if args.query == 'players':
+        freq = fan_frequency_by_player(fm)
+        freq[:, FLOWER_FAN_ID] = 0
+        wins = wins_by_player(fm)
+        for code in np.argsort(wins)[::-1][:args.top]:
+            top_fans = np.argsort(freq[code])[::-1][:3]
+            fans_str = '、'.join(f"{FAN_NAMES[f]}x{freq[code, f]}" for f in top_fans if freq[code, f])
+            print(f"{fm.players[code]}\t和牌 {wins[code]}\t{fans_str}")
+    elif args.query == 'sessions':
+        wins, avg = avg_base_fan_by_session(fm)
+        for code in np.argsort(wins)[::-1][:args.top]:
+            name = fm.sessions[code] or '(未知全庄)'
+            print(f"{name}\t和牌 {wins[code]}\t平均素番 {avg[code]:.2f}")
+    else:
+        for a, b, n in top_pairs(fan_cooccurrence(fm), args.top):
+            print(f"{FAN_NAMES[a]} + {FAN_NAMES[b]}\t{n}")
+
+
+if __name__ == '__main__':
+    main()
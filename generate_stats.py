@@ -1,70 +1,138 @@
 import csv
-import json
-import os
+import argparse
+from contextlib import nullcontext
 from parser import MahjongRecordParser
+from workers import map_ordered
+from stats_cache import StatsCache
+from archive import shared_origin_store
+from fan_table import FAN_NAMES
+from catalog import load_parent_map
+from win_index import WinIndex
+from stats_aggregate import StatsAggregate, AGGREGATE_PATH, parse_shard, in_shard, shard_path
 
-def generate_stats():
-    origin_dir = 'data/origin'
-    output_csv_bom_path = 'win_stats_bom.csv'
-    
-    record_files = [f for f in os.listdir(origin_dir) if f.endswith('.json')]
-    
-    FAN_NAMES = ['无','大四喜','大三元','绿一色','九莲宝灯','四杠','连七对','十三幺','清幺九','小四喜','小三元','字一色','四暗刻','一色双龙会','一色四同顺','一色四节高','一色四步高','一色四连环','三杠','混幺九','七对','七星不靠','全双刻','清一色','一色三同顺','一色三节高','全大','全中','全小','清龙','三色双龙会','一色三步高','一色三连环','全带五','三同刻','三暗刻','全不靠','组合龙','大于五','小于五','三风刻','花龙','推不倒','三色三同顺','三色三节高','无番和','妙手回春','海底捞月','杠上开花','抢杠和','碰碰和','混一色','三色三步高','五门齐','全求人','双暗杠','双箭刻','全带幺','不求人','双明杠','和绝张','箭刻','圈风刻','门风刻','门前清','平和','四归一','双同刻','双暗刻','暗杠','断幺','一般高','喜相逢','连六','老少副','幺九刻','明杠','缺一门','无字','独听・边张','独听・嵌张','独听・单钓','自摸','花牌','明暗杠','\u203b 天和','\u203b 地和','\u203b 人和Ⅰ','\u203b 人和Ⅱ']
+CSV_PATH = 'win_stats_bom.csv'
 
-    # 新增列: 小局序号 (record 在父 session 中的顺序) 与 所属全庄链接
-    header = ['和牌用户', '和牌素番数（不含花）', '花的数量', '和牌番数', '手牌', '和牌张', '所属局', '小局序号'] + FAN_NAMES + ['对局链接', '所属全庄']
-    
-    all_rows = []
+# 每个进程复用一个解析器实例
+_parser = MahjongRecordParser()
 
-    # 载入父映射 (record_parent_map.json) 获取 session_id 与顺序
+def analyze_record(record_id):
+    # 进程池任务：返回 (win_data, 错误信息)，win_data 去掉每条都相同的 fan_names 以减小回传体积
     try:
-        with open('record_parent_map.json', 'r', encoding='utf-8') as pmf:
-            parent_map = json.load(pmf)
-    except Exception:
-        parent_map = {}
+        record_content = shared_origin_store().get(record_id)
+        if not record_content.strip():
+            return None, None
+        parser = _parser.reset(record_content)
+        parser.run_analysis()
+        win_data = parser.get_win_analysis()
+        if win_data:
+            win_data.pop('fan_names', None)
+        return win_data, None
+    except Exception as e:
+        return None, str(e)
 
-    for filename in record_files:
-        record_id = os.path.splitext(filename)[0]
-        filepath = os.path.join(origin_dir, filename)
-        
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                record_content = f.read()
-                if not record_content.strip():
-                    continue
-                parser = MahjongRecordParser(record_content)
-                parser.run_analysis()
-                win_data = parser.get_win_analysis()
+def build_row(record_id, win_data, parent_map):
+    parent_info = parent_map.get(record_id, {}) if isinstance(parent_map, dict) else {}
+    order_in_session = parent_info.get('order_in_session', '')
+    session_id = parent_info.get('session_id', '')
+    game_link = f"https://tziakcha.net/game/?id={session_id}" if session_id else ''
+    record_link = f"https://tziakcha.net/record/?id={record_id}"
+    return [
+        win_data['winner_name'],
+        win_data['base_fan'],
+        win_data['flower_count'],
+        win_data['total_fan'],
+        win_data['formatted_hand'],
+        win_data['winning_tile'],
+        win_data['game_title'],
+        order_in_session,
+    ] + win_data['fan_vector'] + [
+        record_link,
+        game_link
+    ]
+
+def generate_stats(workers=1, rebuild=False, npz_path=None, cache=None, shard=None, csv_path=CSV_PATH,
+                   aggregate_path=AGGREGATE_PATH):
+    """逐条写出 CSV 行并累加汇总；shard=(K, N) 时只统计第 K 个分片，输出文件名带分片后缀。返回 StatsAggregate。"""
+    store = shared_origin_store()
+    csv_path = shard_path(csv_path, shard)
+    aggregate_path = shard_path(aggregate_path, shard)
 
-                if win_data:
-                    parent_info = parent_map.get(record_id, {}) if isinstance(parent_map, dict) else {}
-                    order_in_session = parent_info.get('order_in_session', '')
-                    session_id = parent_info.get('session_id', '')
-                    game_link = f"https://tziakcha.net/game/?id={session_id}" if session_id else ''
-                    record_link = f"https://tziakcha.net/record/?id={record_id}"
-                    row = [
-                        win_data['winner_name'],
-                        win_data['base_fan'],
-                        win_data['flower_count'],
-                        win_data['total_fan'],
-                        win_data['formatted_hand'],
-                        win_data['winning_tile'],
-                        win_data['game_title'],
-                        order_in_session,
-                    ] + win_data['fan_vector'] + [
-                        record_link,
-                        game_link
-                    ]
-                    all_rows.append(row)
-        except Exception as e:
-            print(f"Error processing file {filename}: {e}")
+    # 排序保证多进程与串行模式输出的行顺序一致
+    all_ids = store.ids()
+    record_ids = [record_id for record_id in all_ids if in_shard(record_id, shard)]
+
+    # 新增列: 小局序号 (record 在父 session 中的顺序) 与 所属全庄链接
+    header = ['和牌用户', '和牌素番数（不含花）', '花的数量', '和牌番数', '手牌', '和牌张', '所属局', '小局序号'] + FAN_NAMES + ['对局链接', '所属全庄']
 
-    # Write UTF-8-BOM file
-    with open(output_csv_bom_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+    # 载入父映射（即 data/catalog.db，或旧的 record_parent_map.json）获取 session_id 与顺序
+    parent_map = load_parent_map()
+
+    # 只解析缓存未命中（新增或大小/mtime 变化）的记录；缓存行留在 SQLite 中，按需逐条读取
+    owns_cache = cache is None
+    if owns_cache:
+        cache = StatsCache(rebuild=rebuild)
+    todo = []
+    for record_id in record_ids:
+        key = store.key(record_id)
+        if not cache.is_fresh(record_id, key):
+            todo.append((record_id, key))
+
+    aggregate = StatsAggregate()
+    npz = None
+    if npz_path:
+        # numpy 只在需要列式导出时才导入；和牌按块写入临时文件，结束时拼成 .npz
+        from fan_matrix import FanMatrixWriter
+        npz = FanMatrixWriter(npz_path)
+    results = zip(todo, map_ordered(analyze_record, [record_id for record_id, _ in todo], workers=workers))
+    pending = next(results, None)
+    # Write UTF-8-BOM file；行按记录顺序边解析边写出，不在内存中累积
+    with open(csv_path, 'w', newline='', encoding='utf-8-sig') as csvfile, (npz or nullcontext()):
         writer = csv.writer(csvfile)
         writer.writerow(header)
-        writer.writerows(all_rows)
+        for record_id in record_ids:
+            # todo 与 record_ids 同序，未命中的记录依次从解析结果中取出
+            if pending is not None and pending[0][0] == record_id:
+                (_, key), (win_data, error) = pending
+                pending = next(results, None)
+                if error:
+                    print(f"Error processing record {record_id}: {error}")
+                    continue
+                cache.store(record_id, key, win_data)
+            else:
+                win_data = cache.get(record_id)
+            session_id = parent_map.get(record_id, {}).get('session_id', '')
+            aggregate.add(win_data, session_id)
+            if win_data:
+                writer.writerow(build_row(record_id, win_data, parent_map))
+                if npz is not None:
+                    npz.add(record_id, win_data, session_id)
+
+    # 分片统计时也按全部记录清理，避免删掉其它分片的缓存
+    cache.prune(all_ids)
+    cache.save()
+    print(f"解析 {len(todo)} 条新增/变化记录，复用缓存 {len(record_ids) - len(todo)} 条")
+    with WinIndex() as index:
+        index.sync(cache)
+    if owns_cache:
+        cache.close()
+
+    aggregate.save(aggregate_path)
+    print(f"汇总已写入 {aggregate_path}（和牌 {aggregate.wins} / 记录 {aggregate.records}）")
+
+    if npz is not None:
+        print(f"已导出列式数据 {npz.path}（{npz.rows} 条和牌）")
+    return aggregate
 
 if __name__ == '__main__':
-    generate_stats()
-    print(f"统计完成，已生成文件 win_stats_bom.csv")
+    ap = argparse.ArgumentParser(description='生成和牌统计 CSV')
+    ap.add_argument('--workers', type=int, default=1, help='并行解析的进程数（默认 1，即串行）')
+    ap.add_argument('--rebuild', action='store_true', help='忽略已有缓存，重新解析全部记录')
+    ap.add_argument('--npz', default=None, help='同时导出列式 .npz 文件（需要 numpy），供 fan_query.py 查询')
+    ap.add_argument('--shard', type=parse_shard, default=None, metavar='K/N',
+                    help='只统计第 K 个分片（共 N 个，按记录 id 哈希划分），输出文件名带分片后缀')
+    ap.add_argument('--csv', default=CSV_PATH, help=f'CSV 输出路径（默认 {CSV_PATH}）')
+    ap.add_argument('--aggregate', default=AGGREGATE_PATH, help=f'汇总输出路径（默认 {AGGREGATE_PATH}）')
+    args = ap.parse_args()
+    generate_stats(workers=args.workers, rebuild=args.rebuild, npz_path=args.npz, shard=args.shard,
+                   csv_path=args.csv, aggregate_path=args.aggregate)
+    print(f"统计完成，已生成文件 {shard_path(args.csv, args.shard)}")
@@ -0,0 +1,110 @@
+# hand_model.py
+# 复盘时的手牌表示。MahjongRecordParser 只通过下面这组操作修改手牌：
+#   add(t) / remove(t) / discard(t) / take_kind(kind, n) / sort()
+# 并通过迭代（按牌 id 升序）读取手牌。
+#
+# CountHand：34 种牌（+2 个花牌槽位）的计数向量 + 144 位牌 id 位图，摸/打/鸣牌都是 O(1)，不需要排序。
+# ListHand：原来的有序列表实现，保留用于差分校验（check_hand_model.py）。
+
+from typing import Iterator
+
+
+class ListHand(list):
+    __slots__ = ()
+
+    add = list.append
+
+    def discard(self, tile: int):
+        if tile in self:
+            self.remove(tile)
+
+    def take_kind(self, kind: int, n: int) -> int:
+        # 手牌有序，依次移除该种牌中 id 最小的 n 张
+        taken = 0
+        for t in list(self):
+            if taken >= n:
+                break
+            if (t >> 2) == kind:
+                self.remove(t)
+                taken += 1
+        return taken
+
+    @property
+    def counts(self):
+        counts = [0] * 36
+        for t in self:
+            counts[t >> 2] += 1
+        return counts
+
+
+class CountHand:
+    __slots__ = ('counts', 'mask')
+
+    def __init__(self, tiles=()):
+        # counts[0:34] 为 34 种牌的张数，counts[34:36] 为花牌；mask 第 t 位表示手中有牌 id t
+        self.counts = [0] * 36
+        self.mask = 0
+        for t in tiles:
+            self.add(t)
+
+    def add(self, tile: int):
+        self.mask |= 1 << tile
+        self.counts[tile >> 2] += 1
+
+    def extend(self, tiles):
+        for t in tiles:
+            self.add(t)
+
+    append = add
+
+    def remove(self, tile: int):
+        bit = 1 << tile
+        if not self.mask & bit:
+            raise ValueError(f"CountHand.remove(x): x not in hand: {tile}")
+        self.mask ^= bit
+        self.counts[tile >> 2] -= 1
+
+    def discard(self, tile: int):
+        bit = 1 << tile
+        if self.mask & bit:
+            self.mask ^= bit
+            self.counts[tile >> 2] -= 1
+
+    def take_kind(self, kind: int, n: int) -> int:
+        # 与 ListHand 一致：移除该种牌中 id 最小的 n 张
+        shift = kind << 2
+        bits = (self.mask >> shift) & 0xF
+        taken = 0
+        while bits and taken < n:
+            low = bits & -bits
+            bits ^= low
+            self.mask ^= low << shift
+            taken += 1
+        self.counts[kind] -= taken
+        return taken
+
+    def sort(self):
+        pass
+
+    def clear(self):
+        self.counts = [0] * 36
+        self.mask = 0
+
+    def __contains__(self, tile: int) -> bool:
+        return bool(self.mask >> tile & 1)
+
+    def __len__(self) -> int:
+        return bin(self.mask).count('1')
+
+    def __iter__(self) -> Iterator[int]:
+        m = self.mask
+        while m:
+            low = m & -m
+            yield low.bit_length() - 1
+            m ^= low
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"CountHand({list(self)})"
@@ -1,14 +1,22 @@
-import requests
-import os
+# history.py
+# 抓取历史场次列表，增量写入本地目录 data/catalog.db 的 games 表（见 catalog.py）。
+#
+# 用法：python history.py [--window N] [--max-pages N] [--full] [--rate R]
+#   按窗口并发请求若干页，遇到空页或已知的场次 id 即停止；日常刷新通常只需 1~2 个请求。
+#   中途失败（或达到 --max-pages）时会在 data/history_state.json 记下断点，下次运行继续补齐缺口。
+
+import argparse
+import asyncio
 import json
+import os
 import sys
 
-url = "https://tziakcha.net/_qry/history/"
-cookie = os.getenv('TZI_HISTORY_COOKIE')
-if not cookie:
-    print("错误: 未设置环境变量 TZI_HISTORY_COOKIE")
-    print("请先在浏览器中登录 https://tziakcha.net/history/，然后获取Cookie值")
-    sys.exit(1)
+from archive import load_json, write_json
+from catalog import Catalog
+from downloader import Fetcher, FetchError, api_url, set_base_url
+
+HISTORY_PATH = "/_qry/history/"
+STATE_PATH = os.path.join('data', 'history_state.json')
 
 headers = {
     "accept": "*/*",
@@ -23,24 +31,96 @@ headers = {
     "sec-fetch-site": "same-origin",
     "referrer": "https://tziakcha.net/history/",
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
-    "Cookie": cookie
 }
 
-all_records = []
-for page in range(1, 101):
-    body = f"p={page-1}" if page > 1 else ""
-    try:
-        response = requests.post(url, headers=headers, data=body)
-        if response.status_code == 200:
-            data = response.json()
-            if isinstance(data, dict) and 'games' in data:
-                all_records.extend(data['games'])
-    except Exception as e:
-        continue
-
-with open('record_lists.json', 'w', encoding='utf-8') as f:
-    json.dump(all_records, f, indent=2, ensure_ascii=False)
-
-filtered = [rec for rec in all_records if '竹' in rec.get('title', '')]
-for rec in filtered:
-    print(json.dumps(rec, ensure_ascii=False, indent=2))
\ No newline at end of file
+
+def fetch_page(fetcher, page):
+    """page 从 0 开始；返回该页的场次列表。"""
+    body = f"p={page}" if page > 0 else ""
+    data = json.loads(fetcher.post(api_url(HISTORY_PATH), data=body))
+    if not isinstance(data, dict) or not isinstance(data.get('games'), list):
+        raise FetchError(f"page {page}: unexpected response", 1)
+    return data['games']
+
+
+async def crawl(fetcher, known, stop_id=None, window=4, max_pages=100, full=False):
+    """按页序返回 (抓到的场次列表, 是否完整抓到停止点)。
+
+    known(ids) 返回其中已入库的 id。增量模式下看到已知 id 即停止；stop_id 非空表示上次中断留下的缺口，
+    此时一直抓到 stop_id 为止。窗口从 1 页开始逐轮翻倍到 window，日常刷新时第一页就能命中已知 id。
+    """
+    games = []
+    page = 0
+    size = window if full else 1
+    while page < max_pages:
+        pages = range(page, min(page + size, max_pages))
+        results = await asyncio.gather(*(asyncio.to_thread(fetch_page, fetcher, p) for p in pages),
+                                       return_exceptions=True)
+        for p, result in zip(pages, results):
+            if isinstance(result, Exception):
+                print(f"第 {p + 1} 页抓取失败: {result}")
+                return games, False
+            if not result:
+                return games, True
+            games.extend(result)
+            if not full:
+                page_ids = {g.get('id') for g in result}
+                if (stop_id in page_ids) if stop_id else known(page_ids):
+                    return games, True
+        page += len(pages)
+        size = min(size * 2, window)
+    return games, False
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='抓取历史场次列表（增量）')
+    ap.add_argument('--window', type=int, default=4, help='同时请求的最大页数（默认 4）')
+    ap.add_argument('--max-pages', type=int, default=100, help='最多抓取的页数（默认 100）')
+    ap.add_argument('--full', action='store_true', help='不在已知 id 处停止，重新抓取全部页')
+    ap.add_argument('--rate', type=float, default=None, help='每秒最多请求数（默认不限速）')
+    ap.add_argument('--base-url', default=None, help='接口地址（默认 $TZI_BASE_URL 或 https://tziakcha.net）')
+    args = ap.parse_args(argv)
+    set_base_url(args.base_url)
+
+    cookie = os.getenv('TZI_HISTORY_COOKIE')
+    if not cookie:
+        print("错误: 未设置环境变量 TZI_HISTORY_COOKIE")
+        print("请先在浏览器中登录 https://tziakcha.net/history/，然后获取Cookie值")
+        sys.exit(1)
+
+    with Catalog() as catalog:
+        if not catalog.game_count() and os.path.exists('record_lists.json'):
+            # 从旧版的 JSON 文件链迁移
+            catalog.import_json()
+        before = catalog.game_count()
+        newest_id = catalog.newest_game_id()
+        state = load_json(STATE_PATH, {})
+        # 上次未抓完时，需要一直抓到当时列表的第一条才算补齐
+        stop_id = state.get('stop_id') if catalog.known_game_ids([state.get('stop_id')]) else None
+        # 首次抓取（或首次抓取就中断）时没有可参照的 id，只能抓到空页为止
+        full = args.full or state.get('full', False) or not before
+
+        fetcher = Fetcher(concurrency=args.window, rate=args.rate, headers={**headers, "Cookie": cookie})
+        try:
+            fetched, complete = asyncio.run(crawl(fetcher, catalog.known_game_ids, stop_id, max(args.window, 1),
+                                                  args.max_pages, full))
+        finally:
+            fetcher.close()
+
+        catalog.upsert_games(fetched)
+        total = catalog.game_count()
+
+    if complete:
+        if os.path.exists(STATE_PATH):
+            os.remove(STATE_PATH)
+    else:
+        if state.get('full') or not before:
+            write_json(STATE_PATH, {'full': True})
+        else:
+            write_json(STATE_PATH, {'stop_id': stop_id or newest_id})
+        print("未抓到上次的列表位置，下次运行会继续补齐")
+    print(f"抓取 {len(fetched)} 条，新增 {total - before} 条，共 {total} 条场次")
+
+
+if __name__ == '__main__':
+    main()
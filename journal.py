@@ -0,0 +1,176 @@
+# journal.py
+# batch_process.py 的断点续跑与多进程 / 多机协作：
+#
+#   Journal      追加写入的处理日志（data/journal.log），每行 状态\t记录id\t进程\t时间\t错误\t解析器版本；
+#                重启时已完成（done）的记录直接跳过，只重试失败（failed）和尚未处理的记录。
+#                解析器版本变化时统计缓存、和牌索引与成绩表会整体清空，其它版本（或未记版本）的完成记录随之视为未处理。
+#   claim_chunks 把记录列表按固定大小切块，各进程在共享目录（data/claims）里用 O_EXCL 创建认领文件，
+#                同一块只会被一个进程处理；进程崩溃后认领文件不再更新，超过 ttl 即可被其它进程接手。
+#
+# 日志每行用一次 O_APPEND 写入，同一文件系统上的多个进程并发追加不会交错；读取时跳过尚未写完的最后一行。
+
+import hashlib
+import os
+import socket
+import time
+
+JOURNAL_PATH = os.path.join('data', 'journal.log')
+CLAIMS_DIR = os.path.join('data', 'claims')
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Journal:
+    def __init__(self, path=JOURNAL_PATH, resume=True, version=''):
+        """resume=False 时忽略已有日志的内容（全部重新处理），之后追加的记录照常生效。
+
+        version 非空时只认同一版本写下的完成记录。
+        """
+        self.path = path
+        self.version = version
+        self.status = {}
+        # 本进程启动之后才出现在日志里的记录（本进程或其它进程刚处理过），本轮不再重试
+        self.settled = set()
+        self._pos = 0
+        self._fd = None
+        self.worker = worker_id()
+        self._read(initial=True)
+        if not resume:
+            self.status.clear()
+
+    def _read(self, initial=False):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._pos)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                self._pos += len(raw)
+                parts = raw.decode('utf-8', errors='replace').rstrip('\n').split('\t')
+                if len(parts) < 2:
+                    continue
+                status, record_id = parts[0], parts[1]
+                if status == DONE and self.version and (parts[5] if len(parts) > 5 else '') != self.version:
+                    continue
+                self.status[record_id] = status
+                if not initial:
+                    self.settled.add(record_id)
+
+    def refresh(self):
+        """读入其它进程在此之后追加的日志。"""
+        self._read()
+
+    def is_done(self, record_id):
+        return self.status.get(record_id) == DONE
+
+    def pending(self, record_ids):
+        """本轮还需处理的记录：未完成，且不是本进程启动后才由别的进程处理过的。"""
+        return [rid for rid in record_ids if self.status.get(rid) != DONE and rid not in self.settled]
+
+    def failed(self):
+        return sorted(rid for rid, status in self.status.items() if status == FAILED)
+
+    def record(self, status, record_id, error=''):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        error = ' '.join(str(error or '').split())
+        line = f"{status}\t{record_id}\t{self.worker}\t{int(time.time())}\t{error}\t{self.version}\n"
+        os.write(self._fd, line.encode('utf-8'))
+        self.status[record_id] = status
+        self.settled.add(record_id)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Claim:
+    def __init__(self, path):
+        self.path = path
+        self._touched = time.time()
+
+    def heartbeat(self, interval=5.0):
+        # 处理过程中定期更新 mtime，表明认领者仍然存活
+        now = time.time()
+        if now - self._touched >= interval:
+            self._touched = now
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                pass
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _try_claim(path, ttl):
+    owner = f"{worker_id()}\t{int(time.time())}\n".encode('utf-8')
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if age < ttl:
+                return None
+            # 认领者超时未更新：先把旧文件改名移走，改名成功的进程才有资格重新认领
+            stale = f"{path}.{worker_id()}.stale"
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                return None
+            if time.time() - os.path.getmtime(stale) < ttl:
+                # 改名前另一个进程刚接手并创建了新的认领文件，原样放回
+                try:
+                    os.link(stale, path)
+                except FileExistsError:
+                    pass
+                os.remove(stale)
+                return None
+            os.remove(stale)
+            continue
+        try:
+            os.write(fd, owner)
+        finally:
+            os.close(fd)
+        return Claim(path)
+    return None
+
+
+def claim_chunks(record_ids, journal, chunk_size=256, ttl=600, claims_dir=CLAIMS_DIR):
+    """逐块认领并产出 (Claim, 本块待处理的记录 id)。
+
+    块按完整记录列表切分，块名带内容哈希，列表相同的进程得到相同的块；每次认领前刷新日志，
+    跳过已被其它进程处理完的记录。调用方处理完一块后调用 claim.release()。
+    """
+    os.makedirs(claims_dir, exist_ok=True)
+    record_ids = list(record_ids)
+    for start in range(0, len(record_ids), chunk_size):
+        chunk = record_ids[start:start + chunk_size]
+        journal.refresh()
+        if not journal.pending(chunk):
+            continue
+        digest = hashlib.sha1('\n'.join(chunk).encode('utf-8')).hexdigest()[:12]
+        claim = _try_claim(os.path.join(claims_dir, f"{start // chunk_size:06d}-{digest}.claim"), ttl)
+        if claim is None:
+            continue
+        # 认领成功后再读一次日志：上一个认领者可能在释放前刚写完这一块
+        journal.refresh()
+        todo = journal.pending(chunk)
+        if not todo:
+            claim.release()
+            continue
+        yield claim, todo
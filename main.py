@@ -1,68 +1,57 @@
 import sys
 import os
-import json
-import requests
 from parser import MahjongRecordParser
+from downloader import download_record
+from archive import open_origin_store, RecordArchive, write_json
 
-URL = "https://tziakcha.net/_qry/record/"
-HEADERS = {
-    "accept": "*/*",
-    "content-type": "text/plain;charset=UTF-8"
-}
-
-
-def download_record(record_id):
-    payload = f"id={record_id}"
 
+def process_record(record_id, store, seek=None):
     try:
-        response = requests.post(URL, data=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Download failed: {e}", file=sys.stderr)
-        sys.exit(1)
-
-
-def save_origin(record_id, data):
-    origin_dir = os.path.join("data", "origin")
-    os.makedirs(origin_dir, exist_ok=True)
-    with open(os.path.join(origin_dir, f"{record_id}.json"), "w", encoding="utf-8") as f:
-        f.write(data)
-
-
-def process_record(record_id):
-    origin_file = os.path.join("data", "origin", f"{record_id}.json")
-    try:
-        with open(origin_file, "r", encoding="utf-8") as f:
-            origin_data = f.read().strip()
-    except FileNotFoundError:
-        print(f"Origin file not found: {origin_file}", file=sys.stderr)
+        origin_data = store.get(record_id).strip()
+    except (FileNotFoundError, KeyError):
+        print(f"Origin record not found: {record_id}", file=sys.stderr)
         sys.exit(1)
 
     parser = MahjongRecordParser(origin_data)
     script_data = parser.script_data
 
-    record_dir = os.path.join("data", "record")
-    os.makedirs(record_dir, exist_ok=True)
-    with open(os.path.join(record_dir, f"{record_id}.json"), "w", encoding="utf-8") as f:
-        json.dump(script_data, f, ensure_ascii=False, indent=2)
+    # 打包归档模式下不再额外落盘解码后的副本，需要时可随时从归档重新解码
+    if not isinstance(store, RecordArchive):
+        # 先写临时文件再改名，中途被打断不会留下被当作有效副本的半截文件
+        write_json(os.path.join("data", "record", f"{record_id}.json"), script_data)
+
+    if seek is None:
+        parser.run_analysis(trace=True)
+        return
 
-    parser.run_analysis()
+    # 只查看某一步的局面：借助检查点跳转，不输出整局过程
+    from tracer import ReplayTracer
+    parser.build_checkpoints()
+    parser.seek(seek)
+    ReplayTracer(parser).print_state()
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python main.py <record_id>", file=sys.stderr)
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python main.py <record_id> [action_index]", file=sys.stderr)
         sys.exit(1)
 
     record_id = sys.argv[1]
-    origin_file = os.path.join("data", "origin", f"{record_id}.json")
+    try:
+        seek = int(sys.argv[2]) if len(sys.argv) == 3 else None
+    except ValueError:
+        print("Usage: python main.py <record_id> [action_index]", file=sys.stderr)
+        sys.exit(1)
+    store = open_origin_store()
 
-    if not os.path.exists(origin_file):
+    if record_id not in store:
         data = download_record(record_id)
-        save_origin(record_id, data)
+        if data is None:
+            sys.exit(1)
+        store.put(record_id, data)
 
-    process_record(record_id)
+    process_record(record_id, store, seek)
+    store.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+# metrics.py
+# batch_process.py 的分阶段计时与指标汇总。
+#
+# 每条记录用一个 RecordMetrics 记录各阶段耗时（http / read / json / decode / load / write / replay）、
+# 读写字节数和出错阶段；它只含基本类型，可以从进程池直接回传。父进程用 BatchMetrics 汇总，
+# 结束时写出 JSON（各阶段总耗时与 p50/p95/max、字节数、错误数、逐条明细），运行中用 Progress 输出进度与 ETA。
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from archive import write_json
+
+METRICS_PATH = os.path.join('data', 'metrics', 'batch_metrics.json')
+
+
+class RecordMetrics:
+    __slots__ = ('record_id', 'stages', 'bytes_read', 'bytes_written', 'error', 'error_stage', 'peak_bytes')
+
+    def __init__(self, record_id):
+        self.record_id = record_id
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.error = None
+        self.error_stage = None
+        self.peak_bytes = None
+
+    @contextmanager
+    def stage(self, name):
+        # 同名阶段可多次进入（例如两次 json.loads），耗时累加
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if self.error_stage is None:
+                self.error_stage = name
+            raise
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class BatchMetrics:
+    def __init__(self):
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._start = time.perf_counter()
+        self.records = {}
+        self.ok = 0
+        self.failed = 0
+        self.download_failed = 0
+        # 重试后才下载成功的记录数
+        self.download_retried = 0
+
+    def _entry(self, record_id):
+        if record_id not in self.records:
+            self.records[record_id] = RecordMetrics(record_id).to_dict()
+        return self.records[record_id]
+
+    def add_download(self, result):
+        entry = self._entry(result.record_id)
+        entry['stages']['http'] = result.elapsed
+        entry['bytes_downloaded'] = result.nbytes
+        entry['download_attempts'] = result.attempts
+        if result.ok and result.attempts and result.attempts > 1:
+            self.download_retried += 1
+        if not result.ok:
+            entry['error'] = result.error
+            entry['error_stage'] = 'http'
+            self.download_failed += 1
+
+    def add(self, record):
+        """record 为 RecordMetrics.to_dict() 的结果，与下载阶段的指标合并。"""
+        entry = self._entry(record['record_id'])
+        stages = entry['stages']
+        entry.update(record)
+        entry['stages'] = {**stages, **record['stages']}
+        if record['error']:
+            self.failed += 1
+        else:
+            self.ok += 1
+
+    def summary(self):
+        per_stage = {}
+        for entry in self.records.values():
+            for name, seconds in entry['stages'].items():
+                per_stage.setdefault(name, []).append(seconds)
+        stages = {}
+        for name, values in per_stage.items():
+            values.sort()
+            total = sum(values)
+            stages[name] = {
+                'count': len(values),
+                'total_s': round(total, 6),
+                'mean_ms': round(total / len(values) * 1000, 3),
+                'p50_ms': round(_percentile(values, 0.5) * 1000, 3),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 3),
+                'max_ms': round(values[-1] * 1000, 3),
+            }
+        errors = {}
+        for entry in self.records.values():
+            if entry['error_stage']:
+                errors[entry['error_stage']] = errors.get(entry['error_stage'], 0) + 1
+        entries = self.records.values()
+        return {
+            'started': self.started,
+            'elapsed_s': round(time.perf_counter() - self._start, 3),
+            'records': len(self.records),
+            'ok': self.ok,
+            'failed': self.failed,
+            'download_failed': self.download_failed,
+            'download_retried': self.download_retried,
+            'bytes': {
+                'downloaded': sum(e.get('bytes_downloaded', 0) for e in entries),
+                'read': sum(e['bytes_read'] for e in entries),
+                'written': sum(e['bytes_written'] for e in entries),
+            },
+            'stages': stages,
+            'errors': errors,
+        }
+
+    def save(self, path=METRICS_PATH, extra=None):
+        data = self.summary()
+        if extra:
+            data.update(extra)
+        data['per_record'] = list(self.records.values())
+        write_json(path, data, indent=None)
+        return data
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """单行进度（速度 + ETA）。终端上原地刷新，重定向到文件时按间隔逐行输出。"""
+
+    def __init__(self, total, label='', out=None, interval=0.5):
+        self.total = total
+        self.label = label
+        self.out = out or sys.stderr
+        self.interval = interval if self.out.isatty() else max(interval, 10.0)
+        self._start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, done, ok=0, failed=0, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval and done < self.total:
+            return
+        self._last = now
+        elapsed = now - self._start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = _format_eta((self.total - done) / rate) if rate > 0 else '--:--:--'
+        line = (f"{self.label}[{done}/{self.total}] {rate:.1f} rec/s  ETA {eta}  "
+                f"ok={ok} fail={failed}")
+        if self.out.isatty():
+            print(f"\r{line}\033[K", end='', file=self.out, flush=True)
+        else:
+            print(line, file=self.out, flush=True)
+
+    def finish(self):
+        if self.out.isatty():
+            print(file=self.out)
@@ -0,0 +1,328 @@
+# mock_server.py
+# tziakcha.net 接口的本地替身：提供 /_qry/history/、/_qry/game/、/_qry/record/，数据取自本地目录（<id>.json，
+# 例如 data/origin）或 synth.py 按固定种子生成的合成记录；可注入延迟、限流（429）、服务端错误、截断的响应体与断开连接，
+# 用来在离线环境下复现地测量下载吞吐与重试行为。
+#
+# 记录按 id 排序后每 --per-game 条组成一个场次（id 为 G000000 起），历史列表按新 → 旧每页 --page-size 个场次。
+# 故障按 (接口, id, 第几次请求) 与 --seed 决定，同一种子下每条记录遇到的故障序列与线程调度无关。
+#
+# 用法：
+#   python mock_server.py [--fixtures DIR | --synthetic N] [--port 8765] [--latency MS] [--jitter MS]
+#                         [--rps R] [--throttle P] [--error-rate P] [--truncate P] [--disconnect P] [--seed S]
+#   TZI_BASE_URL=http://127.0.0.1:8765 python batch_process.py     # 或各脚本的 --base-url
+#   python mock_server.py --bench [--concurrency N] [--rate R] [--retries N] [其余同上]
+#                                                                  # 在本进程内起替身并压测 download_many
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from archive import DirectoryStore
+import downloader
+
+HISTORY_PATH = '/_qry/history/'
+GAME_PATH = '/_qry/game/'
+RECORD_PATH = '/_qry/record/'
+STATS_PATH = '/_stats'
+
+
+class Fixtures:
+    """替身返回的数据：记录内容、场次划分与历史列表。"""
+
+    def __init__(self, records, per_game=16, page_size=10):
+        # records: {记录id: 内容} 或 DirectoryStore（按需读取）
+        self.records = records
+        ids = sorted(records.ids() if hasattr(records, 'ids') else records)
+        self.record_ids = ids
+        self.games = []
+        self.sessions = {}
+        for i, start in enumerate(range(0, len(ids), per_game)):
+            game_id = f"G{i:06d}"
+            self.games.append({'id': game_id, 'title': f"竹 mock session {i}", 't': 1700000000000 + i * 3600000})
+            self.sessions[game_id] = json.dumps({'records': [{'i': rid} for rid in ids[start:start + per_game]]})
+        self.games.reverse()
+        self.page_size = page_size
+
+    @classmethod
+    def from_directory(cls, root, **kwargs):
+        return cls(DirectoryStore(root), **kwargs)
+
+    @classmethod
+    def synthetic(cls, n, seed=1, **kwargs):
+        from synth import generate_records
+        return cls(dict(generate_records(n, seed)), **kwargs)
+
+    def history_page(self, page):
+        start = page * self.page_size
+        return json.dumps({'games': self.games[start:start + self.page_size]}, ensure_ascii=False)
+
+    def session(self, game_id):
+        return self.sessions.get(game_id)
+
+    def record(self, record_id):
+        if record_id not in self.records:
+            return None
+        return self.records.get(record_id) if hasattr(self.records, 'ids') else self.records[record_id]
+
+
+class Faults:
+    """故障注入配置；概率均为 0~1，延迟单位为毫秒。"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rps=None, throttle=0.0, error_rate=0.0, truncate=0.0,
+                 disconnect=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rps = rps
+        self.throttle = throttle
+        self.error_rate = error_rate
+        self.truncate = truncate
+        self.disconnect = disconnect
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._attempts = {}
+        self._window = (0, 0)
+
+    def _over_capacity(self):
+        # 按整秒计数的服务端容量；超出的请求直接 429
+        if not self.rps:
+            return False
+        now = int(time.monotonic())
+        with self._lock:
+            second, count = self._window
+            if second != now:
+                second, count = now, 0
+            self._window = (second, count + 1)
+            return count >= self.rps
+
+    def decide(self, key):
+        """返回 (延迟秒数, 故障)；故障为 None / 'throttle' / 'error' / 'truncate' / 'disconnect'。"""
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        rng = random.Random(f"{self.seed}:{key}:{attempt}")
+        delay = max(self.latency + rng.uniform(-self.jitter, self.jitter), 0.0) / 1000
+        if self._over_capacity():
+            return delay, 'throttle'
+        roll = rng.random()
+        for fault, p in (('throttle', self.throttle), ('error', self.error_rate),
+                         ('truncate', self.truncate), ('disconnect', self.disconnect)):
+            if roll < p:
+                return delay, fault
+            roll -= p
+        return delay, None
+
+
+class ServerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.by_path = {}
+        self.by_outcome = {}
+
+    def add(self, path, outcome):
+        with self._lock:
+            self.requests += 1
+            self.by_path[path] = self.by_path.get(path, 0) + 1
+            self.by_outcome[outcome] = self.by_outcome.get(outcome, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return {'requests': self.requests, 'by_path': dict(self.by_path), 'by_outcome': dict(self.by_outcome)}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 + Content-Length，客户端的 keep-alive 连接池才能复用连接
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，关闭 Nagle 避免与客户端的延迟确认叠加出约 40ms 的等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None, declared=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data) if declared is None else declared))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == STATS_PATH:
+            self._send(200, json.dumps(self.server.stats.to_dict()))
+        else:
+            self._send(404, '{}')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        url = urlparse(self.path)
+        fixtures, faults = self.server.fixtures, self.server.faults
+
+        if url.path == HISTORY_PATH:
+            page = int(body[2:]) if body.startswith('p=') and body[2:].isdigit() else 0
+            key, content = f"history:{page}", fixtures.history_page(page)
+        elif url.path == GAME_PATH:
+            game_id = (parse_qs(url.query).get('id') or [''])[0]
+            key, content = f"game:{game_id}", fixtures.session(game_id)
+        elif url.path == RECORD_PATH:
+            record_id = body[3:] if body.startswith('id=') else body
+            key, content = f"record:{record_id}", fixtures.record(record_id)
+        else:
+            self.server.stats.add(url.path, 'not_found')
+            self._send(404, '{}')
+            return
+
+        delay, fault = faults.decide(key)
+        if delay:
+            time.sleep(delay)
+        if content is None:
+            outcome = 'not_found'
+            self._send(404, '{}')
+        elif fault == 'throttle':
+            outcome = fault
+            self._send(429, '{}', headers={'Retry-After': '1'})
+        elif fault == 'error':
+            outcome = fault
+            self._send(503, '{}')
+        elif fault == 'truncate':
+            # 状态码与长度都正常，但内容只有一半：客户端照常保存，解析时才发现损坏
+            outcome = fault
+            self._send(200, content[:len(content) // 2])
+        elif fault == 'disconnect':
+            # 声明完整长度却只发一半就断开，客户端应视为连接错误重试
+            outcome = fault
+            self._send(200, content[:len(content) // 2], declared=len(content.encode('utf-8')))
+            self.close_connection = True
+        else:
+            outcome = 'ok'
+            self._send(200, content)
+        self.server.stats.add(url.path, outcome)
+
+
+def make_server(fixtures, faults, host='127.0.0.1', port=8765):
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.fixtures = fixtures
+    server.faults = faults
+    server.stats = ServerStats()
+    return server
+
+
+def start_background(fixtures, faults, host='127.0.0.1', port=0):
+    """在后台线程启动替身，返回 (server, base_url)；port=0 时自动选择空闲端口。用完调用 server.shutdown()。"""
+    server = make_server(fixtures, faults, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def bench(fixtures, faults, concurrency=8, rate=None, retries=3, limit=None):
+    """起替身并用 download_many 下载全部（或前 limit 条）记录，返回结果摘要。"""
+    server, base_url = start_background(fixtures, faults)
+    downloader.set_base_url(base_url)
+    record_ids = fixtures.record_ids[:limit]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = DirectoryStore(tmp)
+            start = time.perf_counter()
+            results = downloader.download_many(record_ids, concurrency=concurrency, rate=rate, retries=retries,
+                                               on_result=None, store=store)
+            elapsed = time.perf_counter() - start
+            corrupt = 0
+            for result in results:
+                if result.ok:
+                    try:
+                        json.loads(store.get(result.record_id))
+                    except ValueError:
+                        corrupt += 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    ok = [r for r in results if r.ok]
+    latencies = [r.elapsed * 1000 for r in ok]
+    return {
+        'records': len(record_ids),
+        'ok': len(ok),
+        'failed': len(results) - len(ok),
+        'retried': sum(1 for r in ok if r.attempts > 1),
+        'corrupt': corrupt,
+        'elapsed_s': round(elapsed, 3),
+        'records_per_s': round(len(ok) / elapsed, 1) if elapsed else 0.0,
+        'mb_per_s': round(sum(r.nbytes for r in ok) / elapsed / 1e6, 2) if elapsed else 0.0,
+        'latency_ms': {'p50': round(_percentile(latencies, 0.5), 1), 'p95': round(_percentile(latencies, 0.95), 1),
+                       'max': round(max(latencies, default=0.0), 1)},
+        'server': server.stats.to_dict(),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='tziakcha.net 接口的本地替身')
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument('--fixtures', default=None, help='记录目录（<id>.json，例如 data/origin）')
+    src.add_argument('--synthetic', type=int, default=None, metavar='N', help='改用 N 条合成记录（默认 1000）')
+    ap.add_argument('--per-game', type=int, default=16, help='每个场次的记录数（默认 16）')
+    ap.add_argument('--page-size', type=int, default=10, help='历史列表每页场次数（默认 10）')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', type=float, default=0.0, help='每个请求的平均延迟（毫秒）')
+    ap.add_argument('--jitter', type=float, default=0.0, help='延迟的随机波动幅度（毫秒）')
+    ap.add_argument('--rps', type=float, default=None, help='服务端每秒最多处理的请求数，超出返回 429')
+    ap.add_argument('--throttle', type=float, default=0.0, help='随机返回 429 的概率')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='随机返回 503 的概率')
+    ap.add_argument('--truncate', type=float, default=0.0, help='返回截断响应体（200）的概率')
+    ap.add_argument('--disconnect', type=float, default=0.0, help='响应体发到一半断开连接的概率')
+    ap.add_argument('--seed', type=int, default=1, help='故障注入与合成记录的随机种子')
+    ap.add_argument('--bench', action='store_true', help='在本进程内起替身并压测下载，输出吞吐与重试统计')
+    ap.add_argument('--concurrency', type=int, default=8, help='--bench 的并发下载数（默认 8）')
+    ap.add_argument('--rate', type=float, default=None, help='--bench 的客户端限速（每秒请求数）')
+    ap.add_argument('--retries', type=int, default=3, help='--bench 的重试次数（默认 3）')
+    ap.add_argument('--limit', type=int, default=None, help='--bench 最多下载的记录数')
+    args = ap.parse_args(argv)
+
+    if args.fixtures:
+        if not os.path.isdir(args.fixtures):
+            print(f"记录目录不存在: {args.fixtures}", file=sys.stderr)
+            sys.exit(1)
+        fixtures = Fixtures.from_directory(args.fixtures, per_game=args.per_game, page_size=args.page_size)
+    else:
+        fixtures = Fixtures.synthetic(args.synthetic or 1000, args.seed, per_game=args.per_game,
+                                      page_size=args.page_size)
+    faults = Faults(args.latency, args.jitter, args.rps, args.throttle, args.error_rate, args.truncate,
+                    args.disconnect, args.seed)
+
+    if args.bench:
+        print(json.dumps(bench(fixtures, faults, args.concurrency, args.rate, args.retries, args.limit),
+                         ensure_ascii=False, indent=2))
+        return
+
+    server = make_server(fixtures, faults, args.host, args.port)
+    print(f"{len(fixtures.record_ids)} 条记录、{len(fixtures.games)} 个场次，"
+          f"监听 http://{args.host}:{args.port}（请求统计见 {STATS_PATH}），Ctrl+C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.to_dict(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
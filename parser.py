@@ -1,9 +1,13 @@
 import json
 import base64
 import zlib
-from datetime import datetime, timezone, timedelta
+from array import array
+from itertools import chain
 from typing import List, Dict, Any
 
+from hand_model import CountHand
+from fan_table import FAN_NAMES, FLOWER_FAN_ID
+
 
 
 
@@ -15,12 +19,67 @@ def next_tile(index: int) -> int:
     return index + 4
 
 
+def _decode_script(s: str) -> bytes:
+    return zlib.decompress(base64.b64decode(s))
+
+
 def _parse_script(s: str) -> Dict[str, Any]:
-    return json.loads(zlib.decompress(base64.b64decode(s)).decode('utf-8'))
+    return json.loads(_decode_script(s).decode('utf-8'))
+
+
+# 动作编码字节 -> 玩家 / 动作类型 的查表，配合 bytes.translate 在 C 层完成拆分
+_PLAYER_TABLE = bytes((c >> 4) & 3 for c in range(256))
+_TYPE_TABLE = bytes(c & 15 for c in range(256))
+
+
+class ActionStream:
+    """解码后的动作序列，按字段存放在并行的定长数组中（玩家 p、动作类型 a、数据 d、时间戳 t）。"""
+    __slots__ = ('p', 'a', 'd', 't')
+
+    def __init__(self):
+        self.p = array('B')
+        self.a = array('B')
+        self.d = array('i')
+        self.t = array('q')
+
+    def load(self, acts: List[List[int]]) -> 'ActionStream':
+        # 原地清空后重新填充，复用已分配的数组
+        del self.p[:], self.a[:], self.d[:], self.t[:]
+        flat = list(chain.from_iterable(acts))
+        try:
+            codes = bytes(flat[0::3]) if len(flat) == 3 * len(acts) else None
+        except ValueError:
+            codes = None
+        if codes is not None:
+            self.p.frombytes(codes.translate(_PLAYER_TABLE))
+            self.a.frombytes(codes.translate(_TYPE_TABLE))
+            self.d.extend(flat[1::3])
+            self.t.extend(flat[2::3])
+        else:
+            # 非常规格式（动作元素个数不是 3 或编码超出一个字节）时逐条解码
+            self.p.extend([(a[0] >> 4) & 3 for a in acts])
+            self.a.extend([a[0] & 15 for a in acts])
+            self.d.extend([a[1] for a in acts])
+            self.t.extend([a[2] for a in acts])
+        return self
+
+    def __len__(self) -> int:
+        return len(self.a)
 
+    def __getitem__(self, i: int) -> Dict[str, int]:
+        return {'p': self.p[i], 'a': self.a[i], 'd': self.d[i], 't': self.t[i]}
 
-def _parse_acts(acts: List[List[int]]) -> List[Dict[str, int]]:
-    return [{'p': (a[0] >> 4) & 3, 'a': a[0] & 15, 'd': a[1], 't': a[2]} for a in acts]
+
+def _parse_acts(acts: List[List[int]], out: ActionStream = None) -> ActionStream:
+    if out is None:
+        out = ActionStream()
+    return out.load(acts)
+
+
+# _apply_action 的返回值
+ACT_APPLIED = 0
+ACT_SKIPPED = 1
+ACT_WIN = 2
 
 
 class MahjongRecordParser:
@@ -37,18 +96,54 @@ class MahjongRecordParser:
            [2, 1, 0, 3], [2, 3, 1, 0], [3, 1, 0, 2], [1, 0, 2, 3], [0, 2, 3, 1], [3, 2, 0, 1], [2, 0, 1, 3],
            [0, 1, 3, 2], [1, 3, 2, 0]]
 
-    def __init__(self, record_json_str: str):
-        record_json = json.loads(record_json_str)
-        self.script_data = _parse_script(record_json['script'])
-        self.actions = _parse_acts(self.script_data.get('a', []))
+    __slots__ = ('script_data', 'actions', 'hands', 'packs', 'packs_output', 'discards', 'flower_counts',
+                 'flower_tile', 'initial_hands', 'win_info', 'last_discard_info', 'current_player_idx',
+                 'last_action_was_kong', 'wall', 'wall_front_ptr', 'wall_back_ptr', 'last_draw_tiles',
+                 'checkpoints', 'checkpoint_interval', 'end_position', 'position')
 
-        self.hands = [[] for _ in range(4)]
+    def __init__(self, record_json_str: str = None, hand_model=CountHand):
+        self.script_data = None
+        self.actions = ActionStream()
+        # 手牌模型见 hand_model.py，默认使用计数向量 + 位图的 CountHand
+        self.hands = [hand_model() for _ in range(4)]
         self.packs = [[] for _ in range(4)]
         self.packs_output = [[] for _ in range(4)]
         self.discards = [[] for _ in range(4)]
         self.flower_counts = [0] * 4
         self.flower_tile = [[] for _ in range(4)]
         self.initial_hands = [[] for _ in range(4)]
+        self.wall = []
+        # 记录各家最后一次摸到的牌，用于准确判定自摸的和牌张
+        self.last_draw_tiles = [None] * 4
+        self.checkpoints = []
+        self.checkpoint_interval = 0
+        self.end_position = 0
+        self._clear_state()
+        if record_json_str is not None:
+            self.reset(record_json_str)
+
+    def reset(self, record_json_str: str):
+        """载入一条新记录并清空对局状态；批量处理时复用同一个解析器，避免每条记录重新分配。"""
+        record_json = json.loads(record_json_str)
+        return self.load_script(_parse_script(record_json['script']))
+
+    def load_script(self, script_data: Dict[str, Any]):
+        """载入已解码的 script（reset 的后半段），便于调用方分别统计解码与解析耗时。"""
+        self.script_data = script_data
+        _parse_acts(self.script_data.get('a', []), self.actions)
+        self._clear_state()
+        return self
+
+    def _clear_state(self):
+        for i in range(4):
+            self.hands[i].clear()
+            self.packs[i].clear()
+            self.packs_output[i].clear()
+            self.discards[i].clear()
+            self.flower_tile[i].clear()
+            self.initial_hands[i] = []
+            self.flower_counts[i] = 0
+            self.last_draw_tiles[i] = None
 
         self.win_info = None
         self.last_discard_info = {}
@@ -57,8 +152,9 @@ class MahjongRecordParser:
         self.wall = []
         self.wall_front_ptr = 0
         self.wall_back_ptr = 0
-        # 记录各家最后一次摸到的牌，用于准确判定自摸的和牌张
-        self.last_draw_tiles = [None] * 4
+        # 当前状态对应的动作下标（已应用 actions[:position]）；None 表示不是由 seek/step 维护的状态
+        self.position = None
+        self.checkpoints = []
 
     def get_tile_str(self, index: int) -> str:
         if 0 <= index < 136:
@@ -77,7 +173,7 @@ class MahjongRecordParser:
     # c3 = tile_val + 4 + ((data >> 14) & 3)
 
     def _setup_wall_and_deal(self):
-        wall_indices = [int(self.script_data['w'][i:i + 2], 16) for i in range(0, len(self.script_data['w']), 2)]
+        wall_indices = list(bytes.fromhex(self.script_data['w']))
         dice = [self.script_data['d'] & 15, (self.script_data['d'] >> 4) & 15,
                 (self.script_data['d'] >> 8) & 15, (self.script_data['d'] >> 12) & 15]
         # print(dice)
@@ -106,10 +202,10 @@ class MahjongRecordParser:
 
         for p_offset in range(4):
             player_idx = (dealer_idx + p_offset) % 4
-            self.hands[player_idx].append(self.wall[self.wall_front_ptr])
+            self.hands[player_idx].add(self.wall[self.wall_front_ptr])
             self.wall_front_ptr += 1
 
-        self.hands[dealer_idx].append(self.wall[self.wall_front_ptr])
+        self.hands[dealer_idx].add(self.wall[self.wall_front_ptr])
         self.wall_front_ptr += 1
 
         for i in range(4):
@@ -118,280 +214,210 @@ class MahjongRecordParser:
 
         self.current_player_idx = dealer_idx
 
-    def _print_game_info(self):
-        g = self.script_data['g']
-        p_info = self.script_data['p']
-
-        config_str = (
-            f"配置：{g['n']}盘 | {g['l']}番 ({g['b']}) | {g['r0']}/{g['r1']}+{g['e']} | "
-            f"天地人和 {'✓' if g['bl'] else '✕'} | 战术鸣牌 {'✓' if g['s'] else '✕'} | "
-            f"手牌 {'✓' if g['o'] else '✕'} | 错和 鸣牌 {'✓' if g['d'] else '✕'} "
-            f"{'-30/+10' if g['z'] else '-40/+0'} | {'随机座位' if g['r'] else '固定座位'}"
-        )
-        # print(config_str)
-
-        start_time_unix = self.script_data['t'] / 1000
-        end_time_unix = start_time_unix + (self.actions[-1]['t'] / 1000 if self.actions else 0)
-        tz = timezone(timedelta(hours=8))
-        start_dt = datetime.fromtimestamp(start_time_unix, tz).strftime('%Y-%m-%d %H:%M:%S UTC%z')
-        end_dt = datetime.fromtimestamp(end_time_unix, tz).strftime('%Y-%m-%d %H:%M:%S UTC%z')
+    def run_analysis(self, trace=False, tracer=None):
+        """复盘整局。默认无头模式：不做任何字符串格式化和控制台输出。
 
-        # print(f"开始时间：{start_dt}")
-        # print(f"结束时间：{end_dt}")
+        trace=True 时用 tracer.ReplayTracer 打印完整的人类可读过程日志；也可直接传入自定义 tracer，
+        它需提供 on_start / on_action / on_skipped / on_finish：应用成功的动作调用 on_action，放弃的吃碰杠与和调用 on_skipped。
+        """
+        if trace and tracer is None:
+            from tracer import ReplayTracer
+            tracer = ReplayTracer(self)
 
-        # print("\n--- 玩家信息 ---")
-        # for i in range(4):
-        #     print(f"{self.WIND[i]}家: {p_info[i]['n']} (分数: {p_info[i]['s']})")
-
-    def run_analysis(self):
-        self._print_game_info()
+        # 可在 build_checkpoints / seek 或上一次 run_analysis 之后再次调用：先清空牌面与检查点
+        self._clear_state()
         self._setup_wall_and_deal()
 
-        # print("\n--- 初始配牌 ---")
-        # for i in range(4):
-        #     hand_str = ' '.join(self.initial_hands[i])
-        #     print(f"{self.WIND[i]}家 {self.script_data['p'][i]['n']}:\t {hand_str}")
-
-        # print("\n--- 对局过程 ---")
-        prev_time = 0
-        total_action_num = len(self.actions)
-        act_cnt = 0
-
-        for act in self.actions:
-            act_cnt += 1
-            p_idx, a_type, data, time = act['p'], act['a'], act['d'], act['t']
-            player_info = f"{self.WIND[p_idx]}家 {self.script_data['p'][p_idx]['n']}"
-            time_str = f"[{((time - prev_time) / 1000.0):.3f}s]"
-
-            output = f"{player_info} "
-            lo_byte, hi_byte = data & 0xFF, (data >> 8) & 0xFF
-
-            if a_type == 0:
-                output += "开始出牌"
-            elif a_type == 1:
-                self.flower_counts[p_idx] += 1
-                ot = (hi_byte & 15) + 136
-                self.flower_tile[p_idx].append(self.get_tile_str(ot))
-                # print(self.hands[p_idx])
-                # print(ot)
-                self.hands[p_idx].remove(ot)
-                self.hands[p_idx].append(lo_byte)
-                # 补花后的替换牌也视为本巡最后摸到的牌，供紧接着的自摸和使用
-                self.last_draw_tiles[p_idx] = lo_byte
-                output += f"{'自动' if data & 0x1000 else '手动'}补花 {self.get_tile_str(ot)}->{self.get_tile_str(lo_byte)}"
-            elif a_type == 2:
-                self.current_player_idx = p_idx
-                tile = lo_byte
-                if tile in self.hands[p_idx]: self.hands[p_idx].remove(tile)
-                self.discards[p_idx].append(tile)
-                self.last_discard_info = {'tile': tile, 'player': p_idx}
-                self.last_action_was_kong = False
-                discard_type = '手打' if hi_byte & 1 else '摸打'
-                output += f"{discard_type} {self.get_tile_str(tile)}"
-            elif a_type in [3, 4, 5]:
-                pack_type = self.PACK_ACTION_MAP[a_type]
-                tile_val = (data & 0x3F) << 2
-                offer_from_idx = (p_idx + ((data >> 6) & 3)) % 4
-                self.current_player_idx = p_idx
-                if data == 0:
-                    continue
-
-                if pack_type == "CHI":
-                    offer_tile = self.last_discard_info['tile']
-                    # print(tile_val, offer_tile)
-                    if tile_val - 4 + ((data >> 10) & 3) < 0:
-                        tile_val = offer_tile
-                    c1 = tile_val - 4 + ((data >> 10) & 3)
-                    c2 = tile_val + ((data >> 12) & 3)
-                    c3 = tile_val + 4 + ((data >> 14) & 3)
-                    chi_tiles = [c1, c2, c3]
-                    chi_id = 1
-                    chi_shape = []
-                    # chi_tiles.remove(offer_tile)
-                    # print([self.get_tile_str(t) for t in chi_tiles])
-                    for t in range(3):
-                        if chi_tiles[t] >> 2 == offer_tile >> 2:
-                            chi_id = t + 1
-                            chi_shape.append(f"({self.get_tile_str(chi_tiles[t])})")
-                        else:
-                            # print(self.hands[p_idx], chi_tiles)
-                            for _ in self.hands[p_idx]:
-                                if (_ >> 2) == (chi_tiles[t] >> 2):
-                                    self.hands[p_idx].remove(_)
-                                    break
-                            # self.hands[p_idx].remove(chi_tiles[t])
-                            chi_shape.append(self.get_tile_str(chi_tiles[t]))
-                    self.packs[p_idx].append(("CHI", self.get_tile_GB_str(tile_val), chi_id))
-                    self.packs_output[p_idx].append(chi_shape)
-                    # print(self.packs_output[p_idx])
-                    output += f"吃 {self.get_tile_str(offer_tile)}"
-                    # 按 temp.js 流程，吃后应从供牌者的舍牌移除最后一张
-                    try:
-                        self.discards[offer_from_idx].pop()
-                    except IndexError:
-                        pass
-                elif pack_type == "PENG":
-                    count = 0
-                    hand_copy = list(self.hands[p_idx])
-                    for t in hand_copy:
-                        if (t >> 2) == (tile_val >> 2) and count < 2:
-                            self.hands[p_idx].remove(t)
-                            count += 1
-                    self.packs[p_idx].append(("PENG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
-                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(3)])
-                    output += f"碰 {self.get_tile_str(tile_val)}"
-                    # 碰后移除供牌者的最后一张舍牌
-                    try:
-                        self.discards[offer_from_idx].pop()
-                    except IndexError:
-                        pass
-                elif pack_type == "GANG":
-                    self.last_action_was_kong = True
-                    action = "加杠" if (data & 0x0300) == 0x0300 else "杠"
-                    if action == "加杠":
-                        # self.hands[p_idx].remove(tile_val)
-                        hand_copy = list(self.hands[p_idx])
-                        self.last_discard_info = {'tile': tile_val, 'player': p_idx}
-                        for t in hand_copy:
-                            if (t >> 2) == (tile_val >> 2):
-                                self.hands[p_idx].remove(t)
-                                break
-                        for i, (pt, pstr, po) in enumerate(self.packs[p_idx]):
-                            if pt == "PENG" and pstr == self.get_tile_str(tile_val):
-                                self.packs[p_idx][i] = ("GANG", pstr, po);
-                                self.packs_output[p_idx][i] = ([self.get_tile_str(tile_val) for _ in range(4)])
-                                break
-                    elif (data >> 6) & 3 == 0:  # Concealed
-                        count = 0
-                        hand_copy = list(self.hands[p_idx])
-                        for t in hand_copy:
-                            if (t >> 2) == (tile_val >> 2) and count < 4:
-                                self.hands[p_idx].remove(t)
-                                count += 1
-                        # print([self.get_tile_str(t) for t in self.hands[p_idx]])
-                        self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), 0))
-                        self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
-                    else:  # Melded
-                        for _ in range(3):
-                            count = 0
-                            for t in self.hands[p_idx]:
-                                if (t >> 2) == (tile_val >> 2) and count < 3:
-                                    self.hands[p_idx].remove(t)
-                                    count += 1
-                            # self.hands[p_idx].remove(tile_val)
-                        self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
-                        self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
-                        # 明杠需移除供牌者的最后一张舍牌
-                        try:
-                            self.discards[offer_from_idx].pop()
-                        except IndexError:
-                            pass
-                    output += f"{action} {self.get_tile_str(tile_val)}"
-                # 已在各自分支内处理舍牌回收
-            elif a_type == 6:
-                if data == 0:
-                    continue
-                is_self_drawn = p_idx == self.current_player_idx
-                # 自摸时不要依赖手牌排序后的末尾牌，改为使用上一动作记录的摸牌值
-                win_tile = self.last_draw_tiles[p_idx] if is_self_drawn else self.last_discard_info['tile']
-                self.win_info = {'winner': p_idx, 'win_tile': win_tile, 'is_self_drawn': is_self_drawn}
-                if not is_self_drawn: self.hands[p_idx].append(win_tile)
-                fan = data >> 1
-                fan_str = f"{fan}番" if fan > 0 else ""
-                output += f"{'自动' if data & 1 else '手动'}和 {fan_str}"
+        acts = self.actions
+        apply_action = self._apply_action
+        if tracer is None:
+            for p_idx, a_type, data in zip(acts.p, acts.a, acts.d):
                 # 首次遇到和牌即终止后续流程，避免后续动作影响最终状态
+                if apply_action(p_idx, a_type, data) == ACT_WIN:
+                    break
+            return
+
+        tracer.on_start()
+        for i, (p_idx, a_type, data, time) in enumerate(zip(acts.p, acts.a, acts.d, acts.t)):
+            status = apply_action(p_idx, a_type, data)
+            if status == ACT_SKIPPED:
+                # 放弃的吃碰杠 / 和（data 为 0）不改变牌面，但 tracer 可能要把它当作一次决策
+                tracer.on_skipped(i, p_idx, a_type, data, time)
+            else:
+                tracer.on_action(i, p_idx, a_type, data, time)
+            if status == ACT_WIN:
                 break
-            elif a_type == 7:
-                self.current_player_idx = p_idx
-                tile_to_draw = lo_byte
-                self.hands[p_idx].append(tile_to_draw)
-                self.last_draw_tiles[p_idx] = tile_to_draw
-                draw_type = '摸牌' if not hi_byte else '逆向摸牌'
-                output += f"{draw_type} {self.get_tile_str(tile_to_draw)}"
-            elif a_type == 8:
-                output += "过"
-            elif a_type == 9:
-                output += "弃"
-            
-            self.hands[p_idx].sort()
-            detail_debug = 0
-            if detail_debug:
-                hand_str = ' '.join([self.get_tile_str(t) for t in self.hands[p_idx]])
-                packs_str = ' '.join([f"[{''.join(p)}]" for p in self.packs_output[p_idx]])
-                print(f"{output} {time_str}")
-                print(f"{self.WIND[p_idx]}家 {self.script_data['p'][p_idx]['n']}: {hand_str}  {packs_str}")
-            prev_time = time
-
-        # print("\n--- 最终结果 ---")
-        if not self.win_info:
-            # print("对局为荒庄")
-            pass
-        else:
-            self._print_fan_info()
-
-        # print("\n--- 各家舍牌 ---")
-        # for i in range(4):
-        #     discard_str = ' '.join([self.get_tile_str(t) for t in self.discards[i]])
-        #     print(f"{self.WIND[i]}家 {self.script_data['p'][i]['n']}: {discard_str}")
-
-        # print("\n--- 最终手牌 ---")
-        # for i in range(4):
-        #     self.hands[i].sort()
-        #     hand_str = ' '.join([self.get_tile_str(t) for t in self.hands[i]])
-        #     packs_str = ' '.join([f"[{''.join(p)}]" for p in self.packs_output[i]])
-        #     print(f"{self.WIND[i]}家 {self.script_data['p'][i]['n']}: {hand_str}  {packs_str}")
-
-    def _print_fan_info(self):
-        w_idx = self.win_info['winner']
-        win_data = self.script_data['y'][w_idx]
-        # 兼容缺失字段的牌谱：有些记录可能没有 f/t 字段
-        total_fan = win_data.get('f') if isinstance(win_data, dict) else None
-        fan_details = win_data.get('t', {}) if isinstance(win_data, dict) else {}
-
-        FAN_NAMES = ['无','大四喜','大三元','绿一色','九莲宝灯','四杠','连七对','十三幺','清幺九','小四喜','小三元','字一色','四暗刻','一色双龙会','一色四同顺','一色四节高','一色四步高','一色四连环','三杠','混幺九','七对','七星不靠','全双刻','清一色','一色三同顺','一色三节高','全大','全中','全小','清龙','三色双龙会','一色三步高','一色三连环','全带五','三同刻','三暗刻','全不靠','组合龙','大于五','小于五','三风刻','花龙','推不倒','三色三同顺','三色三节高','无番和','妙手回春','海底捞月','杠上开花','抢杠和','碰碰和','混一色','三色三步高','五门齐','全求人','双暗杠','双箭刻','全带幺','不求人','双明杠','和绝张','箭刻','圈风刻','门风刻','门前清','平和','四归一','双同刻','双暗刻','暗杠','断幺','一般高','喜相逢','连六','老少副','幺九刻','明杠','缺一门','无字','独听・边张','独听・嵌张','独听・单钓','自摸','花牌','明暗杠','\u203b 天和','\u203b 地和','\u203b 人和Ⅰ','\u203b 人和Ⅱ']
-
-        self.hands[w_idx].sort()
-        hand_str = ' '.join([self.get_tile_str(t) for t in self.hands[w_idx]])
-        packs_str = ' '.join([f"[{''.join(p)}]" for p in self.packs_output[w_idx]])
-        print(f"{self.WIND[w_idx]}家 {self.script_data['p'][w_idx]['n']}: {hand_str} {packs_str}")
-
-        calculated_fan_sum = 0
-        for fan_id_str, fan_val in fan_details.items():
-            fan_id = int(fan_id_str)
-            if fan_id == 83:
-                continue  # 跳过花牌番种
-            fan_points = fan_val & 0xFF
-            count = (fan_val >> 8) + 1
-            calculated_fan_sum += fan_points * count
-
-        # 优先使用动作过程中统计到的真实花数，避免不同版本牌谱在番种里缺失花或计算差异导致中断
-        if total_fan is not None:
-            inferred_flower_count = max(total_fan - calculated_fan_sum, 0)
-        else:
-            inferred_flower_count = None
-
-        actual_flower_count = self.flower_counts[w_idx]
-        if inferred_flower_count is not None and inferred_flower_count != actual_flower_count:
-            # 仅提示，不中断
-            print(f"[WARN] 牌谱番种推导花数为 {inferred_flower_count}，与动作统计花数 {actual_flower_count} 不一致，已以实际为准。")
-        flower_count = actual_flower_count
-
-        if flower_count > 0:
-            flower_str = f'花牌x{flower_count}: ' + ' '.join(self.flower_tile[w_idx])
-        else:
-            flower_str = '无花牌'
+        tracer.on_finish()
+
+    # ---------- 检查点与随机访问 ----------
+
+    def _snapshot(self):
+        # 牌面状态的浅拷贝：packs 中的元组不可变，packs_output / 各 info 字典只会被整体替换，不会原地修改
+        return (
+            [tuple(h) for h in self.hands],
+            [list(p) for p in self.packs],
+            [list(p) for p in self.packs_output],
+            [list(d) for d in self.discards],
+            list(self.flower_counts),
+            [list(f) for f in self.flower_tile],
+            list(self.last_draw_tiles),
+            self.win_info, self.last_discard_info, self.current_player_idx, self.last_action_was_kong,
+            self.wall_front_ptr, self.wall_back_ptr,
+        )
 
-        # total_fan 可能缺失，打印时容错
-        tf_str = f"{total_fan}番" if total_fan is not None else "番数未知"
-        print(f"{self.WIND[w_idx]}家 {self.script_data['p'][w_idx]['n']} 和牌! 总计: {tf_str} ({flower_str})")
-        
-        for fan_id_str, fan_val in fan_details.items():
-            fan_id = int(fan_id_str)
-            if fan_id == 83: continue # Skip flower tile
-            fan_points = fan_val & 0xFF
-            count = (fan_val >> 8) + 1
-            fan_name = FAN_NAMES[fan_id] if 0 <= fan_id < len(FAN_NAMES) else f"未知番种({fan_id})"
-            print(f"  {fan_name}: {fan_points}番" + (f" x{count}" if count > 1 else ""))
+    def _restore(self, snap):
+        (hands, packs, packs_output, discards, flower_counts, flower_tile, last_draw_tiles,
+         self.win_info, self.last_discard_info, self.current_player_idx, self.last_action_was_kong,
+         self.wall_front_ptr, self.wall_back_ptr) = snap
+        for i in range(4):
+            self.hands[i].clear()
+            self.hands[i].extend(hands[i])
+            self.packs[i][:] = packs[i]
+            self.packs_output[i][:] = packs_output[i]
+            self.discards[i][:] = discards[i]
+            self.flower_tile[i][:] = flower_tile[i]
+        self.flower_counts[:] = flower_counts
+        self.last_draw_tiles[:] = last_draw_tiles
+
+    def build_checkpoints(self, interval: int = 16):
+        """从头复盘一遍，每 interval 个动作保存一次状态检查点，之后 seek/step 最多只需重放 interval - 1 个动作。
+
+        复盘在和牌处结束，end_position 为可到达的最大下标。返回后解析器停在终局状态。
+        """
+        self._clear_state()
+        self._setup_wall_and_deal()
+        self.checkpoint_interval = max(interval, 1)
+        acts = self.actions
+        apply_action = self._apply_action
+        end = len(acts)
+        for i, (p_idx, a_type, data) in enumerate(zip(acts.p, acts.a, acts.d)):
+            if i % self.checkpoint_interval == 0:
+                self.checkpoints.append(self._snapshot())
+            if apply_action(p_idx, a_type, data) == ACT_WIN:
+                end = i + 1
+                break
+        if end % self.checkpoint_interval == 0:
+            self.checkpoints.append(self._snapshot())
+        self.end_position = end
+        self.position = end
+        return self
+
+    def seek(self, index: int):
+        """跳到已应用 actions[:index] 后的状态（index 截断到 [0, end_position]），返回实际下标。"""
+        if not self.checkpoints:
+            self.build_checkpoints()
+        index = max(0, min(index, self.end_position))
+        base = index - index % self.checkpoint_interval
+        # 当前状态与目标位于同一检查点之后时直接向前重放，否则从最近的检查点恢复
+        if self.position is None or not base <= self.position <= index:
+            self._restore(self.checkpoints[base // self.checkpoint_interval])
+            self.position = base
+        acts = self.actions
+        apply_action = self._apply_action
+        for i in range(self.position, index):
+            apply_action(acts.p[i], acts.a[i], acts.d[i])
+        self.position = index
+        return index
+
+    def step(self, n: int = 1):
+        """向前（n > 0）或向后（n < 0）移动 n 个动作，返回新的下标。"""
+        if not self.checkpoints:
+            self.build_checkpoints()
+        return self.seek((self.position or 0) + n)
+
+    def _apply_action(self, p_idx: int, a_type: int, data: int) -> int:
+        lo_byte, hi_byte = data & 0xFF, (data >> 8) & 0xFF
+
+        if a_type == 1:
+            self.flower_counts[p_idx] += 1
+            ot = (hi_byte & 15) + 136
+            self.flower_tile[p_idx].append(self.get_tile_str(ot))
+            self.hands[p_idx].remove(ot)
+            self.hands[p_idx].add(lo_byte)
+            # 补花后的替换牌也视为本巡最后摸到的牌，供紧接着的自摸和使用
+            self.last_draw_tiles[p_idx] = lo_byte
+        elif a_type == 2:
+            self.current_player_idx = p_idx
+            tile = lo_byte
+            self.hands[p_idx].discard(tile)
+            self.discards[p_idx].append(tile)
+            self.last_discard_info = {'tile': tile, 'player': p_idx}
+            self.last_action_was_kong = False
+        elif a_type in (3, 4, 5):
+            tile_val = (data & 0x3F) << 2
+            offer_from_idx = (p_idx + ((data >> 6) & 3)) % 4
+            self.current_player_idx = p_idx
+            if data == 0:
+                return ACT_SKIPPED
+
+            if a_type == 3:
+                offer_tile = self.last_discard_info['tile']
+                if tile_val - 4 + ((data >> 10) & 3) < 0:
+                    tile_val = offer_tile
+                c1 = tile_val - 4 + ((data >> 10) & 3)
+                c2 = tile_val + ((data >> 12) & 3)
+                c3 = tile_val + 4 + ((data >> 14) & 3)
+                chi_tiles = [c1, c2, c3]
+                chi_id = 1
+                chi_shape = []
+                for t in range(3):
+                    if chi_tiles[t] >> 2 == offer_tile >> 2:
+                        chi_id = t + 1
+                        chi_shape.append(f"({self.get_tile_str(chi_tiles[t])})")
+                    else:
+                        self.hands[p_idx].take_kind(chi_tiles[t] >> 2, 1)
+                        chi_shape.append(self.get_tile_str(chi_tiles[t]))
+                self.packs[p_idx].append(("CHI", self.get_tile_GB_str(tile_val), chi_id))
+                self.packs_output[p_idx].append(chi_shape)
+                # 按 temp.js 流程，吃后应从供牌者的舍牌移除最后一张
+                if self.discards[offer_from_idx]:
+                    self.discards[offer_from_idx].pop()
+            elif a_type == 4:
+                self.hands[p_idx].take_kind(tile_val >> 2, 2)
+                self.packs[p_idx].append(("PENG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
+                self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(3)])
+                # 碰后移除供牌者的最后一张舍牌
+                if self.discards[offer_from_idx]:
+                    self.discards[offer_from_idx].pop()
+            else:
+                self.last_action_was_kong = True
+                if (data & 0x0300) == 0x0300:  # 加杠
+                    self.last_discard_info = {'tile': tile_val, 'player': p_idx}
+                    self.hands[p_idx].take_kind(tile_val >> 2, 1)
+                    for i, (pt, pstr, po) in enumerate(self.packs[p_idx]):
+                        if pt == "PENG" and pstr == self.get_tile_str(tile_val):
+                            self.packs[p_idx][i] = ("GANG", pstr, po)
+                            self.packs_output[p_idx][i] = [self.get_tile_str(tile_val) for _ in range(4)]
+                            break
+                elif (data >> 6) & 3 == 0:  # Concealed
+                    self.hands[p_idx].take_kind(tile_val >> 2, 4)
+                    self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), 0))
+                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
+                else:  # Melded
+                    # 同种牌最多 4 张，移除手中全部该种牌（明杠时手中应恰有 3 张）
+                    self.hands[p_idx].take_kind(tile_val >> 2, 4)
+                    self.packs[p_idx].append(("GANG", self.get_tile_GB_str(tile_val), (data >> 6) & 3))
+                    self.packs_output[p_idx].append([self.get_tile_str(tile_val) for _ in range(4)])
+                    # 明杠需移除供牌者的最后一张舍牌
+                    if self.discards[offer_from_idx]:
+                        self.discards[offer_from_idx].pop()
+        elif a_type == 6:
+            if data == 0:
+                return ACT_SKIPPED
+            is_self_drawn = p_idx == self.current_player_idx
+            # 自摸时不要依赖手牌排序后的末尾牌，改为使用上一动作记录的摸牌值
+            win_tile = self.last_draw_tiles[p_idx] if is_self_drawn else self.last_discard_info['tile']
+            self.win_info = {'winner': p_idx, 'win_tile': win_tile, 'is_self_drawn': is_self_drawn}
+            if not is_self_drawn: self.hands[p_idx].add(win_tile)
+            return ACT_WIN
+        elif a_type == 7:
+            self.current_player_idx = p_idx
+            self.hands[p_idx].add(lo_byte)
+            self.last_draw_tiles[p_idx] = lo_byte
+        # a_type 0（开始出牌）、8（过）、9（弃）不改变牌面状态
+
+        self.hands[p_idx].sort()
+        return ACT_APPLIED
 
     def get_win_analysis(self):
         if not self.win_info:
@@ -403,13 +429,11 @@ class MahjongRecordParser:
         total_fan = win_data.get('f') if isinstance(win_data, dict) else None
         fan_details = win_data.get('t', {}) if isinstance(win_data, dict) else {}
 
-        FAN_NAMES = ['无','大四喜','大三元','绿一色','九莲宝灯','四杠','连七对','十三幺','清幺九','小四喜','小三元','字一色','四暗刻','一色双龙会','一色四同顺','一色四节高','一色四步高','一色四连环','三杠','混幺九','七对','七星不靠','全双刻','清一色','一色三同顺','一色三节高','全大','全中','全小','清龙','三色双龙会','一色三步高','一色三连环','全带五','三同刻','三暗刻','全不靠','组合龙','大于五','小于五','三风刻','花龙','推不倒','三色三同顺','三色三节高','无番和','妙手回春','海底捞月','杠上开花','抢杠和','碰碰和','混一色','三色三步高','五门齐','全求人','双暗杠','双箭刻','全带幺','不求人','双明杠','和绝张','箭刻','圈风刻','门风刻','门前清','平和','四归一','双同刻','双暗刻','暗杠','断幺','一般高','喜相逢','连六','老少副','幺九刻','明杠','缺一门','无字','独听・边张','独听・嵌张','独听・单钓','自摸','花牌','明暗杠','\u203b 天和','\u203b 地和','\u203b 人和Ⅰ','\u203b 人和Ⅱ']
-
         # 计算素番与花数
         calculated_fan_sum = 0
         for fan_id_str, fan_val in fan_details.items():
             fan_id = int(fan_id_str)
-            if fan_id == 83:
+            if fan_id == FLOWER_FAN_ID:
                 continue
             fan_points = fan_val & 0xFF
             count = (fan_val >> 8) + 1
@@ -452,6 +476,9 @@ class MahjongRecordParser:
                 count = (fan_val >> 8) + 1
                 fan_vector[fan_id] = count
 
+        is_self_drawn = self.win_info['is_self_drawn']
+        discarder = None if is_self_drawn else self.last_discard_info.get('player')
+
         return {
             "winner_name": self.script_data['p'][w_idx]['n'],
             "base_fan": base_fan,
@@ -461,6 +488,23 @@ class MahjongRecordParser:
             "fan_vector": fan_vector,
             "fan_names": FAN_NAMES,
             "winning_tile": win_tile_str,
-            "game_title": game_title
+            "game_title": game_title,
+            "is_self_drawn": is_self_drawn,
+            # 点和时打出和牌张的一家（抢杠和时为加杠者）
+            "discarder_name": self.script_data['p'][discarder]['n'] if discarder is not None else None
+        }
+
+    def get_outcome(self):
+        """本局结果的基本事实（荒庄也有）：四家玩家与分数、和牌者 / 放铳者座位、是否自摸。需在 run_analysis 之后调用。"""
+        players = self.script_data.get('p', [])
+        win = self.win_info
+        winner = win['winner'] if win else None
+        self_drawn = bool(win and win['is_self_drawn'])
+        return {
+            "players": [p.get('n', '') for p in players],
+            "scores": [p.get('s', 0) for p in players],
+            "winner": winner,
+            "discarder": None if winner is None or self_drawn else self.last_discard_info.get('player'),
+            "self_drawn": self_drawn,
         }
 
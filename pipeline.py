@@ -0,0 +1,92 @@
+# pipeline.py
+# 下载与解析重叠执行的流水线（batch_process.py 使用）：
+#
+#   下载线程池 ──┐
+#                ├─> 有界队列 ──> stream_records() ──> workers.map_unordered ──> 解析进程池
+#   本地已有记录 ─┘
+#
+# 本地已有的记录立即入队，缺失的记录下载并写入存储后入队；解析进程忙不过来时队列填满，
+# 下载线程阻塞在入队上（背压），内存占用与记录总数无关。
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from downloader import Fetcher, DownloadResult, fetch_and_store
+
+_DONE = object()
+
+
+def stream_records(record_ids, store, concurrency=8, rate=None, retries=3, queue_size=256, on_download=None,
+                   batch=None):
+    """逐个产出已在 store 中就绪的记录 id（顺序不定）。
+
+    缺失的记录边下载边产出；每条下载结果（含失败）在当前线程回调 on_download(result)。
+    batch 非空时改为产出 id 列表：取出一条后顺带取走队列里已就绪的记录（最多 batch 条），
+    本地记录多时批次大、减少进程间往返，下载跟不上时批次小、不额外等待。
+    """
+    record_ids = list(dict.fromkeys(record_ids))
+    local = [rid for rid in record_ids if rid in store]
+    missing = [rid for rid in record_ids if rid not in store]
+    ready = queue.Queue(maxsize=max(queue_size, 1))
+    stop = threading.Event()
+
+    def put(item):
+        # 消费方提前退出时不再阻塞，避免生产线程永远挂在满队列上
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fetch(fetcher, record_id):
+        if not stop.is_set():
+            put(fetch_and_store(fetcher, record_id, store))
+
+    def produce():
+        fetcher = Fetcher(concurrency=concurrency, rate=rate, retries=retries) if missing else None
+        try:
+            with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+                for record_id in missing:
+                    pool.submit(fetch, fetcher, record_id)
+                for record_id in local:
+                    put(record_id)
+                    if stop.is_set():
+                        break
+        finally:
+            if fetcher is not None:
+                fetcher.close()
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+    producer.start()
+    try:
+        finished = False
+        while not finished:
+            items = [ready.get()]
+            while batch and len(items) < batch:
+                try:
+                    items.append(ready.get_nowait())
+                except queue.Empty:
+                    break
+            ids = []
+            for item in items:
+                if item is _DONE:
+                    finished = True
+                    continue
+                if isinstance(item, DownloadResult):
+                    if on_download:
+                        on_download(item)
+                    if not item.ok:
+                        continue
+                    item = item.record_id
+                ids.append(item)
+            if batch:
+                if ids:
+                    yield ids
+            else:
+                yield from ids
+    finally:
+        stop.set()
+        producer.join()
@@ -0,0 +1,294 @@
+# player_stats.py
+# 玩家成绩表（data/player_stats.db）：从每条记录提取结果事实（四家玩家与座位、分数 p[i]['s']、和牌者、放铳者、
+# 是否自摸、是否荒庄、和牌番数），按玩家和按 全庄 × 玩家 累加成计数表，查询时换算为和牌率、放铳率、自摸率等。
+#
+# 每条记录的事实单独存一行（outcomes 表）。新增记录只加上它的贡献；记录内容变化（存储键不同）时先减去旧贡献再加新的，
+# 因此新记录到达后几秒内即可更新，不必全量重算。batch_process.py 解析时按块写入；
+# parser.py 等源码变化时成绩表整体清空，下次运行 batch_process.py（处理日志只认同一解析器版本的完成记录）或 build 时重建；
+#   python player_stats.py build [--workers N]        # 补齐存储中尚未入表或已变化的记录（只解析这些记录）
+#   python player_stats.py report [--sort win_rate] [--min-hands 50] [--top 20]
+#   python player_stats.py session <全庄id>
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from stats_cache import parser_version
+
+STATS_PATH = os.path.join('data', 'player_stats.db')
+
+# 每个玩家 / 全庄×玩家 累加的计数
+COUNTERS = ('hands', 'dealer_hands', 'wins', 'self_draws', 'deal_ins', 'draws', 'score', 'win_fan', 'deal_in_fan')
+
+# report --sort 可用的列：比例列由计数换算
+SORT_KEYS = ('hands', 'wins', 'win_rate', 'self_draw_rate', 'deal_in_rate', 'draw_rate', 'avg_score', 'avg_win_fan',
+             'score')
+
+_COUNTER_COLUMNS = ',\n    '.join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in COUNTERS)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    record_id TEXT PRIMARY KEY,
+    store_key TEXT,
+    session_id TEXT NOT NULL DEFAULT '',
+    facts TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    {_COUNTER_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS session_players (
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    {_COUNTER_COLUMNS},
+    PRIMARY KEY (session_id, name)
+);
+"""
+
+
+def record_facts(parser, win_data=None):
+    """一条已复盘记录的结果事实；win_data 为 get_win_analysis() 的结果（省略时现算）。"""
+    facts = parser.get_outcome()
+    if facts['winner'] is not None:
+        win_data = win_data or parser.get_win_analysis()
+        facts['total_fan'] = win_data['total_fan']
+    else:
+        facts['total_fan'] = 0
+    return facts
+
+
+def contributions(facts):
+    """事实 → [(玩家, 计数元组)]，顺序同 COUNTERS；座位 0 为庄家。"""
+    winner, discarder = facts['winner'], facts['discarder']
+    total_fan = facts.get('total_fan') or 0
+    rows = []
+    for seat, name in enumerate(facts['players']):
+        win = int(seat == winner)
+        deal_in = int(seat == discarder)
+        rows.append((name, (
+            1,
+            int(seat == 0),
+            win,
+            win * int(facts['self_drawn']),
+            deal_in,
+            int(winner is None),
+            facts['scores'][seat] if seat < len(facts['scores']) else 0,
+            win * total_fan,
+            deal_in * total_fan,
+        )))
+    return rows
+
+
+def _rates(counts):
+    hands, wins = counts['hands'], counts['wins']
+    return {
+        **counts,
+        'win_rate': wins / hands if hands else 0.0,
+        'self_draw_rate': counts['self_draws'] / wins if wins else 0.0,
+        'deal_in_rate': counts['deal_ins'] / hands if hands else 0.0,
+        'draw_rate': counts['draws'] / hands if hands else 0.0,
+        'avg_score': counts['score'] / hands if hands else 0.0,
+        'avg_win_fan': counts['win_fan'] / wins if wins else 0.0,
+    }
+
+
+_parser = None
+
+
+def analyze_record(record_id):
+    """进程池任务：返回 (record_id, facts, error)。"""
+    global _parser
+    from parser import MahjongRecordParser
+    from archive import shared_origin_store
+    if _parser is None:
+        _parser = MahjongRecordParser()
+    try:
+        content = shared_origin_store().get(record_id)
+        if not content.strip():
+            return record_id, None, None
+        _parser.reset(content)
+        _parser.run_analysis()
+        return record_id, record_facts(_parser), None
+    except Exception as e:
+        return record_id, None, str(e)
+
+
+class PlayerStats:
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # 解析器源码变化后旧事实可能不再正确，整体清空
+        version = parser_version()
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'parser_version'").fetchone()
+        if row is None or row[0] != version:
+            for table in ('outcomes', 'players', 'session_players'):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('parser_version', ?)", (version,))
+        self.conn.commit()
+
+    @staticmethod
+    def exists(path=STATS_PATH):
+        return os.path.exists(path)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 写入 ----------
+
+    def _apply(self, facts, session_id, sign):
+        cols = ', '.join(COUNTERS)
+        marks = ', '.join('?' * len(COUNTERS))
+        updates = ', '.join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)
+        player_rows, session_rows = [], []
+        for name, counts in contributions(facts):
+            counts = tuple(sign * c for c in counts)
+            player_rows.append((name,) + counts)
+            session_rows.append((session_id, name) + counts)
+        self.conn.executemany(f"INSERT INTO players (name, {cols}) VALUES (?, {marks}) "
+                              f"ON CONFLICT(name) DO UPDATE SET {updates}", player_rows)
+        self.conn.executemany(f"INSERT INTO session_players (session_id, name, {cols}) VALUES (?, ?, {marks}) "
+                              f"ON CONFLICT(session_id, name) DO UPDATE SET {updates}", session_rows)
+
+    def _remove_one(self, record_id):
+        row = self.conn.execute("SELECT session_id, facts FROM outcomes WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None:
+            return False
+        self._apply(json.loads(row[1]), row[0], -1)
+        self.conn.execute("DELETE FROM outcomes WHERE record_id = ?", (record_id,))
+        return True
+
+    def add_many(self, rows):
+        """rows: [(record_id, key, facts, session_id)]；已有的记录先减去旧贡献。一个事务内写入。"""
+        with self.conn:
+            for record_id, key, facts, session_id in rows:
+                self._remove_one(record_id)
+                session_id = session_id or ''
+                self._apply(facts, session_id, 1)
+                self.conn.execute("INSERT INTO outcomes (record_id, store_key, session_id, facts) VALUES (?, ?, ?, ?)",
+                                  (record_id, json.dumps(key), session_id, json.dumps(facts, ensure_ascii=False)))
+            self._drop_empty()
+
+    def remove(self, record_ids):
+        with self.conn:
+            removed = sum(self._remove_one(rid) for rid in record_ids)
+            self._drop_empty()
+        return removed
+
+    def _drop_empty(self):
+        self.conn.execute("DELETE FROM players WHERE hands <= 0")
+        self.conn.execute("DELETE FROM session_players WHERE hands <= 0")
+
+    def sync(self, store, parent_map=None, workers=1):
+        """补齐存储中新增或已变化（存储键不同）的记录，删除存储中已不存在的记录。返回 (更新数, 删除数, 失败数)。"""
+        from workers import map_ordered
+        parent_map = parent_map or {}
+        known = dict(self.conn.execute("SELECT record_id, store_key FROM outcomes"))
+        todo = {}
+        for record_id in store.ids():
+            key = store.key(record_id)
+            if known.pop(record_id, None) != json.dumps(key):
+                todo[record_id] = key
+        rows, errors = [], 0
+        for record_id, facts, error in map_ordered(analyze_record, list(todo), workers=workers):
+            if error:
+                errors += 1
+                print(f"Error processing record {record_id}: {error}")
+            elif facts:
+                session_id = parent_map.get(record_id, {}).get('session_id', '')
+                rows.append((record_id, todo[record_id], facts, session_id))
+        self.add_many(rows)
+        removed = self.remove(known)
+        return len(rows), removed, errors
+
+    # ---------- 查询 ----------
+
+    def _select(self, table, where='', params=()):
+        cur = self.conn.execute(f"SELECT name, {', '.join(COUNTERS)} FROM {table} {where}", params)
+        return [{'name': row[0], **_rates(dict(zip(COUNTERS, row[1:])))} for row in cur]
+
+    def table(self, sort='wins', min_hands=0, limit=None):
+        """玩家成绩表，按 sort 降序；min_hands 过滤局数太少的玩家。"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"未知排序列: {sort}")
+        rows = self._select('players', 'WHERE hands >= ?', (min_hands,))
+        rows.sort(key=lambda r: (-r[sort], r['name']))
+        return rows[:limit]
+
+    def player(self, name):
+        rows = self._select('players', 'WHERE name = ?', (name,))
+        return rows[0] if rows else None
+
+    def session(self, session_id):
+        rows = self._select('session_players', 'WHERE session_id = ?', (session_id,))
+        rows.sort(key=lambda r: (-r['score'], r['name']))
+        return rows
+
+    def counts(self):
+        return {
+            'records': self.conn.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0],
+            'players': self.conn.execute("SELECT COUNT(*) FROM players").fetchone()[0],
+            'sessions': self.conn.execute("SELECT COUNT(DISTINCT session_id) FROM session_players").fetchone()[0],
+        }
+
+
+def _print_table(rows):
+    print(f"  {'玩家':<16} {'局数':>6} {'和牌':>5} {'和牌率':>7} {'自摸率':>7} {'放铳率':>7} {'荒庄率':>7} "
+          f"{'平均得分':>8} {'平均和牌番':>9}")
+    for r in rows:
+        print(f"  {r['name']:<16} {r['hands']:>6} {r['wins']:>5} {r['win_rate']:>7.1%} {r['self_draw_rate']:>7.1%} "
+              f"{r['deal_in_rate']:>7.1%} {r['draw_rate']:>7.1%} {r['avg_score']:>8.2f} {r['avg_win_fan']:>9.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='玩家成绩表：和牌率、放铳率、自摸率')
+    ap.add_argument('--db', default=STATS_PATH, help=f'数据库路径（默认 {STATS_PATH}）')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    b = sub.add_parser('build', help='补齐新增或变化的记录')
+    b.add_argument('--workers', type=int, default=1, help='并行进程数（默认 1）')
+    r = sub.add_parser('report', help='打印玩家成绩表')
+    r.add_argument('--sort', default='wins', choices=SORT_KEYS, help='排序列（默认 wins）')
+    r.add_argument('--min-hands', type=int, default=0, help='只列出局数不少于 N 的玩家')
+    r.add_argument('--top', type=int, default=20, help='列出的人数（默认 20）')
+    s = sub.add_parser('session', help='某个全庄内各玩家的成绩')
+    s.add_argument('session_id')
+    args = ap.parse_args(argv)
+
+    with PlayerStats(args.db) as stats:
+        if args.cmd == 'build':
+            from archive import shared_origin_store
+            from catalog import load_parent_map
+            start = time.perf_counter()
+            updated, removed, errors = stats.sync(shared_origin_store(), load_parent_map(), args.workers)
+            print(f"成绩表已更新：新增/变化 {updated} 条，删除 {removed} 条，失败 {errors} 条，"
+                  f"用时 {time.perf_counter() - start:.2f}s -> {args.db}")
+        elif args.cmd == 'report':
+            c = stats.counts()
+            print(f"记录 {c['records']} 条，玩家 {c['players']} 人，全庄 {c['sessions']} 个")
+            _print_table(stats.table(args.sort, args.min_hands, args.top))
+        else:
+            rows = stats.session(args.session_id)
+            if not rows:
+                print(f"没有全庄 {args.session_id} 的记录")
+                return
+            _print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,49 @@
+# select_session.py
+# 从本地目录（data/catalog.db）筛选场次，写入目录的 selected 表，供 session.py 展开。
+#
+# 用法：python select_session.py [--title 竹] [--since 2025-01-01] [--until 2025-07-01] [--player 名字] [--limit N]
+#   条件之间为“且”；默认沿用原来的规则：标题包含“竹”。
+
+import argparse
 import json
+import os
+from datetime import datetime, timezone, timedelta
+
+from catalog import Catalog
+
+_TZ = timezone(timedelta(hours=8))
+
+
+def _date_ms(text):
+    return int(datetime.strptime(text, '%Y-%m-%d').replace(tzinfo=_TZ).timestamp() * 1000)
+
+
+def find_matches(catalog, title='竹', since=None, until=None, player=None, limit=None):
+    """按标题子串 / 日期范围 / 玩家筛选场次，返回 [{"id", "title"}]。"""
+    if not catalog.game_count() and os.path.exists('record_lists.json'):
+        # 从旧版的 JSON 文件链迁移
+        catalog.import_json()
+    return catalog.find_games(title=title, since=_date_ms(since) if since else None,
+                              until=_date_ms(until) if until else None, player=player, limit=limit)
 
-def find_matches():
-    # 读取 JSON 文件
-    try:
-        with open('record_lists.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print("错误：文件 record_lists.json 未找到")
-        return []
-    except json.JSONDecodeError:
-        print("错误：文件格式无效，不是合法的 JSON")
-        return []
-    
-    # 筛选包含 "竹" 的记录
-    matches = []
-    for record in data:
-        if 'title' in record and '竹' in record['title']:
-            matches.append({
-                "id": record["id"],
-                "title": record["title"]
-            })
-    
-    return matches
 
 if __name__ == "__main__":
-    results = find_matches()
-    
+    ap = argparse.ArgumentParser(description='筛选场次')
+    ap.add_argument('--title', default='竹', help="标题包含的子串（默认 '竹'，传空串表示不限）")
+    ap.add_argument('--since', default=None, help='开始日期（含），格式 YYYY-MM-DD')
+    ap.add_argument('--until', default=None, help='结束日期（不含），格式 YYYY-MM-DD')
+    ap.add_argument('--player', default=None, help='包含该玩家的场次（需已解析过其对局记录）')
+    ap.add_argument('--limit', type=int, default=None)
+    args = ap.parse_args()
+
+    with Catalog() as catalog:
+        results = find_matches(catalog, args.title, args.since, args.until, args.player, args.limit)
+        catalog.set_selected([r['id'] for r in results])
+
     # 格式化输出结果（JSON 格式）
     if results:
         print(json.dumps(results, indent=2, ensure_ascii=False))
     else:
         print("[]")  # 无匹配结果时输出空列表
-    
-    print(f"总共找到 {len(results)} 条包含 '竹' 的记录。")
 
-    with open('selected.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+    print(f"总共找到 {len(results)} 条符合条件的场次，已写入 data/catalog.db 的 selected 表。")
@@ -0,0 +1,251 @@
+# server.py
+# 常驻查询服务：启动一次，之后按请求返回记录摘要、和牌分析与任意动作后的局面（JSON），
+# 不必每次都像 python main.py <记录id> 那样重新启动解释器、导入依赖、解码并复盘整局。
+#
+# 记录按需从 data/origin（或 data/archive）读取，解析后的解析器（含检查点）放在有界 LRU 缓存中；
+# parser.py / tracer.py（以及 --download 时的 requests）在第一次请求时才导入，启动只需标准库。
+#
+# 用法：
+#   python server.py [--port 8766 | --socket data/server.sock] [--cache-size 64] [--download]
+#   curl localhost:8766/record/<id>                  # 摘要：标题、开始时间、玩家、动作数、结果
+#   curl localhost:8766/record/<id>/win              # 和牌分析（同 generate_stats.py 的一行）
+#   curl localhost:8766/record/<id>/state?k=120      # 第 k 个动作之后的局面（省略 k 为终局）
+#   curl localhost:8766/stats                        # 缓存命中情况
+#   curl --unix-socket data/server.sock http://localhost/record/<id>
+
+import argparse
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+DEFAULT_PORT = 8766
+
+# 记录 id 只允许字母数字：id 会拼进 data/origin/<id>.json，带 / 或 .. 的 id 可能读写到目录之外
+_RECORD_ID = re.compile(r'[A-Za-z0-9]+')
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class _Entry:
+    """一条已解析的记录：解析器停在某个位置，seek 会改变状态，因此每条记录一把锁。"""
+
+    __slots__ = ('parser', 'lock', 'summary', 'win')
+
+    def __init__(self, parser, summary, win):
+        self.parser = parser
+        self.lock = threading.Lock()
+        self.summary = summary
+        self.win = win
+
+
+def _summary(record_id, parser, win):
+    script = parser.script_data
+    return {
+        'id': record_id,
+        'title': script['g'].get('t'),
+        'start_time': script.get('t'),
+        'players': [{'seat': parser.WIND[i], 'name': p['n'], 'score': p['s']} for i, p in enumerate(script['p'])],
+        'actions': len(parser.actions),
+        'end_position': parser.end_position,
+        'result': {'winner': win['winner_name'], 'total_fan': win['total_fan'], 'winning_tile': win['winning_tile']}
+        if win else None,
+    }
+
+
+class RecordCache:
+    """记录 id → _Entry 的 LRU 缓存；加载在锁外进行，同一记录并发首次请求时可能各解析一次，只保留先放入的那份。"""
+
+    def __init__(self, maxsize=64, download=False, checkpoint_interval=16):
+        self.maxsize = max(maxsize, 1)
+        self.download = download
+        self.checkpoint_interval = checkpoint_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def _content(self, record_id):
+        from archive import shared_origin_store
+        store = shared_origin_store()
+        if record_id in store:
+            return store.get(record_id)
+        if self.download:
+            from downloader import download_record
+            data = download_record(record_id)
+            if data:
+                store.put(record_id, data)
+                return data
+        raise NotFound(f"record not found: {record_id}")
+
+    def _load(self, record_id):
+        from parser import MahjongRecordParser
+        start = time.perf_counter()
+        content = self._content(record_id).strip()
+        if not content:
+            raise NotFound(f"record is empty: {record_id}")
+        parser = MahjongRecordParser(content)
+        # 复盘一遍并保存检查点；复盘结束时停在终局，顺带取出和牌分析
+        parser.build_checkpoints(self.checkpoint_interval)
+        win = parser.get_win_analysis()
+        entry = _Entry(parser, _summary(record_id, parser, win), win)
+        self.load_time += time.perf_counter() - start
+        return entry
+
+    def get(self, record_id):
+        if not _RECORD_ID.fullmatch(record_id):
+            raise BadRequest(f"invalid record id: {record_id}")
+        with self._lock:
+            entry = self._entries.get(record_id)
+            if entry is not None:
+                self._entries.move_to_end(record_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._load(record_id)
+        with self._lock:
+            entry = self._entries.setdefault(record_id, entry)
+            self._entries.move_to_end(record_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'load_seconds': round(self.load_time, 3)}
+
+
+def state_at(entry, k=None):
+    """第 k 个动作之后的局面；k 为 None 时取终局。"""
+    from tracer import ReplayTracer
+    with entry.lock:
+        parser = entry.parser
+        index = parser.seek(parser.end_position if k is None else k)
+        tile = parser.get_tile_str
+        last_action = None
+        if index > 0:
+            acts = parser.actions
+            i = index - 1
+            last_action = {'index': i, 'seat': acts.p[i], 'type': acts.a[i],
+                           'text': ReplayTracer(parser).describe(acts.p[i], acts.a[i], acts.d[i])}
+        return {
+            'id': entry.summary['id'],
+            'position': index,
+            'end_position': parser.end_position,
+            'last_action': last_action,
+            'hands': [[tile(t) for t in sorted(parser.hands[i])] for i in range(4)],
+            'packs': [[''.join(p) for p in parser.packs_output[i]] for i in range(4)],
+            'discards': [[tile(t) for t in parser.discards[i]] for i in range(4)],
+            'flowers': list(parser.flower_counts),
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        cache = self.server.cache
+        try:
+            if parts == ['stats']:
+                self._send_json(200, {**cache.stats(), 'uptime': round(time.time() - self.server.started, 1)})
+            elif len(parts) == 2 and parts[0] == 'record':
+                self._send_json(200, cache.get(parts[1]).summary)
+            elif len(parts) == 3 and parts[0] == 'record' and parts[2] == 'win':
+                self._send_json(200, cache.get(parts[1]).win)
+            elif len(parts) == 3 and parts[0] == 'record' and parts[2] == 'state':
+                k = (parse_qs(url.query).get('k') or [None])[0]
+                try:
+                    k = None if k is None else int(k)
+                except ValueError:
+                    self._send_json(400, {'error': f"k must be an integer: {k}"})
+                    return
+                self._send_json(200, state_at(cache.get(parts[1]), k))
+            else:
+                self._send_json(404, {'error': f"unknown path: {url.path}"})
+        except BadRequest as e:
+            self._send_json(400, {'error': str(e)})
+        except NotFound as e:
+            self._send_json(404, {'error': str(e)})
+        except Exception as e:
+            # 单条记录损坏不影响服务本身
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+
+class _UnixQueryHandler(QueryHandler):
+    # Unix socket 没有 TCP_NODELAY 选项
+    disable_nagle_algorithm = False
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(cache, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, _UnixQueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+        server.daemon_threads = True
+    server.cache = cache
+    server.started = time.time()
+    return server
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='常驻的牌谱查询服务')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'HTTP 端口（默认 {DEFAULT_PORT}）')
+    ap.add_argument('--socket', default=None, help='改为监听 Unix socket（例如 data/server.sock）')
+    ap.add_argument('--cache-size', type=int, default=64, help='缓存的已解析记录数（默认 64）')
+    ap.add_argument('--checkpoint-interval', type=int, default=16, help='检查点间隔（动作数，默认 16）')
+    ap.add_argument('--download', action='store_true', help='本地没有的记录从 tziakcha.net 下载')
+    args = ap.parse_args(argv)
+
+    cache = RecordCache(args.cache_size, args.download, args.checkpoint_interval)
+    server = make_server(cache, args.host, args.port, args.socket)
+    where = f"unix:{args.socket}" if args.socket else f"http://{args.host}:{args.port}"
+    print(f"监听 {where}（缓存 {cache.maxsize} 条记录），Ctrl+C 退出", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,112 @@
-import requests
-import os
+# session.py
+# 把目录（data/catalog.db）中选中的场次展开为对局记录 id，按主键 upsert 到 sessions / records 表。
+#
+# 用法：python session.py [--concurrency N] [--rate R] [--refresh]
+#   场次接口的原始响应缓存在 data/session/<场次id>.json，已缓存的场次不再请求（结束的场次不会变化）；
+#   --refresh 忽略缓存重新请求。
+
+import argparse
 import json
-from typing import List, Dict, Any
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
-selected: List[Dict[str, Any]] = json.load(open('selected.json', 'r', encoding='utf-8'))
+from archive import DirectoryStore
+from catalog import Catalog
+from downloader import Fetcher, FetchError, api_url, set_base_url
 
 HEADERS = {
     "accept": "*/*",
     "content-type": "text/plain;charset=UTF-8"
 }
 
-GAME_URL_TEMPLATE = "https://tziakcha.net/_qry/game/?id={game_id}"
+GAME_PATH_TEMPLATE = "/_qry/game/?id={game_id}"
+SESSION_DIR = os.path.join("data", "session")
 
-grouped_sessions: List[Dict[str, Any]] = []
-record_parent_map: Dict[str, Dict[str, Any]] = {}
 
-for item in selected:
-    session_id = item.get('id')
-    title = item.get('title')
-    try:
-        response = requests.post(GAME_URL_TEMPLATE.format(game_id=session_id), headers=HEADERS, data='')
-        response.raise_for_status()
-        data = response.json()
-    except Exception as e:
-        print(f"Failed to fetch session {session_id}: {e}")
-        continue
-
-    records: List[str] = []
-    if isinstance(data, dict) and 'records' in data and isinstance(data['records'], list):
-        for idx, record in enumerate(data['records']):
-            # 每个 record 预期包含键 'i'
-            rec_id = record.get('i') if isinstance(record, dict) else None
-            if not rec_id:
+def _parse_session(text):
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+        raise ValueError("unexpected response")
+    return data
+
+
+def load_sessions(session_ids, cache, concurrency=8, rate=None, refresh=False):
+    """返回 {场次id: 场次数据}；缓存未命中的场次并发请求，成功后写入缓存。失败的场次不在结果中。"""
+    session_ids = list(dict.fromkeys(session_ids))
+    sessions = {}
+    todo = []
+    for session_id in session_ids:
+        if not refresh and session_id in cache:
+            try:
+                sessions[session_id] = _parse_session(cache.get(session_id))
                 continue
-            records.append(rec_id)
-            record_parent_map[rec_id] = {
-                "session_id": session_id,
-                "title": title,
-                "order_in_session": idx + 1  # 1-based index
-            }
-
-    grouped_sessions.append({
-        "session_id": session_id,
-        "title": title,
-        "records": records
-    })
-
-# 写入新的分组结构文件 all_record.json （替换旧的扁平列表）
-with open('all_record.json', 'w', encoding='utf-8') as f:
-    json.dump(grouped_sessions, f, ensure_ascii=False, indent=2)
-
-# 额外写入 record -> parent session 映射，方便后续统计或关联
-with open('record_parent_map.json', 'w', encoding='utf-8') as f:
-    json.dump(record_parent_map, f, ensure_ascii=False, indent=2)
-
-print(f"Written grouped sessions to all_record.json (sessions={len(grouped_sessions)})")
-print(f"Written record parent map to record_parent_map.json (records={len(record_parent_map)})")
\ No newline at end of file
+            except ValueError:
+                pass  # 缓存损坏，重新请求
+        todo.append(session_id)
+
+    fetcher = Fetcher(concurrency=concurrency, rate=rate, headers=HEADERS)
+
+    def fetch_one(session_id):
+        text = fetcher.post(api_url(GAME_PATH_TEMPLATE.format(game_id=session_id)), data='')
+        data = _parse_session(text)
+        if data['records']:
+            cache.put(session_id, text)
+        return data
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+            futures = {session_id: pool.submit(fetch_one, session_id) for session_id in todo}
+            for session_id, future in futures.items():
+                try:
+                    sessions[session_id] = future.result()
+                except (FetchError, ValueError, OSError) as e:
+                    print(f"Failed to fetch session {session_id}: {e}")
+    finally:
+        fetcher.close()
+    print(f"Fetched {len(todo)} session(s), {len(session_ids) - len(todo)} from cache")
+    return sessions
+
+
+def expand_session(data):
+    """返回 [(局序, 记录id)]，局序从 1 开始。"""
+    records: List[Tuple[int, str]] = []
+    for idx, record in enumerate(data['records']):
+        # 每个 record 预期包含键 'i'
+        rec_id = record.get('i') if isinstance(record, dict) else None
+        if rec_id:
+            records.append((idx + 1, rec_id))
+    return records
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='将场次展开为对局记录 id')
+    ap.add_argument('--concurrency', type=int, default=8, help='并发请求数（默认 8）')
+    ap.add_argument('--rate', type=float, default=None, help='每秒最多请求数（默认不限速）')
+    ap.add_argument('--refresh', action='store_true', help='忽略缓存，重新请求全部场次')
+    ap.add_argument('--base-url', default=None, help='接口地址（默认 $TZI_BASE_URL 或 https://tziakcha.net）')
+    args = ap.parse_args(argv)
+    set_base_url(args.base_url)
+
+    with Catalog() as catalog:
+        selected = catalog.selected_games()
+        if not selected and os.path.exists('selected.json'):
+            # 从旧版的 JSON 文件链迁移
+            catalog.import_json()
+            selected = catalog.selected_games()
+        sessions = load_sessions([item['id'] for item in selected], DirectoryStore(SESSION_DIR),
+                                 args.concurrency, args.rate, args.refresh)
+
+        n_records = 0
+        for item in selected:
+            session_id = item['id']
+            if session_id in sessions:
+                records = expand_session(sessions[session_id])
+                catalog.upsert_session(session_id, item['title'], records)
+                n_records += len(records)
+
+    print(f"Expanded {len(sessions)} session(s) into {n_records} record(s) in data/catalog.db")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# stats_aggregate.py
+# 可合并的统计汇总：generate_stats.py 边写 CSV 边把每条记录累加进 StatsAggregate，
+# 只保存计数、求和与直方图（按玩家 / 全庄 / 番种），内存与记录数无关。
+#
+# 不同进程或机器可以各自统计 data/origin 的一个分片（generate_stats.py --shard K/N），
+# 得到的部分结果直接相加即为全量结果，不必重新读取记录：
+#   python stats_aggregate.py merge data/stats_aggregate.shard*.json --out data/stats_aggregate.json
+#   python stats_aggregate.py report data/stats_aggregate.json [--top N]
+
+import argparse
+import json
+import os
+import zlib
+
+from archive import write_json
+from fan_table import FAN_NAMES, FLOWER_FAN_ID
+
+AGGREGATE_PATH = os.path.join('data', 'stats_aggregate.json')
+
+
+def parse_shard(text):
+    """'K/N' → (K, N)，0 <= K < N。"""
+    try:
+        index, count = (int(x) for x in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 K/N: {text}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片下标越界: {text}")
+    return index, count
+
+
+def in_shard(record_id, shard):
+    # 按 id 的 crc32 分片：与记录顺序、机器无关，同一条记录总落在同一个分片
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(record_id.encode('utf-8')) % count == index
+
+
+def shard_path(path, shard):
+    """在扩展名前加上分片后缀，例如 win_stats_bom.csv → win_stats_bom.shard0of4.csv。"""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard[0]}of{shard[1]}{ext}"
+
+
+def _add_counts(dst, src):
+    for key, value in src.items():
+        if isinstance(value, dict):
+            _add_counts(dst.setdefault(key, {}), value)
+        else:
+            dst[key] = dst.get(key, 0) + value
+
+
+class StatsAggregate:
+    def __init__(self):
+        self.records = 0
+        self.wins = 0
+        # 素番 → 和牌数
+        self.base_fan_hist = {}
+        # 番种 id（字符串，便于 JSON 往返）→ 含该番种的和牌数
+        self.fans = {}
+        # 玩家 → {'wins', 'base_fan', 'total_fan', 'flowers', 'fans': {番种 id: 次数}}
+        self.players = {}
+        # 全庄 id → {'records', 'wins', 'base_fan', 'total_fan'}
+        self.sessions = {}
+
+    def add(self, win_data, session_id=''):
+        """累加一条记录；win_data 为 None 表示荒庄。"""
+        self.records += 1
+        session = self.sessions.setdefault(session_id or '', {'records': 0, 'wins': 0, 'base_fan': 0, 'total_fan': 0})
+        session['records'] += 1
+        if not win_data:
+            return
+        base_fan, total_fan = win_data['base_fan'], win_data['total_fan']
+        self.wins += 1
+        self.base_fan_hist[str(base_fan)] = self.base_fan_hist.get(str(base_fan), 0) + 1
+        session['wins'] += 1
+        session['base_fan'] += base_fan
+        session['total_fan'] += total_fan
+        player = self.players.setdefault(win_data['winner_name'],
+                                         {'wins': 0, 'base_fan': 0, 'total_fan': 0, 'flowers': 0, 'fans': {}})
+        player['wins'] += 1
+        player['base_fan'] += base_fan
+        player['total_fan'] += total_fan
+        player['flowers'] += win_data['flower_count']
+        player_fans = player['fans']
+        for fan_id, count in enumerate(win_data['fan_vector']):
+            if count:
+                key = str(fan_id)
+                self.fans[key] = self.fans.get(key, 0) + 1
+                player_fans[key] = player_fans.get(key, 0) + 1
+
+    def merge(self, other):
+        """把另一个分片的结果加进来；各字段都是计数或求和，合并顺序无关。"""
+        self.records += other.records
+        self.wins += other.wins
+        _add_counts(self.base_fan_hist, other.base_fan_hist)
+        _add_counts(self.fans, other.fans)
+        _add_counts(self.players, other.players)
+        _add_counts(self.sessions, other.sessions)
+        return self
+
+    def to_dict(self):
+        return {'records': self.records, 'wins': self.wins, 'base_fan_hist': self.base_fan_hist,
+                'fans': self.fans, 'players': self.players, 'sessions': self.sessions}
+
+    @classmethod
+    def from_dict(cls, data):
+        agg = cls()
+        agg.records = data.get('records', 0)
+        agg.wins = data.get('wins', 0)
+        agg.base_fan_hist = data.get('base_fan_hist', {})
+        agg.fans = data.get('fans', {})
+        agg.players = data.get('players', {})
+        agg.sessions = data.get('sessions', {})
+        return agg
+
+    def save(self, path=AGGREGATE_PATH):
+        write_json(path, self.to_dict(), indent=None)
+
+    @classmethod
+    def load(cls, path=AGGREGATE_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def print_report(self, top=10):
+        draws = self.records - self.wins
+        print(f"记录 {self.records} 条，和牌 {self.wins} 次，荒庄 {draws} 次，全庄 {len(self.sessions)} 个，"
+              f"和牌玩家 {len(self.players)} 人")
+        if self.wins:
+            total = sum(int(k) * v for k, v in self.base_fan_hist.items())
+            print(f"平均素番 {total / self.wins:.2f}")
+
+        print(f"\n和牌最多的玩家（前 {top}）：")
+        players = sorted(self.players.items(), key=lambda kv: (-kv[1]['wins'], kv[0]))[:top]
+        for name, p in players:
+            fans = sorted(((v, k) for k, v in p['fans'].items() if int(k) != FLOWER_FAN_ID), reverse=True)[:3]
+            fan_str = '、'.join(f"{FAN_NAMES[int(k)]}x{v}" for v, k in fans)
+            print(f"  {name:<16} 和牌 {p['wins']:>5}  平均素番 {p['base_fan'] / p['wins']:6.2f}  "
+                  f"平均花 {p['flowers'] / p['wins']:4.2f}  常见番种: {fan_str}")
+
+        print(f"\n最常见的番种（前 {top}）：")
+        fans = sorted(((v, k) for k, v in self.fans.items() if int(k) != FLOWER_FAN_ID), reverse=True)[:top]
+        for v, k in fans:
+            print(f"  {FAN_NAMES[int(k)]:<10} {v:>6}  ({v / self.wins:.1%})")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='合并与查看统计汇总')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    m = sub.add_parser('merge', help='合并多个分片的汇总')
+    m.add_argument('parts', nargs='+', help='generate_stats.py 写出的汇总 JSON')
+    m.add_argument('--out', default=AGGREGATE_PATH, help=f'合并结果路径（默认 {AGGREGATE_PATH}）')
+    m.add_argument('--top', type=int, default=10, help='报告中列出的条数')
+    r = sub.add_parser('report', help='打印汇总报告')
+    r.add_argument('path', nargs='?', default=AGGREGATE_PATH)
+    r.add_argument('--top', type=int, default=10, help='报告中列出的条数')
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'merge':
+        total = StatsAggregate()
+        for path in args.parts:
+            total.merge(StatsAggregate.load(path))
+        total.save(args.out)
+        print(f"已合并 {len(args.parts)} 个分片 -> {args.out}\n")
+        total.print_report(args.top)
+    else:
+        StatsAggregate.load(args.path).print_report(args.top)
+
+
+if __name__ == '__main__':
+    main()
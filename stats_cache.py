@@ -0,0 +1,125 @@
+# stats_cache.py
+# generate_stats.py 的逐记录结果缓存（data/stats_cache.db）：以 记录id + 存储键（文件大小/mtime，或归档中的段/偏移/长度）为键
+# 缓存 get_win_analysis() 的结果，重新统计时只解析新增或变化的记录。parser.py 源码变化时整个缓存自动失效。
+#
+# 缓存行存放在 SQLite 中、按需逐条读取，内存占用与记录数无关；多个 batch_process 进程（--claim）各自提交短事务，
+# 写入互相合并，不会像整体重写的 JSON 文件那样后写者覆盖先写者。
+
+import hashlib
+import json
+import os
+import sqlite3
+
+CACHE_PATH = os.path.join('data', 'stats_cache.db')
+
+# 影响解析结果的源码文件；任一文件内容变化都会使缓存失效
+_PARSER_SOURCES = ['parser.py', 'hand_model.py', 'fan_table.py']
+
+# store() 每累积这么多条写入提交一次，避免长时间占用写锁
+COMMIT_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS records (
+    record_id TEXT PRIMARY KEY,
+    store_key TEXT NOT NULL,
+    win TEXT
+);
+"""
+
+
+def parser_version():
+    h = hashlib.sha1()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in _PARSER_SOURCES:
+        with open(os.path.join(base_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class StatsCache:
+    def __init__(self, path=CACHE_PATH, rebuild=False):
+        """rebuild=True 时清空已有缓存，全部记录重新解析。"""
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.version = parser_version()
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'parser_version'").fetchone()
+        if rebuild or row is None or row[0] != self.version:
+            self.conn.execute("DELETE FROM records")
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('parser_version', ?)",
+                              (self.version,))
+        self.conn.commit()
+        self._pending = 0
+
+    @staticmethod
+    def exists(path=CACHE_PATH):
+        return os.path.exists(path)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __contains__(self, record_id):
+        return self.conn.execute("SELECT 1 FROM records WHERE record_id = ?", (record_id,)).fetchone() is not None
+
+    def is_fresh(self, record_id, key):
+        """缓存中有该记录且存储键相同。"""
+        row = self.conn.execute("SELECT store_key FROM records WHERE record_id = ?", (record_id,)).fetchone()
+        return row is not None and row[0] == json.dumps(key)
+
+    def lookup(self, record_id, key):
+        """命中时返回 (True, win_data)，win_data 为 None 表示该记录无人和牌。"""
+        row = self.conn.execute("SELECT store_key, win FROM records WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None or row[0] != json.dumps(key):
+            return False, None
+        return True, json.loads(row[1]) if row[1] else None
+
+    def get(self, record_id):
+        """不校验存储键，直接取缓存的 win_data（调用方已用 is_fresh / lookup 确认命中）。"""
+        row = self.conn.execute("SELECT win FROM records WHERE record_id = ?", (record_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def entries(self):
+        """逐条产出 (record_id, key)，按 id 升序。"""
+        for record_id, key in self.conn.execute("SELECT record_id, store_key FROM records ORDER BY record_id"):
+            yield record_id, json.loads(key)
+
+    def store(self, record_id, key, win_data):
+        self.conn.execute("INSERT OR REPLACE INTO records (record_id, store_key, win) VALUES (?, ?, ?)",
+                          (record_id, json.dumps(key),
+                           json.dumps(win_data, ensure_ascii=False) if win_data else None))
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.save()
+
+    def prune(self, record_ids):
+        """删除不在 record_ids 中的记录，返回删除数。"""
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (record_id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany("INSERT OR IGNORE INTO keep (record_id) VALUES (?)", ((rid,) for rid in record_ids))
+            removed = self.conn.execute("DELETE FROM records WHERE record_id NOT IN (SELECT record_id FROM keep)")
+            self.conn.execute("DELETE FROM keep")
+        self._pending = 0
+        return removed.rowcount
+
+    def save(self):
+        """提交尚未提交的写入。"""
+        self.conn.commit()
+        self._pending = 0
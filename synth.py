@@ -0,0 +1,259 @@
+# synth.py
+# 合成牌谱生成器：不依赖 tziakcha.net，生成与线上格式一致的记录 {"script": base64(zlib(json))}，
+# script 含 w（牌墙）/ d（骰子）/ i / t / p / g / y（番种）/ a（动作流）。
+# 动作覆盖补花、吃、碰、明杠、暗杠、加杠、过、放弃鸣牌、自摸与点和，供 benchmark.py 与回归对比使用。
+#
+# 用法：python synth.py [-n N] [--seed S] [--out DIR]   # 默认写入 data/synth/<id>.json
+
+import argparse
+import base64
+import json
+import os
+import random
+import zlib
+
+from archive import DirectoryStore
+from fan_table import FLOWER_FAN_ID
+
+SYNTH_DIR = os.path.join('data', 'synth')
+
+
+def _encode_script(script):
+    raw = json.dumps(script, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(zlib.compress(raw)).decode('ascii')
+
+
+class _Game:
+    def __init__(self, rng):
+        self.rng = rng
+        self.actions = []
+        self.clock = 0
+        self.hands = [[] for _ in range(4)]
+        self.pengs = [[] for _ in range(4)]
+        self.flowers = [0] * 4
+
+    def emit(self, p, a, d):
+        self.clock += self.rng.randint(300, 9000)
+        self.actions.append([(p << 4) | a, d, self.clock])
+
+    def remove_kind(self, p, kind):
+        for t in sorted(self.hands[p]):
+            if t >> 2 == kind:
+                self.hands[p].remove(t)
+                return t
+        raise ValueError(kind)
+
+    def count_kind(self, p, kind):
+        return sum(1 for t in self.hands[p] if t >> 2 == kind)
+
+
+def generate_record(rng=None, title='竹 synthetic'):
+    """生成一条随机对局；庄家固定为 0 号位，与解析器的发牌逻辑一致。"""
+    rng = rng or random.Random()
+    wall_ids = list(range(144))
+    rng.shuffle(wall_ids)
+    dice = [rng.randint(1, 6) for _ in range(4)]
+    d = dice[0] | (dice[1] << 4) | (dice[2] << 8) | (dice[3] << 12)
+
+    dealer = 0
+    wall_break_pos = (dealer - (dice[0] + dice[1] - 1) + 4) % 4
+    start_pos = ((wall_break_pos * 36) + sum(dice) * 2) % 144
+    wall = wall_ids[start_pos:] + wall_ids[:start_pos]
+    front, back = 0, 143
+
+    g = _Game(rng)
+    for _ in range(3):
+        for p in range(4):
+            g.hands[p].extend(wall[front:front + 4])
+            front += 4
+    for p in range(4):
+        g.hands[p].append(wall[front])
+        front += 1
+    g.hands[dealer].append(wall[front])
+    front += 1
+
+    def draw_back():
+        nonlocal back
+        t = wall[back]
+        back -= 1
+        return t
+
+    def replace_flowers(p):
+        while True:
+            flowers = [t for t in g.hands[p] if t >= 136]
+            if not flowers or front > back:
+                return
+            f = flowers[0]
+            repl = draw_back()
+            g.hands[p].remove(f)
+            g.hands[p].append(repl)
+            g.flowers[p] += 1
+            g.emit(p, 1, ((f - 136) << 8) | repl | (0x1000 if rng.random() < 0.5 else 0))
+
+    g.emit(dealer, 0, 0)
+    for p in range(4):
+        replace_flowers(p)
+
+    winner = None
+    self_drawn = False
+    cur = dealer
+    turn = 0
+    while True:
+        turn += 1
+        hand = g.hands[cur]
+        # 自摸（须紧接在摸牌或补花之后）
+        last = g.actions[-1]
+        just_drew = (last[0] >> 4) & 3 == cur and last[0] & 15 in (1, 7)
+        if turn > 8 and just_drew and rng.random() < 0.03:
+            winner, self_drawn = cur, True
+            break
+        # 暗杠 / 加杠
+        kinds = {}
+        for t in hand:
+            if t < 136:
+                kinds[t >> 2] = kinds.get(t >> 2, 0) + 1
+        concealed = [k for k, c in kinds.items() if c == 4 and k != 0]
+        added = [k for k in g.pengs[cur] if kinds.get(k)]
+        if front <= back and (concealed or added) and rng.random() < 0.6:
+            if concealed:
+                k = concealed[0]
+                for _ in range(4):
+                    g.remove_kind(cur, k)
+                g.emit(cur, 5, k)
+            else:
+                k = added[0]
+                g.remove_kind(cur, k)
+                g.pengs[cur].remove(k)
+                g.emit(cur, 5, k | 0x300)
+                if rng.random() < 0.1:
+                    winner = (cur + rng.randint(1, 3)) % 4
+                    break
+            t = draw_back()
+            g.hands[cur].append(t)
+            g.emit(cur, 7, t | 0x100)
+            replace_flowers(cur)
+            continue
+
+        tile = rng.choice([t for t in hand if t < 136])
+        hand.remove(tile)
+        g.emit(cur, 2, tile | (0x100 if rng.random() < 0.5 else 0))
+        kind = tile >> 2
+
+        if turn > 6 and rng.random() < 0.04:
+            winner = (cur + rng.randint(1, 3)) % 4
+            break
+
+        nxt = (cur + 1) % 4
+        called = False
+        for off in (1, 2, 3):
+            q = (cur + off) % 4
+            c = g.count_kind(q, kind)
+            rel = (cur - q) % 4
+            if c == 3 and front <= back and rng.random() < 0.5:
+                for _ in range(3):
+                    g.remove_kind(q, kind)
+                g.emit(q, 5, kind | (rel << 6))
+                t = draw_back()
+                g.hands[q].append(t)
+                g.emit(q, 7, t | 0x100)
+                replace_flowers(q)
+                cur = q
+                called = True
+                break
+            if c >= 2 and rng.random() < 0.5:
+                g.remove_kind(q, kind)
+                g.remove_kind(q, kind)
+                g.pengs[q].append(kind)
+                g.emit(q, 4, kind | (rel << 6))
+                cur = q
+                called = True
+                turn += 1
+                break
+        if called:
+            # 碰/明杠后由鸣牌者继续行动
+            continue
+
+        if kind < 27 and rng.random() < 0.6:
+            pos = kind % 9
+            options = []
+            for mid in (kind - 1, kind, kind + 1):
+                if mid % 9 == 0 or mid % 9 == 8 or mid // 9 != kind // 9:
+                    continue
+                need = [k for k in (mid - 1, mid, mid + 1) if k != kind]
+                if all(g.count_kind(nxt, k) for k in need):
+                    options.append(mid)
+            if options:
+                mid = rng.choice(options)
+                copies = []
+                for k in (mid - 1, mid, mid + 1):
+                    if k == kind:
+                        copies.append(tile & 3)
+                    else:
+                        copies.append(g.remove_kind(nxt, k) & 3)
+                data = mid | (3 << 6) | (copies[0] << 10) | (copies[1] << 12) | (copies[2] << 14)
+                g.emit(nxt, 3, data)
+                cur = nxt
+                continue
+
+        if rng.random() < 0.15:
+            g.emit(nxt, 8, 0)
+        if rng.random() < 0.05:
+            g.emit(nxt, 4, 0)  # 放弃鸣牌，解析器跳过
+
+        if front > back:
+            break
+        t = wall[front]
+        front += 1
+        g.hands[nxt].append(t)
+        g.emit(nxt, 7, t)
+        replace_flowers(nxt)
+        cur = nxt
+
+    y = [{} for _ in range(4)]
+    if winner is not None:
+        fans = {}
+        for fid in rng.sample(range(1, 83), rng.randint(1, 4)):
+            cnt = rng.randint(1, 2)
+            fans[str(fid)] = rng.randint(1, 24) | ((cnt - 1) << 8)
+        if g.flowers[winner]:
+            fans[str(FLOWER_FAN_ID)] = 1 | ((g.flowers[winner] - 1) << 8)
+        base = sum((v & 0xFF) * ((v >> 8) + 1) for k, v in fans.items() if int(k) != FLOWER_FAN_ID)
+        total = base + g.flowers[winner]
+        y[winner] = {'f': total, 't': fans}
+        g.emit(winner, 6, (total << 1) | (1 if rng.random() < 0.3 else 0))
+
+    script = {
+        'w': ''.join(f'{t:02x}' for t in wall_ids),
+        'd': d,
+        'i': rng.randint(0, 15),
+        't': 1700000000000 + rng.randint(0, 10 ** 10),
+        'p': [{'n': f'player{rng.randint(0, 40)}', 's': rng.randint(-100, 100)} for _ in range(4)],
+        'g': {'n': 16, 'l': 8, 'b': 'GB', 'r0': 1, 'r1': 1, 'e': 0, 'bl': 0, 's': 1, 'o': 0,
+              'd': 1, 'z': 0, 'r': 1, 't': title},
+        'y': y,
+        'a': g.actions,
+    }
+    return json.dumps({'script': _encode_script(script)})
+
+
+def generate_records(n, seed=1):
+    """按固定种子生成 n 条记录，返回 [(记录id, 内容)]；同一种子结果完全一致。"""
+    rng = random.Random(seed)
+    return [(f'syn{i:06d}', generate_record(rng)) for i in range(n)]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='生成合成牌谱')
+    ap.add_argument('-n', type=int, default=1000, help='记录条数（默认 1000）')
+    ap.add_argument('--seed', type=int, default=1, help='随机种子（默认 1）')
+    ap.add_argument('--out', default=SYNTH_DIR, help=f'输出目录（默认 {SYNTH_DIR}）')
+    args = ap.parse_args(argv)
+
+    store = DirectoryStore(args.out)
+    for record_id, content in generate_records(args.n, args.seed):
+        store.put(record_id, content)
+    print(f"已生成 {args.n} 条合成记录到 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# test_archive.py
+# RecordArchive：读写、删除标记、半截索引行，以及多个写者（同进程多实例 / 多进程）并发追加。
+
+import multiprocessing
+import os
+
+import archive
+from archive import INDEX_NAME, RecordArchive
+
+
+def test_put_get_and_reopen(tmp_path):
+    store = RecordArchive(str(tmp_path))
+    store.put('a', '{"x": 1}')
+    store.put('b', '中文')
+    store.put('a', '{"x": 2}')
+    store.close()
+
+    store = RecordArchive(str(tmp_path))
+    assert store.ids() == ['a', 'b']
+    assert store.get('a') == '{"x": 2}'
+    assert store.get('b') == '中文'
+    store.close()
+
+
+def test_discard_tombstone(tmp_path):
+    store = RecordArchive(str(tmp_path))
+    store.put('a', 'first')
+    store.put('b', 'other')
+    store.discard('a')
+    assert 'a' not in store
+    store.close()
+
+    store = RecordArchive(str(tmp_path))
+    assert store.ids() == ['b']
+    # 删除后重新写入（重新下载）以新数据为准
+    store.put('a', 'second')
+    store.close()
+    assert RecordArchive(str(tmp_path)).get('a') == 'second'
+
+
+def test_partial_index_line(tmp_path):
+    store = RecordArchive(str(tmp_path))
+    store.put('a', 'aaa')
+    store.close()
+    index = tmp_path / INDEX_NAME
+    with open(index, 'a') as f:
+        f.write('b\t0\t3')
+
+    store = RecordArchive(str(tmp_path))
+    assert store.ids() == ['a']
+    # 写者随后补完这一行，refresh 从中断处重读
+    with open(index, 'a') as f:
+        f.write('\t3\n')
+    with open(store._seg_path(0), 'ab') as f:
+        f.write(b'bbb')
+    store.refresh()
+    assert store.get('b') == 'bbb'
+    store.close()
+
+
+def test_two_writers_same_directory(tmp_path):
+    one = RecordArchive(str(tmp_path))
+    two = RecordArchive(str(tmp_path))
+    for i in range(20):
+        (one if i % 2 else two).put(f'r{i}', f'payload-{i}' * (i + 1))
+    one.close()
+    two.close()
+
+    store = RecordArchive(str(tmp_path))
+    assert len(store) == 20
+    for i in range(20):
+        assert store.get(f'r{i}') == f'payload-{i}' * (i + 1)
+    store.close()
+
+
+def _writer(root, worker):
+    store = RecordArchive(root)
+    for i in range(50):
+        store.put(f'w{worker}-{i}', f'{worker}:{i}:' + 'x' * (i * 7))
+    store.close()
+
+
+def test_concurrent_processes(tmp_path, monkeypatch):
+    # 段文件写满时切到新段，多进程需要在锁内发现彼此切换的段
+    monkeypatch.setattr(archive, 'SEGMENT_SIZE', 4096)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), w)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    store = RecordArchive(str(tmp_path))
+    assert len(store) == 200
+    for w in range(4):
+        for i in range(50):
+            assert store.get(f'w{w}-{i}') == f'{w}:{i}:' + 'x' * (i * 7)
+    assert len(store._segments()) > 1
+    assert all(os.path.getsize(store._seg_path(s)) <= 4096 for s in store._segments())
+    store.close()
@@ -0,0 +1,95 @@
+# test_journal.py
+# 处理日志的续跑 / 版本过滤，以及认领文件（O_EXCL）在多个认领者之间的分配与超时接手。
+
+import os
+import time
+
+from journal import DONE, FAILED, Journal, claim_chunks
+
+
+def test_resume(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    journal = Journal(path)
+    journal.record(DONE, 'a')
+    journal.record(FAILED, 'b', 'boom\nsecond line')
+    journal.close()
+
+    journal = Journal(path)
+    assert journal.is_done('a')
+    assert journal.failed() == ['b']
+    assert journal.pending(['a', 'b', 'c']) == ['b', 'c']
+    assert Journal(path, resume=False).pending(['a', 'b']) == ['a', 'b']
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_version_filter(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    old = Journal(path, version='v1')
+    old.record(DONE, 'a')
+    old.record(FAILED, 'b')
+    old.close()
+    with open(path, 'a') as f:
+        # 加版本列之前写下的行
+        f.write('done\tc\thost-1\t0\t\n')
+
+    assert Journal(path, version='v1').pending(['a', 'b', 'c']) == ['b', 'c']
+    assert Journal(path, version='v2').pending(['a', 'b', 'c']) == ['a', 'b', 'c']
+    assert Journal(path).pending(['a', 'b', 'c']) == ['b']
+
+
+def test_partial_line_and_refresh(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    with open(path, 'w') as f:
+        f.write('done\ta\th\t0\t\n')
+        f.write('done\tb\th')
+    journal = Journal(path)
+    assert journal.pending(['a', 'b']) == ['b']
+
+    with open(path, 'a') as f:
+        f.write('\t0\t\n')
+    other = Journal(path)
+    other.record(FAILED, 'c')
+    other.close()
+    journal.refresh()
+    # 本进程启动后由别的进程处理过的记录（包括失败的）本轮不再重试
+    assert journal.pending(['a', 'b', 'c', 'd']) == ['d']
+
+
+def test_claims_are_exclusive(tmp_path):
+    claims = str(tmp_path / 'claims')
+    ids = [f'r{i}' for i in range(10)]
+    first = Journal(str(tmp_path / 'journal.log'))
+    second = Journal(str(tmp_path / 'journal.log'))
+    a = claim_chunks(ids, first, chunk_size=4, claims_dir=claims)
+    b = claim_chunks(ids, second, chunk_size=4, claims_dir=claims)
+
+    claim_a, todo_a = next(a)
+    claim_b, todo_b = next(b)
+    assert todo_a == ids[:4] and todo_b == ids[4:8]
+    for rid in todo_a:
+        first.record(DONE, rid)
+    claim_a.release()
+
+    claim_b2, todo_b2 = next(b)
+    assert todo_b2 == ids[8:]
+    # a 释放的块已处理完，b 还持有第二块，a 没有可认领的了
+    assert list(a) == []
+    claim_b.release()
+    claim_b2.release()
+
+
+def test_stale_claim_is_taken_over(tmp_path):
+    claims = str(tmp_path / 'claims')
+    ids = ['a', 'b']
+    first = Journal(str(tmp_path / 'journal.log'))
+    claim, todo = next(claim_chunks(ids, first, claims_dir=claims))
+    assert todo == ids
+
+    second = Journal(str(tmp_path / 'journal.log'))
+    assert list(claim_chunks(ids, second, ttl=60, claims_dir=claims)) == []
+    past = time.time() - 120
+    os.utime(claim.path, (past, past))
+    taken = list(claim_chunks(ids, second, ttl=60, claims_dir=claims))
+    assert [todo for _, todo in taken] == [ids]
+    assert os.listdir(claims) == [os.path.basename(claim.path)]
@@ -0,0 +1,68 @@
+# test_parser_seek.py
+# 检查点随机访问（seek / step）与从头逐个应用动作得到的局面对照，记录由 synth.py 按固定种子生成。
+
+import random
+
+import pytest
+
+from hand_model import CountHand, ListHand
+from parser import MahjongRecordParser
+from synth import generate_records
+
+RECORDS = generate_records(12, seed=7)
+
+
+def state(parser):
+    snap = parser._snapshot()
+    return ([sorted(h) for h in snap[0]],) + snap[1:]
+
+
+def replay_to(content, index, hand_model):
+    parser = MahjongRecordParser(content, hand_model=hand_model)
+    parser._setup_wall_and_deal()
+    acts = parser.actions
+    for i in range(index):
+        parser._apply_action(acts.p[i], acts.a[i], acts.d[i])
+    return state(parser)
+
+
+@pytest.mark.parametrize('hand_model', [CountHand, ListHand])
+@pytest.mark.parametrize('interval', [1, 5, 16])
+def test_seek_matches_replay(hand_model, interval):
+    rng = random.Random(interval)
+    for record_id, content in RECORDS:
+        parser = MahjongRecordParser(content, hand_model=hand_model)
+        parser.build_checkpoints(interval)
+        end = parser.end_position
+        expected = [replay_to(content, k, hand_model) for k in range(end + 1)]
+        assert state(parser) == expected[end], record_id
+        # 随机来回跳转：既有同一检查点内的向前重放，也有回到更早的检查点
+        for k in [rng.randint(0, end) for _ in range(30)] + [end, 0]:
+            assert parser.seek(k) == k
+            assert state(parser) == expected[k], (record_id, k)
+
+
+def test_step_and_clamp():
+    record_id, content = RECORDS[0]
+    parser = MahjongRecordParser(content)
+    parser.build_checkpoints(4)
+    end = parser.end_position
+    parser.seek(0)
+    for k in range(1, end + 1):
+        assert parser.step() == k
+        assert state(parser) == replay_to(content, k, CountHand)
+    assert parser.step(-3) == end - 3
+    assert state(parser) == replay_to(content, end - 3, CountHand)
+    assert parser.seek(end + 100) == end
+    assert parser.seek(-5) == 0
+
+
+def test_seek_end_matches_run_analysis():
+    for record_id, content in RECORDS:
+        parser = MahjongRecordParser(content)
+        parser.run_analysis()
+        expected = (state(parser), parser.get_win_analysis())
+        parser.build_checkpoints(8)
+        parser.seek(0)
+        parser.seek(parser.end_position)
+        assert (state(parser), parser.get_win_analysis()) == expected, record_id
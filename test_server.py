@@ -0,0 +1,70 @@
+# test_server.py
+# 查询服务：记录 id 校验（不得拼出 data/origin 之外的路径）与一次完整的 HTTP 往返。
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import archive
+from server import BadRequest, NotFound, RecordCache, make_server
+from synth import generate_records
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(archive, '_shared_store', None)
+    origin = tmp_path / 'data' / 'origin'
+    origin.mkdir(parents=True)
+    records = generate_records(2, seed=3)
+    for record_id, content in records:
+        (origin / f'{record_id}.json').write_text(content, encoding='utf-8')
+    (tmp_path / 'secret.json').write_text('{}', encoding='utf-8')
+    return records
+
+
+@pytest.mark.parametrize('record_id', ['../secret', '..', 'a/b', 'syn000000.json', '', 'a b', 'ａ1'])
+def test_invalid_ids_rejected(data_dir, record_id):
+    with pytest.raises(BadRequest):
+        RecordCache().get(record_id)
+
+
+def test_missing_record(data_dir):
+    with pytest.raises(NotFound):
+        RecordCache().get('nope123')
+
+
+@pytest.fixture
+def base_url(data_dir):
+    server = make_server(RecordCache(maxsize=1), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_roundtrip(data_dir, base_url):
+    record_id = data_dir[0][0]
+    status, summary = _get(f'{base_url}/record/{record_id}')
+    assert status == 200 and summary['id'] == record_id
+    status, state = _get(f'{base_url}/record/{record_id}/state?k=5')
+    assert status == 200 and state['position'] == 5
+    assert _get(f'{base_url}/record/{record_id}/state?k=x')[0] == 400
+    assert _get(f'{base_url}/record/..%2Fsecret')[0] == 400
+    assert _get(f'{base_url}/record/missing1')[0] == 404
+    # maxsize=1：换一条记录会淘汰前一条
+    assert _get(f'{base_url}/record/{data_dir[1][0]}')[0] == 200
+    status, stats = _get(f'{base_url}/stats')
+    assert stats['evictions'] == 1 and stats['size'] == 1
@@ -0,0 +1,182 @@
+# test_shanten.py
+# 向听数 / 有效牌与暴力搜索对照：和牌判定按定义逐一拆分，听牌与一向听由“摸一张、打一张”穷举得到。
+
+import random
+from functools import lru_cache
+
+import pytest
+
+from shanten import KIND_COUNT, _KNITTED, _TERMINALS_HONORS, effective_tiles, shanten
+
+HONORS = tuple(range(27, 34))
+
+
+@lru_cache(maxsize=None)
+def _sets_only(counts):
+    """counts 能否完全拆成刻子与顺子。"""
+    i = next((k for k, c in enumerate(counts) if c), None)
+    if i is None:
+        return True
+    c = list(counts)
+    if c[i] >= 3:
+        c[i] -= 3
+        if _sets_only(tuple(c)):
+            return True
+        c[i] += 3
+    if i < 27 and i % 9 <= 6 and c[i + 1] and c[i + 2]:
+        c[i] -= 1
+        c[i + 1] -= 1
+        c[i + 2] -= 1
+        if _sets_only(tuple(c)):
+            return True
+    return False
+
+
+def _regular(counts):
+    for k in range(KIND_COUNT):
+        if counts[k] >= 2:
+            c = list(counts)
+            c[k] -= 2
+            if _sets_only(tuple(c)):
+                return True
+    return False
+
+
+@lru_cache(maxsize=None)
+def is_complete(counts, melds=0):
+    """14 - 3 * melds 张手牌是否和牌（一般型、七对、十三幺、全不靠、组合龙）。"""
+    if _regular(counts):
+        return True
+    if melds == 0:
+        if all(c % 2 == 0 for c in counts):
+            return True
+        if all(counts[k] for k in _TERMINALS_HONORS) and \
+                all(c == 0 for k, c in enumerate(counts) if k not in _TERMINALS_HONORS):
+            return True
+        if max(counts) == 1 and any(all(k in pattern or k in HONORS for k, c in enumerate(counts) if c)
+                                    for pattern in _KNITTED):
+            return True
+    if melds <= 1:
+        for pattern in _KNITTED:
+            if all(counts[k] for k in pattern):
+                c = list(counts)
+                for k in pattern:
+                    c[k] -= 1
+                if _regular(tuple(c)):
+                    return True
+    return False
+
+
+def _add(counts, k, n=1):
+    c = list(counts)
+    c[k] += n
+    return tuple(c)
+
+
+def brute_waits(counts, melds=0):
+    # 与 shanten.py 一样不排除“第 5 张”
+    return {k for k in range(KIND_COUNT) if is_complete(_add(counts, k), melds)}
+
+
+def brute_shanten_upto1(counts, melds=0):
+    """3n+1 张手牌的向听数，大于 1 时返回 2。"""
+    if brute_waits(counts, melds):
+        return 0
+    for draw in range(KIND_COUNT):
+        after = _add(counts, draw)
+        for discard in range(KIND_COUNT):
+            if after[discard] and discard != draw and brute_waits(_add(after, discard, -1), melds):
+                return 1
+    return 2
+
+
+def _random_complete(rng, melds=0):
+    """随机的和牌（一般型为主，偶尔是特殊型），每种牌不超过 4 张。"""
+    while True:
+        c = [0] * KIND_COUNT
+        form = rng.random() if melds == 0 else 1.0
+        if form < 0.1:
+            for k in rng.sample(range(KIND_COUNT), 7):
+                c[k] = 2
+        elif form < 0.15:
+            for k in _TERMINALS_HONORS:
+                c[k] = 1
+            c[rng.choice(_TERMINALS_HONORS)] += 1
+        elif form < 0.2:
+            pattern = rng.choice(_KNITTED)
+            for k in rng.sample(pattern + HONORS, 14):
+                c[k] = 1
+        else:
+            for _ in range(4 - melds):
+                if rng.random() < 0.6:
+                    k = rng.choice([k for k in range(27) if k % 9 <= 6])
+                    for j in (k, k + 1, k + 2):
+                        c[j] += 1
+                else:
+                    c[rng.randrange(KIND_COUNT)] += 3
+            c[rng.randrange(KIND_COUNT)] += 2
+        if max(c) <= 4:
+            return tuple(c)
+
+
+def _perturb(rng, counts, swaps):
+    c = list(counts)
+    for _ in range(swaps):
+        out = rng.choice([k for k in range(KIND_COUNT) if c[k]])
+        c[out] -= 1
+        c[rng.choice([k for k in range(KIND_COUNT) if c[k] < 4])] += 1
+    return tuple(c)
+
+
+def _drop_one(rng, counts):
+    c = list(counts)
+    c[rng.choice([k for k in range(KIND_COUNT) if c[k]])] -= 1
+    return tuple(c)
+
+
+@pytest.mark.parametrize('melds', [0, 1, 2])
+def test_complete_hands(melds):
+    rng = random.Random(1 + melds)
+    for _ in range(300):
+        hand = _random_complete(rng, melds)
+        assert shanten(hand, melds) == -1
+        near = _perturb(rng, hand, 1)
+        assert (shanten(near, melds) == -1) == is_complete(near, melds), near
+
+
+@pytest.mark.parametrize('melds', [0, 1])
+def test_near_tenpai_hands(melds):
+    rng = random.Random(10 + melds)
+    for _ in range(60):
+        hand = _drop_one(rng, _perturb(rng, _random_complete(rng, melds), rng.randrange(3)))
+        assert min(shanten(hand, melds), 2) == brute_shanten_upto1(hand, melds), hand
+
+
+def test_random_hands():
+    rng = random.Random(20)
+    wall = [k for k in range(KIND_COUNT) for _ in range(4)]
+    for _ in range(15):
+        c = [0] * KIND_COUNT
+        for k in rng.sample(wall, 13):
+            c[k] += 1
+        hand = tuple(c)
+        assert min(shanten(hand), 2) == brute_shanten_upto1(hand), hand
+
+
+def test_effective_tiles_of_tenpai_are_waits():
+    rng = random.Random(30)
+    for _ in range(200):
+        hand = _drop_one(rng, _random_complete(rng))
+        value, kinds = effective_tiles(hand)
+        assert value == 0
+        assert set(kinds) == {k for k in brute_waits(hand) if hand[k] < 4}, hand
+
+
+def test_effective_tiles_reduce_shanten():
+    rng = random.Random(40)
+    for _ in range(100):
+        hand = _drop_one(rng, _perturb(rng, _random_complete(rng), rng.randrange(1, 4)))
+        value, kinds = effective_tiles(hand)
+        assert value == shanten(hand)
+        expected = {k for k in range(KIND_COUNT) if hand[k] < 4 and shanten(_add(hand, k)) < value}
+        assert set(kinds) == expected, hand
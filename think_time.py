@@ -0,0 +1,294 @@
+# think_time.py
+# 思考时间统计（需要 numpy）：每个动作带毫秒时间戳 t，动作与上一动作的时间差即动作者的用时；
+# 对舍牌的应答（吃碰杠 / 和 / 过）各家同时思考，一律从所应答的那次舍牌算起。
+# 只解码动作流、不复盘牌面，按块并行提取 (玩家, 动作类型, 用时) 数组，在父进程中用 bincount 一次性累加成
+# 每个 玩家 × 动作类型 的对数直方图（每倍程 8 格，约 9% 精度），由直方图给出分位数（限制在该格实际的最短 / 最长用时之内），
+# 内存与记录数无关。
+#
+# 不计入的动作：开始出牌、摸牌（系统自动）、自动补花 / 自动和，以及未生效的鸣牌（数据为 0）；和牌之后的动作也不计。
+# 慢动作：用时不少于 --outlier-ms，且不少于该玩家同类动作中位数的 --outlier-factor 倍。
+#
+# 用法：
+#   python think_time.py [--workers N] [--limit N] [--csv think_time_bom.csv] [--outliers PATH] [--npz PATH] [--top 20]
+
+import argparse
+import csv
+import time
+
+import numpy as np
+
+CSV_PATH = 'think_time_bom.csv'
+
+# 动作类型 → 名称（同 tracer.describe）；不在表中的类型不统计
+ACTION_NAMES = {1: '补花', 2: '出牌', 3: '吃', 4: '碰', 5: '杠', 6: '和', 8: '过', 9: '弃'}
+_TYPE_CODES = sorted(ACTION_NAMES)
+N_TYPES = len(_TYPE_CODES)
+# a_type → 统计用的类型下标，-1 表示不统计
+_TYPE_INDEX = np.full(16, -1, dtype=np.int8)
+_TYPE_INDEX[_TYPE_CODES] = np.arange(N_TYPES)
+
+# 对数直方图：第 b 格为 [2^(b/8), 2^((b+1)/8)) 毫秒，第 0 格包含 0~1ms，最后一格包含更长的用时
+BINS_PER_OCTAVE = 8
+N_BINS = 21 * BINS_PER_OCTAVE
+
+CHUNK_SIZE = 256
+
+
+def _bin(dt):
+    return np.minimum((np.log2(np.maximum(dt, 1)) * BINS_PER_OCTAVE).astype(np.int64), N_BINS - 1)
+
+
+def _bin_value(b):
+    # 格内的几何中点
+    return 2 ** ((b + 0.5) / BINS_PER_OCTAVE)
+
+
+def record_timings(acts):
+    """ActionStream → (动作下标, 座位, 类型下标, 用时毫秒) 四个数组，只含统计范围内的动作。"""
+    p = np.frombuffer(acts.p, dtype=np.uint8)
+    a = np.frombuffer(acts.a, dtype=np.uint8)
+    d = np.frombuffer(acts.d, dtype=np.int32)
+    t = np.frombuffer(acts.t, dtype=np.int64)
+    dt = np.diff(t, prepend=0)
+    # 应答窗口：舍牌打开，摸牌或生效的吃碰杠关闭；窗口内非舍牌者的吃碰杠 / 和 / 过从舍牌时刻计时
+    positions = np.arange(len(a))
+    opened = np.maximum.accumulate(np.where(a == 2, positions, -1)) if len(a) else positions
+    closes = (a == 7) | (((a == 3) | (a == 4) | (a == 5)) & (d != 0))
+    closed = np.maximum.accumulate(np.where(closes, positions, -1)) if len(a) else positions
+    closed_before = np.concatenate([[-1], closed[:-1]]) if len(a) else closed
+    response = (((a >= 3) & (a <= 6)) | (a == 8)) & (opened > closed_before)
+    response &= p != p[np.maximum(opened, 0)]
+    dt[response] = t[response] - t[opened[response]]
+    types = _TYPE_INDEX[a & 15]
+    keep = types >= 0
+    keep &= ~((a == 1) & (d & 0x1000 != 0))
+    keep &= ~((a == 6) & (d & 1 != 0))
+    keep &= ~(((a == 3) | (a == 4) | (a == 5) | (a == 6)) & (d == 0))
+    # 与 run_analysis 一致，复盘在第一次和牌处结束
+    wins = np.flatnonzero((a == 6) & (d != 0))
+    if len(wins):
+        keep[wins[0] + 1:] = False
+    index = np.flatnonzero(keep)
+    return index.astype(np.int32), p[index].astype(np.int8), types[index], dt[index].astype(np.int64)
+
+
+def extract_chunk(record_ids):
+    """进程池任务：一块记录的 (玩家名 [n, 4], 记录下标, 动作下标, 座位, 类型, 用时, 错误列表)。
+
+    names 与 record_ids 一一对应（空记录与出错的记录玩家名为空），记录下标相对本块。
+    """
+    import json
+    from parser import ActionStream, _parse_script
+    from archive import shared_origin_store
+    store = shared_origin_store()
+    acts = ActionStream()
+    names, parts, errors = [], [], []
+    for i, record_id in enumerate(record_ids):
+        names.append(['', '', '', ''])
+        try:
+            content = store.get(record_id)
+            if not content.strip():
+                continue
+            script = _parse_script(json.loads(content)['script'])
+            acts.load(script.get('a', []))
+            players = [p.get('n', '') for p in script.get('p', [])]
+            index, seat, types, dt = record_timings(acts)
+        except Exception as e:
+            errors.append((record_id, str(e)))
+            continue
+        names[i] = (players + [''] * 4)[:4]
+        parts.append((np.full(len(index), i, dtype=np.int32), index, seat, types, dt))
+    if parts:
+        columns = [np.concatenate(col) for col in zip(*parts)]
+    else:
+        columns = [np.zeros(0, dtype=dtype) for dtype in (np.int32, np.int32, np.int8, np.int8, np.int64)]
+    return (names, *columns, errors)
+
+
+class ThinkTimeStats:
+    """玩家 × 动作类型 的对数直方图、用时总和与最小 / 最大值；可逐块累加。"""
+
+    def __init__(self, outlier_ms=10000):
+        self.players = []
+        self._codes = {}
+        self.hist = np.zeros((0, N_TYPES, N_BINS), dtype=np.int64)
+        self.total = np.zeros((0, N_TYPES), dtype=np.float64)
+        self.min = np.zeros((0, N_TYPES), dtype=np.int64)
+        self.max = np.zeros((0, N_TYPES), dtype=np.int64)
+        # 只保存慢动作候选所在记录的 id，不随记录总数增长
+        self.record_ids = []
+        self.n_records = 0
+        self.outlier_ms = outlier_ms
+        # 慢动作候选：用时不少于 outlier_ms 的动作（record_ids 下标, 动作下标, 玩家, 类型, 用时）
+        self._candidates = []
+
+    def _player_codes(self, names):
+        codes = np.array([[self._codes.setdefault(n, len(self._codes)) for n in row] for row in names],
+                         dtype=np.int64).reshape(len(names), 4)
+        grow = len(self._codes) - self.hist.shape[0]
+        if grow > 0:
+            self.players.extend(list(self._codes)[len(self.players):])
+            self.hist = np.concatenate([self.hist, np.zeros((grow, N_TYPES, N_BINS), dtype=np.int64)])
+            self.total = np.concatenate([self.total, np.zeros((grow, N_TYPES))])
+            self.min = np.concatenate([self.min, np.full((grow, N_TYPES), np.iinfo(np.int64).max)])
+            self.max = np.concatenate([self.max, np.zeros((grow, N_TYPES), dtype=np.int64)])
+        return codes
+
+    def add_chunk(self, record_ids, names, rec, index, seat, types, dt):
+        """累加 extract_chunk 的结果，返回每个动作的玩家编码（下标对应 self.players）。"""
+        self.n_records += len(record_ids)
+        player = self._player_codes(names)[rec, seat]
+        if not len(dt):
+            return player
+        group = player * N_TYPES + types
+        n_groups = self.hist.shape[0] * N_TYPES
+        self.hist.reshape(-1)[:] += np.bincount(group * N_BINS + _bin(dt), minlength=n_groups * N_BINS)
+        self.total.reshape(-1)[:] += np.bincount(group, weights=dt, minlength=n_groups)
+        np.minimum.at(self.min.reshape(-1), group, dt)
+        np.maximum.at(self.max.reshape(-1), group, dt)
+        slow = dt >= self.outlier_ms
+        if slow.any():
+            slow_recs, rec_no = np.unique(rec[slow], return_inverse=True)
+            rec_no += len(self.record_ids)
+            self.record_ids.extend(record_ids[r] for r in slow_recs)
+            self._candidates.append(np.column_stack([rec_no, index[slow], player[slow], types[slow],
+                                                     dt[slow]]).astype(np.int64))
+        return player
+
+    def counts(self):
+        return self.hist.sum(axis=2)
+
+    def percentiles(self, qs=(0.5, 0.9, 0.99), hist=None, lo=None, hi=None):
+        """由直方图估计分位数（毫秒），返回形状 hist.shape[:-1] + (len(qs),)。
+
+        格内取几何中点，再限制在 [lo, hi]（各格实际的最短 / 最长用时，默认取 self.min / self.max）之内。
+        """
+        if hist is None:
+            hist, lo, hi = self.hist, self.min, self.max
+        cum = np.cumsum(hist, axis=-1)
+        n = cum[..., -1:]
+        out = []
+        for q in qs:
+            target = np.maximum(np.ceil(q * n), 1)
+            b = np.minimum((cum < target).sum(axis=-1), N_BINS - 1)
+            value = _bin_value(b)
+            if lo is not None:
+                value = np.clip(value, lo, hi)
+            out.append(np.where(n[..., 0] > 0, value, 0.0))
+        return np.stack(out, axis=-1)
+
+    def outliers(self, factor=5.0):
+        """慢动作：用时 >= outlier_ms 且 >= 该玩家同类动作中位数 × factor，按用时降序。返回 (n, 5) 数组。"""
+        if not self._candidates:
+            return np.zeros((0, 5), dtype=np.int64)
+        rows = np.concatenate(self._candidates)
+        median = self.percentiles((0.5,))[..., 0]
+        slow = rows[:, 4] >= factor * median[rows[:, 2], rows[:, 3]]
+        rows = rows[slow]
+        return rows[np.argsort(-rows[:, 4], kind='stable')]
+
+    def summary_rows(self):
+        """[(玩家, 动作, 次数, 平均, p50, p90, p99, 最大)]；玩家为“(全部)”的行是所有玩家合计。"""
+        counts = self.counts()
+        pct = self.percentiles()
+        rows = []
+        all_hist = self.hist.sum(axis=0)
+        all_counts = all_hist.sum(axis=1)
+        all_total = self.total.sum(axis=0)
+        all_min = self.min.min(axis=0) if len(self.players) else np.zeros(N_TYPES, dtype=np.int64)
+        all_max = self.max.max(axis=0) if len(self.players) else np.zeros(N_TYPES, dtype=np.int64)
+        all_pct = self.percentiles(hist=all_hist, lo=all_min, hi=all_max)
+        for k, code in enumerate(_TYPE_CODES):
+            if all_counts[k]:
+                rows.append(('(全部)', ACTION_NAMES[code], int(all_counts[k]), all_total[k] / all_counts[k],
+                             *all_pct[k], int(all_max[k])))
+        for i, name in enumerate(self.players):
+            for k, code in enumerate(_TYPE_CODES):
+                if counts[i, k]:
+                    rows.append((name, ACTION_NAMES[code], int(counts[i, k]), self.total[i, k] / counts[i, k],
+                                 *pct[i, k], int(self.max[i, k])))
+        return rows
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def main(argv=None):
+    from archive import shared_origin_store
+    from workers import map_ordered
+
+    ap = argparse.ArgumentParser(description='按动作时间戳统计思考时间')
+    ap.add_argument('--workers', type=int, default=1, help='并行进程数（默认 1）')
+    ap.add_argument('--limit', type=int, default=None, help='最多处理 N 条记录')
+    ap.add_argument('--csv', default=CSV_PATH, help=f'玩家 × 动作 的用时分布（默认 {CSV_PATH}）')
+    ap.add_argument('--outliers', default=None, help='把慢动作明细写成 CSV')
+    ap.add_argument('--npz', default=None, help='另存逐动作的用时数组（记录下标 / 动作下标 / 玩家 / 类型 / 用时）')
+    ap.add_argument('--outlier-ms', type=int, default=10000, help='慢动作的最短用时（毫秒，默认 10000）')
+    ap.add_argument('--outlier-factor', type=float, default=5.0, help='慢动作相对玩家同类动作中位数的倍数（默认 5）')
+    ap.add_argument('--top', type=int, default=20, help='打印的慢动作条数（默认 20）')
+    args = ap.parse_args(argv)
+
+    record_ids = shared_origin_store().ids()[:args.limit]
+    stats = ThinkTimeStats(args.outlier_ms)
+    raw = [] if args.npz else None
+    # 逐动作数组引用全部记录，只有 --npz 时才保存完整的 id 列表
+    raw_ids = [] if args.npz else None
+    errors = 0
+    start = time.perf_counter()
+    chunks = _chunks(record_ids, CHUNK_SIZE)
+    for ids, (names, rec, index, seat, types, dt, chunk_errors) in zip(
+            chunks, map_ordered(extract_chunk, chunks, workers=args.workers, chunksize=1)):
+        for record_id, error in chunk_errors:
+            errors += 1
+            print(f"Error processing record {record_id}: {error}")
+        player = stats.add_chunk(ids, names, rec, index, seat, types, dt)
+        if raw is not None:
+            if len(dt):
+                raw.append((rec + len(raw_ids), index, player, types, dt))
+            raw_ids.extend(ids)
+    elapsed = time.perf_counter() - start
+
+    rows = stats.summary_rows()
+    n_actions = int(stats.counts().sum())
+    print(f"记录 {len(record_ids) - errors} 条，动作 {n_actions} 个，玩家 {len(stats.players)} 人，用时 {elapsed:.2f}s"
+          f"（{(len(record_ids) - errors) / elapsed if elapsed else 0:.0f} 条/秒）")
+    print(f"\n{'动作':<4} {'次数':>9} {'平均':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'最大':>9}  (ms)")
+    for name, action, count, mean, p50, p90, p99, longest in rows:
+        if name == '(全部)':
+            print(f"{action:<4} {count:>9} {mean:>8.0f} {p50:>8.0f} {p90:>8.0f} {p99:>8.0f} {longest:>9}")
+
+    with open(args.csv, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['玩家', '动作', '次数', '平均用时ms', 'p50ms', 'p90ms', 'p99ms', '最长ms'])
+        writer.writerows((name, action, count, round(mean), round(p50), round(p90), round(p99), longest)
+                         for name, action, count, mean, p50, p90, p99, longest in rows)
+    print(f"\n用时分布已写入 {args.csv}")
+
+    outliers = stats.outliers(args.outlier_factor)
+    median = stats.percentiles((0.5,))[..., 0]
+    print(f"\n慢动作 {len(outliers)} 个（>= {args.outlier_ms}ms 且 >= 同类中位数 x{args.outlier_factor:g}），最慢的 {args.top} 个：")
+    for rec, index, player, k, dt in outliers[:args.top]:
+        print(f"  {stats.players[player]:<16} {ACTION_NAMES[_TYPE_CODES[k]]:<3} {dt / 1000:8.1f}s"
+              f"（中位数 {median[player, k] / 1000:.1f}s）  https://tziakcha.net/record/?id={stats.record_ids[rec]} #{index}")
+    if args.outliers:
+        with open(args.outliers, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['玩家', '动作', '用时ms', '同类中位数ms', '动作下标', '对局链接'])
+            for rec, index, player, k, dt in outliers:
+                writer.writerow([stats.players[player], ACTION_NAMES[_TYPE_CODES[k]], int(dt),
+                                 round(median[player, k]), int(index),
+                                 f"https://tziakcha.net/record/?id={stats.record_ids[rec]}"])
+        print(f"慢动作明细已写入 {args.outliers}")
+
+    if args.npz:
+        columns = [np.concatenate(col) for col in zip(*raw)] if raw else [np.zeros(0, dtype=np.int64)] * 5
+        np.savez(args.npz, record_ids=np.array(raw_ids, dtype=str), players=np.array(stats.players, dtype=str),
+                 action_names=np.array([ACTION_NAMES[c] for c in _TYPE_CODES], dtype=str),
+                 record=columns[0].astype(np.int32), action_index=columns[1].astype(np.int32),
+                 player=columns[2].astype(np.int32), action=columns[3].astype(np.int8), ms=columns[4].astype(np.int64))
+        print(f"逐动作用时已写入 {args.npz}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# tracer.py
+# 复盘过程的人类可读日志。MahjongRecordParser.run_analysis(trace=True) 时才会加载本模块，
+# 无头模式（默认）下不做任何字符串格式化。
+
+import sys
+from datetime import datetime, timezone, timedelta
+
+from fan_table import FAN_NAMES, FLOWER_FAN_ID
+
+
+class ReplayTracer:
+    def __init__(self, parser, out=None):
+        self.parser = parser
+        self.out = out
+        self.prev_time = 0
+
+    def _print(self, *args):
+        print(*args, file=self.out or sys.stdout)
+
+    def _player(self, p_idx):
+        return f"{self.parser.WIND[p_idx]}家 {self.parser.script_data['p'][p_idx]['n']}"
+
+    def _hand_line(self, p_idx):
+        parser = self.parser
+        hand_str = ' '.join([parser.get_tile_str(t) for t in sorted(parser.hands[p_idx])])
+        packs_str = ' '.join([f"[{''.join(p)}]" for p in parser.packs_output[p_idx]])
+        return f"{self._player(p_idx)}: {hand_str}  {packs_str}"
+
+    def on_start(self):
+        parser = self.parser
+        g = parser.script_data['g']
+        p_info = parser.script_data['p']
+        self._print(
+            f"配置：{g['n']}盘 | {g['l']}番 ({g['b']}) | {g['r0']}/{g['r1']}+{g['e']} | "
+            f"天地人和 {'✓' if g['bl'] else '✕'} | 战术鸣牌 {'✓' if g['s'] else '✕'} | "
+            f"手牌 {'✓' if g['o'] else '✕'} | 错和 鸣牌 {'✓' if g['d'] else '✕'} "
+            f"{'-30/+10' if g['z'] else '-40/+0'} | {'随机座位' if g['r'] else '固定座位'}"
+        )
+
+        start_time_unix = parser.script_data['t'] / 1000
+        end_time_unix = start_time_unix + (parser.actions.t[-1] / 1000 if parser.actions else 0)
+        tz = timezone(timedelta(hours=8))
+        self._print(f"开始时间：{datetime.fromtimestamp(start_time_unix, tz).strftime('%Y-%m-%d %H:%M:%S UTC%z')}")
+        self._print(f"结束时间：{datetime.fromtimestamp(end_time_unix, tz).strftime('%Y-%m-%d %H:%M:%S UTC%z')}")
+
+        self._print("\n--- 玩家信息 ---")
+        for i in range(4):
+            self._print(f"{parser.WIND[i]}家: {p_info[i]['n']} (分数: {p_info[i]['s']})")
+
+        self._print("\n--- 初始配牌 ---")
+        for i in range(4):
+            self._print(f"{self._player(i)}:\t {' '.join(parser.initial_hands[i])}")
+
+        self._print("\n--- 对局过程 ---")
+
+    def describe(self, p_idx, a_type, data):
+        """单个动作的文字描述；须在该动作被解析器应用之后调用。"""
+        get = self.parser.get_tile_str
+        lo_byte, hi_byte = data & 0xFF, (data >> 8) & 0xFF
+        if a_type == 0:
+            return "开始出牌"
+        if a_type == 1:
+            ot = (hi_byte & 15) + 136
+            return f"{'自动' if data & 0x1000 else '手动'}补花 {get(ot)}->{get(lo_byte)}"
+        if a_type == 2:
+            return f"{'手打' if hi_byte & 1 else '摸打'} {get(lo_byte)}"
+        if a_type == 3:
+            return f"吃 {get(self.parser.last_discard_info['tile'])}"
+        tile_val = (data & 0x3F) << 2
+        if a_type == 4:
+            return f"碰 {get(tile_val)}"
+        if a_type == 5:
+            return f"{'加杠' if (data & 0x0300) == 0x0300 else '杠'} {get(tile_val)}"
+        if a_type == 6:
+            fan = data >> 1
+            return f"{'自动' if data & 1 else '手动'}和 {f'{fan}番' if fan > 0 else ''}"
+        if a_type == 7:
+            return f"{'摸牌' if not hi_byte else '逆向摸牌'} {get(lo_byte)}"
+        if a_type == 8:
+            return "过"
+        if a_type == 9:
+            return "弃"
+        return ""
+
+    def on_action(self, index, p_idx, a_type, data, time):
+        time_str = f"[{((time - self.prev_time) / 1000.0):.3f}s]"
+        self._print(f"{self._player(p_idx)} {self.describe(p_idx, a_type, data)} {time_str}")
+        self._print(self._hand_line(p_idx))
+        self.prev_time = time
+
+    def on_skipped(self, index, p_idx, a_type, data, time):
+        pass
+
+    def on_finish(self):
+        parser = self.parser
+        self._print("\n--- 最终结果 ---")
+        if not parser.win_info:
+            self._print("对局为荒庄")
+        else:
+            self.print_fan_info()
+
+        self._print("\n--- 各家舍牌 ---")
+        for i in range(4):
+            self._print(f"{self._player(i)}: {' '.join([parser.get_tile_str(t) for t in parser.discards[i]])}")
+
+        self._print("\n--- 最终手牌 ---")
+        for i in range(4):
+            self._print(self._hand_line(i))
+
+    def print_state(self):
+        """打印当前局面（seek/step 之后使用）：刚应用的动作、各家手牌与舍牌。"""
+        parser = self.parser
+        index = parser.position or 0
+        self._print(f"\n--- 第 {index}/{parser.end_position} 个动作后 ---")
+        if index > 0:
+            acts = parser.actions
+            i = index - 1
+            self._print(f"上一动作: {self._player(acts.p[i])} {self.describe(acts.p[i], acts.a[i], acts.d[i])}")
+        for i in range(4):
+            self._print(self._hand_line(i))
+            self._print(f"  舍牌: {' '.join([parser.get_tile_str(t) for t in parser.discards[i]])}")
+
+    def print_fan_info(self):
+        parser = self.parser
+        w_idx = parser.win_info['winner']
+        win_data = parser.script_data['y'][w_idx]
+        # 兼容缺失字段的牌谱：有些记录可能没有 f/t 字段
+        total_fan = win_data.get('f') if isinstance(win_data, dict) else None
+        fan_details = win_data.get('t', {}) if isinstance(win_data, dict) else {}
+
+        hand_str = ' '.join([parser.get_tile_str(t) for t in sorted(parser.hands[w_idx])])
+        packs_str = ' '.join([f"[{''.join(p)}]" for p in parser.packs_output[w_idx]])
+        self._print(f"{self._player(w_idx)}: {hand_str} {packs_str}")
+
+        calculated_fan_sum = 0
+        for fan_id_str, fan_val in fan_details.items():
+            fan_id = int(fan_id_str)
+            if fan_id == FLOWER_FAN_ID:
+                continue  # 跳过花牌番种
+            fan_points = fan_val & 0xFF
+            count = (fan_val >> 8) + 1
+            calculated_fan_sum += fan_points * count
+
+        # 优先使用动作过程中统计到的真实花数，避免不同版本牌谱在番种里缺失花或计算差异导致中断
+        if total_fan is not None:
+            inferred_flower_count = max(total_fan - calculated_fan_sum, 0)
+        else:
+            inferred_flower_count = None
+
+        actual_flower_count = parser.flower_counts[w_idx]
+        if inferred_flower_count is not None and inferred_flower_count != actual_flower_count:
+            # 仅提示，不中断
+            self._print(f"[WARN] 牌谱番种推导花数为 {inferred_flower_count}，与动作统计花数 {actual_flower_count} 不一致，已以实际为准。")
+        flower_count = actual_flower_count
+
+        if flower_count > 0:
+            flower_str = f'花牌x{flower_count}: ' + ' '.join(parser.flower_tile[w_idx])
+        else:
+            flower_str = '无花牌'
+
+        # total_fan 可能缺失，打印时容错
+        tf_str = f"{total_fan}番" if total_fan is not None else "番数未知"
+        self._print(f"{self._player(w_idx)} 和牌! 总计: {tf_str} ({flower_str})")
+
+        for fan_id_str, fan_val in fan_details.items():
+            fan_id = int(fan_id_str)
+            if fan_id == FLOWER_FAN_ID: continue # Skip flower tile
+            fan_points = fan_val & 0xFF
+            count = (fan_val >> 8) + 1
+            fan_name = FAN_NAMES[fan_id] if 0 <= fan_id < len(FAN_NAMES) else f"未知番种({fan_id})"
+            self._print(f"  {fan_name}: {fan_points}番" + (f" x{count}" if count > 1 else ""))
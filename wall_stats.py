@@ -0,0 +1,196 @@
+# wall_stats.py
+# 牌墙与配牌的批量统计（需要 numpy）：一次把成千上万条记录的牌墙解码成 (记录数, 144) 的整数矩阵，
+# 按骰子向量化计算开门位置、摸牌顺序与四家配牌，再汇总每种牌在牌墙中的位置分布与起手牌统计，
+# 用于检查洗牌是否均匀、比较庄闲起手质量。逐条复盘仍由 parser.py 的 _setup_wall_and_deal 完成，两者规则一致。
+#
+# 用法：
+#   python wall_stats.py [--limit N] [--workers N] [--out wall_stats.npz]
+
+import argparse
+import json
+import re
+
+import numpy as np
+
+from parser import MahjongRecordParser, _decode_script
+from archive import shared_origin_store
+from workers import map_ordered
+
+WALL_SIZE = 144
+# 34 种数牌/字牌（下标同 MahjongRecordParser.TILE_IDENTITY）+ 8 张花牌
+N_KINDS = 42
+KIND_NAMES = MahjongRecordParser.TILE_IDENTITY + MahjongRecordParser.FLOWER_TILES
+_HEX = re.compile(r'[0-9A-Fa-f]*')
+
+
+def _deal_positions():
+    """(4, 14) 摸牌顺序下标：三轮每家 4 张，再每家 1 张，庄家（座位 0）补第 14 张；闲家第 14 列为 -1。"""
+    pos = np.full((4, 14), -1, dtype=np.int64)
+    for seat in range(4):
+        cols = [r * 16 + seat * 4 + k for r in range(3) for k in range(4)] + [48 + seat]
+        pos[seat, :13] = cols
+    pos[0, 13] = 52
+    return pos
+
+
+DEAL_POS = _deal_positions()
+
+
+def decode_walls(walls_hex):
+    """十六进制牌墙字符串列表 → (n, 144) uint8 矩阵，返回 (矩阵, 保留的下标)。
+
+    逐条校验：长度不是 288、含非十六进制字符、或解码后不是 0~143 各一张的牌墙被丢弃，
+    一条坏牌墙不会让整批解码失败。
+    """
+    keep = [i for i, w in enumerate(walls_hex) if len(w) == WALL_SIZE * 2 and _HEX.fullmatch(w)]
+    raw = bytes.fromhex(''.join(walls_hex[i] for i in keep))
+    walls = np.frombuffer(raw, dtype=np.uint8).reshape(len(keep), WALL_SIZE)
+    ok = (np.sort(walls, axis=1) == np.arange(WALL_SIZE)).all(axis=1)
+    return walls[ok], np.array(keep, dtype=np.int64)[ok]
+
+
+def split_dice(d):
+    """打包的骰子（每 4 位一颗）→ (n, 4)。"""
+    d = np.asarray(d, dtype=np.int64)
+    return np.stack([(d >> shift) & 15 for shift in (0, 4, 8, 12)], axis=1)
+
+
+def start_positions(dice, dealer=0):
+    """返回 (开门方位, 起摸位置)，与 _setup_wall_and_deal 相同；dealer 同 parser.py 固定为座位 0。"""
+    break_pos = (dealer - (dice[:, 0] + dice[:, 1] - 1)) % 4
+    start = (break_pos * 36 + dice.sum(axis=1) * 2) % WALL_SIZE
+    return break_pos, start
+
+
+def draw_order(walls, start):
+    """按起摸位置旋转每行牌墙，得到摸牌顺序（第 0 列为庄家第一张）。"""
+    cols = (start[:, None] + np.arange(WALL_SIZE)) % WALL_SIZE
+    return np.take_along_axis(walls, cols, axis=1)
+
+
+def deal_hands(ordered):
+    """(n, 4, 14) 起手牌（牌编号），闲家第 14 张为 255。"""
+    hands = ordered[:, np.maximum(DEAL_POS, 0)]
+    hands[:, DEAL_POS < 0] = 255
+    return hands
+
+
+def tile_kinds(tiles):
+    """牌编号 → 种类下标（0~33 数牌/字牌，34~41 花牌）；255 之类的填充值映射为 -1。"""
+    tiles = tiles.astype(np.int64)
+    return np.where(tiles < 136, tiles >> 2, np.where(tiles < WALL_SIZE, tiles - 102, -1))
+
+
+def kind_counts(kinds):
+    """(..., k) 种类下标 → (..., 42) 计数，-1 忽略。"""
+    lead = kinds.shape[:-1]
+    flat = kinds.reshape(-1, kinds.shape[-1])
+    rows = np.repeat(np.arange(len(flat)), flat.shape[1])
+    valid = flat.ravel() >= 0
+    keys = rows[valid] * N_KINDS + flat.ravel()[valid]
+    counts = np.bincount(keys, minlength=len(flat) * N_KINDS)
+    return counts.reshape(lead + (N_KINDS,))
+
+
+def position_distribution(ordered):
+    """(42, 144)：每种牌出现在摸牌顺序各位置上的次数。"""
+    kinds = tile_kinds(ordered)
+    keys = kinds * WALL_SIZE + np.arange(WALL_SIZE)
+    return np.bincount(keys.ravel(), minlength=N_KINDS * WALL_SIZE).reshape(N_KINDS, WALL_SIZE)
+
+
+def uniformity(dist):
+    """每种牌位置分布相对均匀分布的卡方值 / 自由度（接近 1 表示均匀）。"""
+    total = dist.sum(axis=1, keepdims=True)
+    expected = total / WALL_SIZE
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2 = np.where(expected > 0, (dist - expected) ** 2 / expected, 0.0).sum(axis=1)
+    return chi2 / (WALL_SIZE - 1)
+
+
+def hand_stats(hands):
+    """按座位汇总起手牌：{指标: (4,) 平均值}，另含对子数分布 pair_hist (4, 8)。"""
+    counts = kind_counts(tile_kinds(hands))
+    suited = counts[..., :27].reshape(counts.shape[:2] + (3, 9))
+    pairs = (counts[..., :34] >= 2).sum(axis=2)
+    return {
+        'flowers': counts[..., 34:].sum(axis=2).mean(axis=0),
+        'honors': counts[..., 27:34].sum(axis=2).mean(axis=0),
+        'pairs': pairs.mean(axis=0),
+        'triplets': (counts[..., :34] >= 3).sum(axis=2).mean(axis=0),
+        'max_suit': suited.sum(axis=3).max(axis=2).mean(axis=0),
+        'pair_hist': np.stack([np.bincount(pairs[:, s], minlength=8)[:8] for s in range(4)]),
+    }
+
+
+def _wall_fields(content):
+    # 只取牌墙与骰子，跳过动作流解析
+    script = json.loads(_decode_script(json.loads(content)['script']))
+    return script.get('w', ''), script.get('d', 0)
+
+
+def _load_one(record_id):
+    try:
+        return _wall_fields(shared_origin_store().get(record_id))
+    except Exception:
+        return '', 0
+
+
+def load_walls(record_ids, workers=1):
+    """返回 (保留的记录 id, 牌墙矩阵, 骰子 (n, 4))。"""
+    fields = list(map_ordered(_load_one, record_ids, workers=workers))
+    walls, keep = decode_walls([w for w, _ in fields])
+    dice = split_dice([fields[i][1] for i in keep])
+    return [record_ids[i] for i in keep], walls, dice
+
+
+def analyze(walls, dice):
+    break_pos, start = start_positions(dice)
+    ordered = draw_order(walls, start)
+    hands = deal_hands(ordered)
+    dist = position_distribution(ordered)
+    return {
+        'dice_sum': np.bincount(dice[:, :2].sum(axis=1), minlength=13),
+        'break_pos': np.bincount(break_pos, minlength=4),
+        'position_dist': dist,
+        'uniformity': uniformity(dist),
+        'hands': hand_stats(hands),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='牌墙与配牌批量统计')
+    ap.add_argument('--limit', type=int, default=None, help='最多使用 N 条记录')
+    ap.add_argument('--workers', type=int, default=1, help='并行解码的进程数（默认 1）')
+    ap.add_argument('--out', default=None, help='把分布矩阵保存为 .npz')
+    args = ap.parse_args(argv)
+
+    record_ids = shared_origin_store().ids()[:args.limit]
+    kept, walls, dice = load_walls(record_ids, args.workers)
+    if not kept:
+        print('没有可用的记录')
+        return
+    result = analyze(walls, dice)
+    print(f"记录数: {len(kept)}（跳过 {len(record_ids) - len(kept)} 条牌墙缺失或损坏的记录）")
+    print("前两颗骰子点数和: " + ", ".join(f"{s}:{n}" for s, n in enumerate(result['dice_sum']) if n))
+    print("开门方位: " + ", ".join(f"{MahjongRecordParser.WIND[p]}:{n}" for p, n in enumerate(result['break_pos'])))
+    u = result['uniformity']
+    order = np.argsort(u)[::-1]
+    print("位置分布最不均匀的牌（卡方/自由度）: " + ", ".join(f"{KIND_NAMES[k]} {u[k]:.2f}" for k in order[:5]))
+    hands = result['hands']
+    print(f"{'座位':<6}{'花':>8}{'字牌':>8}{'对子':>8}{'刻子':>8}{'最长花色':>10}")
+    for seat in range(4):
+        print(f"{MahjongRecordParser.WIND[seat]:<6}{hands['flowers'][seat]:>8.2f}{hands['honors'][seat]:>8.2f}"
+              f"{hands['pairs'][seat]:>8.2f}{hands['triplets'][seat]:>8.2f}{hands['max_suit'][seat]:>10.2f}")
+
+    if args.out:
+        np.savez_compressed(args.out, record_ids=np.array(kept, dtype=str), dice_sum=result['dice_sum'],
+                            break_pos=result['break_pos'], position_dist=result['position_dist'],
+                            uniformity=result['uniformity'], pair_hist=hands['pair_hist'],
+                            **{f'hand_{name}': hands[name] for name in ('flowers', 'honors', 'pairs', 'triplets',
+                                                                         'max_suit')})
+        print(f"已保存 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
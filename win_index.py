@@ -0,0 +1,232 @@
+# win_index.py
+# 和牌倒排索引（data/win_index.db）：按 和牌玩家 / 番种 / 和牌张 / 对局标题 记录 posting list（记录 id 列表），
+# 查询时对各条件的 posting list 求交集，不必重新解析全部牌谱或翻 CSV。
+#
+# 索引随解析增量更新：batch_process.py 把解析结果按块（每个认领块或整轮）写入；generate_stats.py 结束时按统计缓存补齐
+# 缺失或已变化（存储键不同）的记录。parser.py 等源码变化导致统计缓存失效时，索引也整体清空：
+# batch_process.py 的处理日志只认同一解析器版本的完成记录，下次运行会重新处理全部记录并写回索引；
+# 不跑 batch_process 时，先运行 generate_stats.py 重建统计缓存（结束时顺带补齐索引），或之后再运行 win_index.py build。
+#
+# 用法：
+#   python win_index.py build                          # 按统计缓存（data/stats_cache.db）补齐索引
+#   python win_index.py query --player 某玩家 --fan 清一色 [--fan 七对] [--tile 5p | --tile C] [--title 竹] [--limit N]
+#   python win_index.py info
+#
+# 字牌和牌张存为 E/S/W/N（风）与 C/F/B（中/发/白），--tile 也接受 1z~7z（东南西北白发中）。
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from fan_table import FAN_NAMES
+from stats_cache import StatsCache, parser_version
+
+INDEX_PATH = os.path.join('data', 'win_index.db')
+
+FIELDS = ('player', 'fan', 'tile', 'title')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS indexed (
+    record_id TEXT PRIMARY KEY,
+    store_key TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    field TEXT NOT NULL,
+    key TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    PRIMARY KEY (field, key, record_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_record ON postings(record_id);
+"""
+
+
+def win_terms(win_data):
+    """一条和牌分析结果对应的 (field, key) 列表；番种以 fan_table 中的 id 作键。"""
+    if not win_data:
+        return []
+    terms = [('player', win_data.get('winner_name') or ''),
+             ('tile', win_data.get('winning_tile') or ''),
+             ('title', win_data.get('game_title') or '')]
+    for fan_id, count in enumerate(win_data.get('fan_vector') or []):
+        if count:
+            terms.append(('fan', str(fan_id)))
+    return terms
+
+
+# 1z~7z（东南西北白发中）→ 解析器输出的字牌名
+_HONOR_NAMES = {f"{i + 1}z": name for i, name in enumerate(('E', 'S', 'W', 'N', 'B', 'F', 'C'))}
+
+
+def tile_key(tile):
+    """和牌张 → 索引键：数牌原样（5p），字牌接受 E/S/W/N/C/F/B（不区分大小写）或 1z~7z。"""
+    tile = str(tile).strip()
+    if tile.lower() in _HONOR_NAMES:
+        return _HONOR_NAMES[tile.lower()]
+    if len(tile) == 1 and tile.upper() in _HONOR_NAMES.values():
+        return tile.upper()
+    return tile.lower()
+
+
+def fan_key(fan):
+    """番种名或 id → 索引键。"""
+    if isinstance(fan, int) or str(fan).isdigit():
+        fan_id = int(fan)
+        if 0 <= fan_id < len(FAN_NAMES):
+            return str(fan_id)
+    elif fan in FAN_NAMES:
+        return str(FAN_NAMES.index(fan))
+    raise ValueError(f"未知番种: {fan}")
+
+
+class WinIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 多个 batch_process 进程（--claim）可能同时写入，等待对方的短事务结束而不是立即报错
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # 解析器源码变化后旧索引里的番种/和牌张可能不再正确，整体清空
+        version = parser_version()
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'parser_version'").fetchone()
+        if row is None or row[0] != version:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM indexed")
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('parser_version', ?)", (version,))
+        self.conn.commit()
+
+    @staticmethod
+    def exists(path=INDEX_PATH):
+        return os.path.exists(path)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 写入 ----------
+
+    def add(self, record_id, key, win_data):
+        """写入（或替换）一条记录；win_data 为 None 时只登记为已索引。调用方负责 commit。"""
+        self.conn.execute("DELETE FROM postings WHERE record_id = ?", (record_id,))
+        self.conn.execute("INSERT OR REPLACE INTO indexed (record_id, store_key) VALUES (?, ?)",
+                          (record_id, json.dumps(key)))
+        self.conn.executemany("INSERT OR IGNORE INTO postings (field, key, record_id) VALUES (?, ?, ?)",
+                              [(field, k, record_id) for field, k in win_terms(win_data)])
+
+    def add_many(self, rows):
+        """rows: [(record_id, key, win_data)]，在一个事务内写入。"""
+        with self.conn:
+            for record_id, key, win_data in rows:
+                self.add(record_id, key, win_data)
+
+    def remove(self, record_ids):
+        rows = [(rid,) for rid in record_ids]
+        self.conn.executemany("DELETE FROM postings WHERE record_id = ?", rows)
+        self.conn.executemany("DELETE FROM indexed WHERE record_id = ?", rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def sync(self, cache):
+        """按统计缓存补齐索引：新增或存储键变化的记录重建，缓存中已不存在的记录删除。返回 (更新数, 删除数)。
+
+        逐条比对两边的存储键，只读入需要重建的记录，内存与记录数无关。
+        """
+        updated = 0
+        with self.conn:
+            for record_id, key in cache.entries():
+                row = self.conn.execute("SELECT store_key FROM indexed WHERE record_id = ?", (record_id,)).fetchone()
+                if row is None or row[0] != json.dumps(key):
+                    self.add(record_id, key, cache.get(record_id))
+                    updated += 1
+            stale = [rid for (rid,) in self.conn.execute("SELECT record_id FROM indexed") if rid not in cache]
+            self.remove(stale)
+        return updated, len(stale)
+
+    # ---------- 查询 ----------
+
+    def query(self, player=None, fans=(), tile=None, title=None, limit=None):
+        """返回同时满足所有条件的记录 id（升序）。title 为子串匹配，其余为精确匹配；fans 中的番种须全部出现。"""
+        parts, params = [], []
+        if player:
+            parts.append("SELECT record_id FROM postings WHERE field = 'player' AND key = ?")
+            params.append(player)
+        for fan in fans:
+            parts.append("SELECT record_id FROM postings WHERE field = 'fan' AND key = ?")
+            params.append(fan_key(fan))
+        if tile:
+            parts.append("SELECT record_id FROM postings WHERE field = 'tile' AND key = ?")
+            params.append(tile_key(tile))
+        if title:
+            parts.append("SELECT record_id FROM postings WHERE field = 'title' AND key LIKE ?")
+            params.append(f"%{title}%")
+        if not parts:
+            parts.append("SELECT record_id FROM postings WHERE field = 'player'")
+        sql = " INTERSECT ".join(parts) + " ORDER BY record_id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def keys(self, field):
+        """某字段的全部键及其 posting list 长度，按长度降序。"""
+        return self.conn.execute("SELECT key, COUNT(*) AS n FROM postings WHERE field = ? "
+                                 "GROUP BY key ORDER BY n DESC, key", (field,)).fetchall()
+
+    def counts(self):
+        indexed = self.conn.execute("SELECT COUNT(*) FROM indexed").fetchone()[0]
+        wins = self.conn.execute("SELECT COUNT(*) FROM postings WHERE field = 'player'").fetchone()[0]
+        return {'indexed': indexed, 'wins': wins,
+                **{field: len(self.keys(field)) for field in FIELDS}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='和牌倒排索引')
+    ap.add_argument('--db', default=INDEX_PATH, help=f'索引路径（默认 {INDEX_PATH}）')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    sub.add_parser('build', help='按统计缓存补齐索引')
+    q = sub.add_parser('query', help='按条件求交集')
+    q.add_argument('--player', default=None, help='和牌玩家')
+    q.add_argument('--fan', action='append', default=[], help='番种名或 id，可重复（须全部出现）')
+    q.add_argument('--tile', default=None, help='和牌张，例如 5p、E（东）、C（中）；也接受 1z~7z')
+    q.add_argument('--title', default=None, help='对局标题子串')
+    q.add_argument('--limit', type=int, default=None, help='最多返回条数')
+    sub.add_parser('info', help='索引规模')
+    args = ap.parse_args(argv)
+
+    with WinIndex(args.db) as index:
+        if args.cmd == 'build':
+            with StatsCache() as cache:
+                updated, removed = index.sync(cache)
+            print(f"索引已更新：新增/变化 {updated} 条，删除 {removed} 条 -> {args.db}")
+        elif args.cmd == 'query':
+            start = time.perf_counter()
+            try:
+                record_ids = index.query(args.player, args.fan, args.tile, args.title, args.limit)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                sys.exit(2)
+            elapsed = (time.perf_counter() - start) * 1000
+            for record_id in record_ids:
+                print(f"https://tziakcha.net/record/?id={record_id}")
+            print(f"共 {len(record_ids)} 条（{elapsed:.1f} ms）", file=sys.stderr)
+        else:
+            for name, value in index.counts().items():
+                print(f"{name:<10} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# workers.py
+# 多进程解析的公共入口：batch_process.py 与 generate_stats.py 共用。
+# map_ordered 按输入顺序产出结果；map_unordered 按完成顺序产出，并对惰性输入施加背压（见 pipeline.py）。
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def map_ordered(func, items, workers=1, chunksize=None):
+    """按输入顺序逐个产出 func(item) 的结果。
+
+    workers <= 1 时在当前进程内惰性串行执行；否则分块派发到进程池，
+    func 必须是模块级函数（可被 pickle）。
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+    if chunksize is None:
+        # 分块减少进程间往返，同时保证每个进程有足够多的块用于负载均衡
+        chunksize = max(1, min(64, len(items) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(func, items, chunksize=chunksize)
+
+
+def map_unordered(func, items, workers=1, max_pending=None):
+    """按完成顺序逐个产出 (item, func(item))。
+
+    items 可以是惰性迭代器（例如边下载边产出的记录 id）：在途任务最多 max_pending 个
+    （默认 workers * 4），达到上限时不再从 items 取数，上游据此形成背压。
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+    max_pending = max_pending or workers * 4
+    it = iter(items)
+    exhausted = False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(func, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()